@@ -2,50 +2,67 @@
 
 import os
 import sys
+import time
 import gradio as gr
-from typing import List
+from typing import Iterator, List
 from langchain_core.documents import Document
-from transformers import T5Tokenizer, T5ForConditionalGeneration, pipeline
 
 # === Config ===
 MODEL_NAME = "google/flan-t5-base"
 VECTOR_STORE_PATH = os.path.join(os.path.dirname(__file__), "src", "..", "vector_store", "chroma")
 THEME = gr.themes.Default(primary_hue="emerald", secondary_hue="lime")  # Professional color scheme
+# Requests served at once; retrieval for one request overlaps generation for another
+APP_CONCURRENCY = int(os.environ.get("APP_CONCURRENCY", 4))
+# Load models in the background at startup instead of on the first request
+APP_WARMUP = os.environ.get("APP_WARMUP", "1") == "1"
 
 # Dynamically import components
-sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
-from rag_pipline import ComplaintRetriever
-from rag_pipline import generate_answer  # Assuming generate_answer is exported
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from rag_pipline import get_retriever, get_llm, warm_up, readiness
+from rag_pipline import stream_answer_from_docs, dump_metrics
+from tracing import TRACER, span
 
-# === Load LLM pipeline ===
-try:
-    tokenizer = T5Tokenizer.from_pretrained(MODEL_NAME)
-    model = T5ForConditionalGeneration.from_pretrained(MODEL_NAME)
-    llm = pipeline("text2text-generation", model=model, tokenizer=tokenizer, max_length=300)
-except Exception as e:
-    print(f"Error loading model: {e}")
-    raise
+# Models load on first use; warm-up starts that now without blocking startup
+if APP_WARMUP:
+    warm_up(MODEL_NAME, VECTOR_STORE_PATH)
 
-# Initialize retriever
-try:
-    retriever = ComplaintRetriever(vector_store_path=VECTOR_STORE_PATH)
-except Exception as e:
-    print(f"Error initializing retriever: {e}")
-    raise
+def readiness_text() -> str:
+    status = readiness()
+    if status["ready"]:
+        return f"Ready (warm-up {status['warmup_s']:.1f}s)"
+    if status["error"]:
+        return f"Warm-up failed: {status['error']}"
+    if status["warming_up"]:
+        return f"Loading models... ({status['warmup_s']:.0f}s)"
+    return "Models load on the first question"
 
-def get_answer(question: str, product_filter: str = "All") -> tuple[str, str]:
+def get_answer(question: str, product_filter: str = "All") -> Iterator[tuple[str, str]]:
     """
-    Retrieve chunks and generate an answer with a sample source.
+    Retrieve chunks, show a sample source right away, then stream the answer
+    as it is generated.
     """
     try:
-        # Adjust product_filter for "All" case
-        product_filter = product_filter if product_filter != "All" else None
-        chunks = retriever.retrieve(query=question, product_filter=product_filter)
-        answer = generate_answer(chunks, question)
-        source = chunks[0].page_content[:200] + "..." if chunks else "No source available"
-        return answer, source
+        with span("app.get_answer"):
+            # Adjust product_filter for "All" case
+            product_filter = product_filter if product_filter != "All" else None
+            # Profiled on its own: cProfile is per-thread and Gradio may resume
+            # this generator on another thread after each yield
+            with TRACER.request("app.retrieve"):
+                retriever = get_retriever(VECTOR_STORE_PATH)
+                chunks = retriever.retrieve(query=question, product_filter=product_filter)
+            source = chunks[0].page_content[:200] + "..." if chunks else "No source available"
+            yield "", source
+
+            llm = get_llm(MODEL_NAME)
+            answer = ""
+            start = time.perf_counter()
+            for piece in stream_answer_from_docs(question, chunks, llm=llm):
+                if not answer:
+                    TRACER.record("app.first_token", time.perf_counter() - start)
+                answer += piece
+                yield answer, source
     except Exception as e:
-        return f"Error: {e}", "No source available"
+        yield f"Error: {e}", "No source available"
 
 # Gradio interface with attractive design
 with gr.Blocks(theme=THEME, title="CrediTrust Complaint Assistant") as demo:
@@ -57,8 +74,10 @@ with gr.Blocks(theme=THEME, title="CrediTrust Complaint Assistant") as demo:
         """
     )
     
-    with gr.Row(variant="panel").style(height=50):
+    with gr.Row(variant="panel"):
         gr.Image(value="https://via.placeholder.com/150", height=50)  # Placeholder logo
+        status_output = gr.Markdown(elem_id="status_output")
+        status_btn = gr.Button("Check status", size="sm")
     
     with gr.Row():
         with gr.Column(scale=1):
@@ -66,34 +85,48 @@ with gr.Blocks(theme=THEME, title="CrediTrust Complaint Assistant") as demo:
                 label="Your Question",
                 placeholder="e.g., What are common problems with credit cards?",
                 lines=2,
-                elem_id="question_input"
-            ).style(container=True, border_color="#4CAF50")
+                elem_id="question_input",
+                container=True
+            )
             product_filter_input = gr.Dropdown(
                 label="Filter by Product",
-                choices=["All", "Credit card", "Savings account", "Mortgage", "Debt collection", "Payday loan"],
+                choices=["All", "Credit card", "Personal loan", "Buy Now, Pay Later", "Savings account", "Money transfers"],
                 value="All",
-                elem_id="product_filter_input"
-            ).style(container=True)
-            submit_btn = gr.Button("Get Answer", variant="primary").style(full_width=True)
+                elem_id="product_filter_input",
+                container=True
+            )
+            submit_btn = gr.Button("Get Answer", variant="primary")
         
         with gr.Column(scale=2):
             answer_output = gr.Textbox(
                 label="Answer",
                 interactive=False,
-                elem_id="answer_output"
-            ).style(container=True, border_color="#2E7D32", padding=10)
+                elem_id="answer_output",
+                container=True
+            )
             source_output = gr.Textbox(
                 label="Sample Source",
                 interactive=False,
-                elem_id="source_output"
-            ).style(container=True, border_color="#2E7D32", padding=10)
+                elem_id="source_output",
+                container=True
+            )
+
+    # Per-stage latency histograms (p50/p95/p99) of the requests served so far
+    with gr.Accordion("Latency metrics", open=False):
+        metrics_format = gr.Radio(choices=["json", "prometheus"], value="json", label="Format")
+        metrics_btn = gr.Button("Refresh")
+        metrics_output = gr.Code(label="Metrics")
 
+    # get_answer is a generator, so Gradio streams each partial answer
     submit_btn.click(
         fn=get_answer,
         inputs=[question_input, product_filter_input],
-        outputs=[answer_output, source_output],
-        _js="() => [document.getElementById('question_input').value, document.getElementById('product_filter_input').value]"
+        outputs=[answer_output, source_output]
     )
+    metrics_btn.click(fn=dump_metrics, inputs=[metrics_format], outputs=[metrics_output])
+    # Readiness check, also callable as the "ready" API endpoint
+    status_btn.click(fn=readiness_text, outputs=[status_output], api_name="ready")
+    demo.load(fn=readiness_text, outputs=[status_output])
 
     # Add professional CSS styling
     demo.css = """
@@ -116,4 +149,5 @@ with gr.Blocks(theme=THEME, title="CrediTrust Complaint Assistant") as demo:
     }
     """
 
+demo.queue(default_concurrency_limit=APP_CONCURRENCY)
 demo.launch()
\ No newline at end of file
@@ -0,0 +1,482 @@
+# run_benchmarks.py
+"""
+Offline benchmark suite for the complaint RAG pipeline.
+
+    python benchmarks/run_benchmarks.py --chunks 100000
+    python benchmarks/run_benchmarks.py --chunks 1000000 --workers 8 --skip_generate
+    python benchmarks/run_benchmarks.py --chunks 100000 --baseline benchmarks/results/<previous>.json
+
+A synthetic corpus is chunked, embedded with a hashing embedder, indexed
+(NumPy memmap store + BM25, int8 / PQ quantized stores and a Chroma HNSW
+collection) and queried; approximate indexes report recall@k against exact
+float32 search. Encoding throughput of the real sentence-transformer
+(--embed_model) is timed separately on a sample of the chunks when the
+model is installed and cached. Results are written as JSON; with
+--baseline, metrics that got worse by more than --tolerance are reported
+and the exit code is 1.
+
+Chroma needs chromadb; end-to-end `generate_answer` latency needs
+torch/transformers and a cached seq2seq model (--gen_model). Stages whose
+dependencies are missing are recorded as skipped.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from chunking import assemble_chunks, split_frame
+from lexical_index import BM25Index, BM25IndexBuilder
+from vector_store import NumpyVectorStore, build_numpy_store
+from quantized_store import (QuantizedVectorStore, build_quantized_store, iter_numpy_store,
+                             store_footprint)
+from synthetic import HashingEmbedder, make_corpus, make_queries
+
+# === Config ===
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+CHUNKS_PER_NARRATIVE = 5.5     # average for the synthetic corpus at the default chunk size
+CORPUS_MARGIN = 1.1            # extra narratives so at least --chunks chunks come out
+EMBED_BATCH_SIZE = 4096
+CHROMA_ADD_BATCH = 5000        # below chromadb's max batch size
+BUILD_BATCH_SIZE = 20000
+DEFAULT_TOLERANCE = 0.10
+
+# Metrics compared against a baseline: path in the results dict -> True if higher is better
+TRACKED_METRICS = {
+    "chunking.rows_per_s": True,
+    "chunking.chunks_per_s": True,
+    "embedding.chunks_per_s": True,
+    "embedding_model.chunks_per_s": True,
+    "index.numpy.build_s": False,
+    "index.numpy.disk_mb": False,
+    "index.bm25.build_s": False,
+    "query.dense.p50_ms": False,
+    "query.dense.p99_ms": False,
+    "query.dense.recall_at_k": True,
+    "query.bm25.p50_ms": False,
+    "quantized.sq8.p50_ms": False,
+    "quantized.sq8.recall_at_k": True,
+    "quantized.pq.p50_ms": False,
+    "quantized.pq.recall_at_k": True,
+    "query.bm25.p99_ms": False,
+    "chroma.p50_ms": False,
+    "chroma.recall_at_k": True,
+    "generate_answer.p50_ms": False,
+    "generate_answer.p99_ms": False,
+}
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline retrieval / indexing / generation benchmarks.")
+    parser.add_argument("--chunks", type=int, default=10000, help="Chunks in the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=128, help="Hashing embedder dimensions")
+    parser.add_argument("--dtype", default="float16", help="NumPy store vector dtype")
+    parser.add_argument("--quant_modes", default="sq8,pq",
+                        help="Comma-separated quantized stores to benchmark (empty to skip)")
+    parser.add_argument("--workers", type=int, default=1, help="Chunking processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work_dir", default=None, help="Where indexes are built (default: temp dir)")
+    parser.add_argument("--output", default=None, help="Results JSON (default: results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative change counted as a regression")
+    parser.add_argument("--embed_model", default="sentence-transformers/all-MiniLM-L6-v2",
+                        help="Cached sentence-transformer whose encoding throughput is timed")
+    parser.add_argument("--model_chunks", type=int, default=1000, help="Chunks encoded by --embed_model")
+    parser.add_argument("--skip_model", action="store_true", help="Don't time --embed_model")
+    parser.add_argument("--skip_chroma", action="store_true")
+    parser.add_argument("--skip_generate", action="store_true")
+    parser.add_argument("--gen_model", default="google/flan-t5-small")
+    parser.add_argument("--gen_queries", type=int, default=20)
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+# === Helpers ===
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"n": len(ms), "mean_ms": float(ms.mean()), "p50_ms": float(p50),
+            "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def dir_size_mb(path: str) -> float:
+    total = sum(os.path.getsize(os.path.join(root, f))
+                for root, _, files in os.walk(path) for f in files)
+    return total / 1e6
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, block: int = 65536) -> np.ndarray:
+    """Ground-truth top-k rows per query by float32 brute force."""
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(vectors), block):
+        scores = queries @ vectors[start:start + block].T
+        rows = np.arange(start, start + scores.shape[1])
+        best_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+    return best_rows
+
+
+def recall_at_k(found: List[np.ndarray], truth: np.ndarray, k: int) -> float:
+    hits = sum(len(set(map(int, rows[:k])) & set(map(int, t[:k]))) for rows, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# === Benchmarks ===
+def bench_chunking(args, results: Dict):
+    num_narratives = int(np.ceil(args.chunks * CORPUS_MARGIN / CHUNKS_PER_NARRATIVE)) + 10
+    start = time.perf_counter()
+    corpus = make_corpus(num_narratives, seed=args.seed)
+    results["corpus"] = {"narratives": len(corpus), "generate_s": time.perf_counter() - start}
+
+    start = time.perf_counter()
+    chunks, counts = split_frame(corpus, workers=args.workers, progress=False)
+    chunk_df = assemble_chunks(corpus, chunks, counts)
+    elapsed = time.perf_counter() - start
+    results["chunking"] = {
+        "workers": args.workers,
+        "rows": len(corpus),
+        "chunks": len(chunk_df),
+        "seconds": elapsed,
+        "rows_per_s": len(corpus) / elapsed,
+        "chunks_per_s": len(chunk_df) / elapsed,
+    }
+    print(f" Chunking: {len(corpus):,} narratives -> {len(chunk_df):,} chunks in {elapsed:.1f}s", flush=True)
+    return chunk_df.head(args.chunks).reset_index(drop=True)
+
+
+def bench_embedding(args, chunk_df, embedder: HashingEmbedder, results: Dict) -> np.ndarray:
+    texts = chunk_df["chunk_text"].tolist()
+    vectors = np.empty((len(texts), embedder.dim), dtype=np.float32)
+    start = time.perf_counter()
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors[i:i + EMBED_BATCH_SIZE] = embedder.encode(texts[i:i + EMBED_BATCH_SIZE])
+    elapsed = time.perf_counter() - start
+    results["embedding"] = {"model": f"hashing-{embedder.dim}", "chunks": len(texts),
+                            "seconds": elapsed, "chunks_per_s": len(texts) / elapsed}
+    print(f" Embedding (hashing, index vectors): {len(texts):,} chunks in {elapsed:.1f}s", flush=True)
+    return vectors
+
+
+def bench_model_embedding(args, chunk_df, results: Dict):
+    """Encoding throughput of the production sentence-transformer, loaded from the local cache only."""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        results["embedding_model"] = {"skipped": f"missing dependency: {e}"}
+        print(f" Model embedding skipped ({e})", flush=True)
+        return
+    try:
+        model = SentenceTransformer(args.embed_model, device="cpu", local_files_only=True)
+    except (OSError, ValueError, TypeError) as e:
+        results["embedding_model"] = {"skipped": f"model {args.embed_model} not cached: {e}"}
+        print(f" Model embedding skipped ({args.embed_model} not cached)", flush=True)
+        return
+
+    texts = chunk_df["chunk_text"].head(args.model_chunks).tolist()
+    model.encode(texts[:8], show_progress_bar=False)      # warm-up
+    start = time.perf_counter()
+    model.encode(texts, batch_size=64, show_progress_bar=False)
+    elapsed = time.perf_counter() - start
+    results["embedding_model"] = {"model": args.embed_model, "chunks": len(texts),
+                                  "seconds": elapsed, "chunks_per_s": len(texts) / elapsed}
+    print(f" Model embedding: {len(texts):,} chunks in {elapsed:.1f}s "
+          f"({len(texts) / elapsed:,.0f} chunks/s, {args.embed_model})", flush=True)
+
+
+def bench_index(args, chunk_df, vectors: np.ndarray, work_dir: str, results: Dict):
+    ids = chunk_df["chunk_id"].tolist()
+    texts = chunk_df["chunk_text"].tolist()
+    metadatas = [{"product": p, "complaint_id": int(c)}
+                 for p, c in zip(chunk_df["product"], chunk_df["complaint_id"])]
+
+    numpy_dir = os.path.join(work_dir, "numpy_index")
+    start = time.perf_counter()
+    batches = ((ids[i:i + BUILD_BATCH_SIZE], vectors[i:i + BUILD_BATCH_SIZE],
+                texts[i:i + BUILD_BATCH_SIZE], metadatas[i:i + BUILD_BATCH_SIZE])
+               for i in range(0, len(ids), BUILD_BATCH_SIZE))
+    build_numpy_store(numpy_dir, batches, total=len(ids), dim=vectors.shape[1], dtype=args.dtype)
+    numpy_s = time.perf_counter() - start
+
+    bm25_dir = os.path.join(work_dir, "bm25_index")
+    start = time.perf_counter()
+    builder = BM25IndexBuilder()
+    for i in range(0, len(ids), BUILD_BATCH_SIZE):
+        builder.add(ids[i:i + BUILD_BATCH_SIZE], texts[i:i + BUILD_BATCH_SIZE],
+                    chunk_df["product"].iloc[i:i + BUILD_BATCH_SIZE])
+    builder.write(bm25_dir)
+    bm25_s = time.perf_counter() - start
+
+    results["index"] = {
+        "numpy": {"dtype": args.dtype, "build_s": numpy_s, "disk_mb": dir_size_mb(numpy_dir)},
+        "bm25": {"build_s": bm25_s, "disk_mb": dir_size_mb(bm25_dir)},
+    }
+    print(f" Index: numpy {numpy_s:.1f}s / {results['index']['numpy']['disk_mb']:.1f} MB, "
+          f"bm25 {bm25_s:.1f}s / {results['index']['bm25']['disk_mb']:.1f} MB", flush=True)
+    return numpy_dir, bm25_dir
+
+
+def bench_queries(args, chunk_df, vectors, embedder, numpy_dir, bm25_dir, results: Dict) -> List[str]:
+    queries = make_queries(chunk_df["chunk_text"].tolist(), args.queries, seed=args.seed)
+    query_vectors = embedder.encode(queries)
+    truth = exact_top_k(vectors, query_vectors, args.k)
+
+    store = NumpyVectorStore(numpy_dir)
+    store.search_rows(query_vectors[:1], args.k)      # warm the page cache
+    found, latencies = [], []
+    for q in query_vectors:
+        start = time.perf_counter()
+        rows, _ = store.search_rows(q, args.k)[0]
+        latencies.append(time.perf_counter() - start)
+        found.append(rows)
+    dense = latency_summary(latencies)
+    dense["recall_at_k"] = recall_at_k(found, truth, args.k)
+
+    start = time.perf_counter()
+    batched = store.search_rows(query_vectors, args.k)
+    dense["batched_queries_per_s"] = len(queries) / (time.perf_counter() - start)
+    dense["batched_recall_at_k"] = recall_at_k([rows for rows, _ in batched], truth, args.k)
+
+    lexical = BM25Index(bm25_dir)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        lexical.search(query, args.k)
+        latencies.append(time.perf_counter() - start)
+
+    results["query"] = {"k": args.k, "dense": dense, "bm25": latency_summary(latencies)}
+    print(f" Query: dense p50 {dense['p50_ms']:.2f} ms / p99 {dense['p99_ms']:.2f} ms, "
+          f"recall@{args.k} {dense['recall_at_k']:.3f}; "
+          f"bm25 p50 {results['query']['bm25']['p50_ms']:.2f} ms", flush=True)
+    return queries
+
+
+def bench_quantized(args, vectors, query_vectors, truth, numpy_dir, work_dir: str, results: Dict):
+    """Build each quantized store from the NumPy store; report footprint, latency and recall."""
+    modes = [m for m in args.quant_modes.split(",") if m]
+    if not modes:
+        return
+    source = NumpyVectorStore(numpy_dir)
+    report = {"numpy": store_footprint(numpy_dir)}
+
+    for mode in modes:
+        out_dir = os.path.join(work_dir, f"{mode}_index")
+        start = time.perf_counter()
+        build_quantized_store(out_dir, iter_numpy_store(source), total=len(source),
+                              dim=vectors.shape[1], mode=mode)
+        build_s = time.perf_counter() - start
+
+        store = QuantizedVectorStore(out_dir)
+        store.search_rows(query_vectors[:1], args.k)      # warm the page cache
+        found, latencies = [], []
+        for q in query_vectors:
+            start = time.perf_counter()
+            rows, _ = store.search_rows(q, args.k)[0]
+            latencies.append(time.perf_counter() - start)
+            found.append(rows)
+        entry = latency_summary(latencies)
+        entry.update(store_footprint(out_dir))
+        entry["build_s"] = build_s
+        entry["recall_at_k"] = recall_at_k(found, truth, args.k)
+        entry["recall_at_k_no_rerank"] = recall_at_k(
+            [rows for rows, _ in store.search_rows(query_vectors, args.k, rerank=False)], truth, args.k)
+        report[mode] = entry
+        print(f" Quantized {mode}: scan {entry['scan_mb']:.1f} MB / disk {entry['disk_mb']:.1f} MB "
+              f"(numpy {report['numpy']['scan_mb']:.1f} / {report['numpy']['disk_mb']:.1f}), "
+              f"p50 {entry['p50_ms']:.2f} ms, recall@{args.k} {entry['recall_at_k']:.3f} "
+              f"({entry['recall_at_k_no_rerank']:.3f} without re-rank)", flush=True)
+    results["quantized"] = report
+
+
+def bench_chroma(args, vectors, query_vectors, truth, work_dir: str, results: Dict):
+    """Build a Chroma HNSW collection (cosine) over the same vectors; latency and recall vs exact search."""
+    try:
+        import chromadb
+    except ImportError as e:
+        results["chroma"] = {"skipped": f"missing dependency: {e}"}
+        print(f" Chroma skipped ({e})", flush=True)
+        return
+
+    chroma_dir = os.path.join(work_dir, "chroma_index")
+    start = time.perf_counter()
+    client = chromadb.PersistentClient(path=chroma_dir)
+    collection = client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+    for i in range(0, len(vectors), CHROMA_ADD_BATCH):
+        rows = range(i, min(i + CHROMA_ADD_BATCH, len(vectors)))
+        collection.add(ids=[str(r) for r in rows], embeddings=vectors[i:i + CHROMA_ADD_BATCH].tolist())
+    build_s = time.perf_counter() - start
+
+    collection.query(query_embeddings=query_vectors[:1].tolist(), n_results=args.k, include=[])
+    found, latencies = [], []
+    for q in query_vectors:
+        start = time.perf_counter()
+        ids = collection.query(query_embeddings=[q.tolist()], n_results=args.k, include=[])["ids"][0]
+        latencies.append(time.perf_counter() - start)
+        found.append(np.asarray([int(i) for i in ids], dtype=np.int64))
+
+    entry = latency_summary(latencies)
+    entry.update({"build_s": build_s, "disk_mb": dir_size_mb(chroma_dir),
+                  "recall_at_k": recall_at_k(found, truth, args.k)})
+    results["chroma"] = entry
+    print(f" Chroma: build {build_s:.1f}s / {entry['disk_mb']:.1f} MB, p50 {entry['p50_ms']:.2f} ms, "
+          f"recall@{args.k} {entry['recall_at_k']:.3f}", flush=True)
+
+
+def bench_generate(args, embedder, numpy_dir, queries: List[str], results: Dict):
+    try:
+        import rag_pipline
+        from tracing import TRACER
+    except ImportError as e:
+        results["generate_answer"] = {"skipped": f"missing dependency: {e}"}
+        print(f" generate_answer skipped ({e})", flush=True)
+        return
+
+    retriever = rag_pipline.ComplaintRetriever(vector_store_path=numpy_dir, backend="numpy",
+                                               retrieval_mode="dense", k=args.k, embedder=embedder)
+    start = time.perf_counter()
+    try:
+        llm = rag_pipline.get_llm(args.gen_model)
+    except ImportError as e:
+        results["generate_answer"] = {"skipped": f"missing dependency: {e}"}
+        print(f" generate_answer skipped ({e})", flush=True)
+        return
+    except OSError as e:
+        results["generate_answer"] = {"skipped": f"model {args.gen_model} not available: {e}"}
+        print(f" generate_answer skipped ({args.gen_model} not available)", flush=True)
+        return
+    load_s = time.perf_counter() - start
+
+    TRACER.reset()
+    latencies = []
+    for query in queries[:args.gen_queries]:
+        start = time.perf_counter()
+        rag_pipline.generate_answer(query, k=args.k, llm=llm, retriever=retriever)
+        latencies.append(time.perf_counter() - start)
+
+    summary = latency_summary(latencies)
+    summary.update({"model": args.gen_model, "load_s": load_s, "stages": TRACER.snapshot()})
+    results["generate_answer"] = summary
+    print(f" generate_answer: p50 {summary['p50_ms']:.0f} ms / p99 {summary['p99_ms']:.0f} ms "
+          f"(model load {load_s:.1f}s)", flush=True)
+
+
+def run_suite(args) -> Dict:
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "work_dir")},
+    }
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag_bench_")
+    embedder = HashingEmbedder(args.dim)
+    try:
+        chunk_df = bench_chunking(args, results)
+        vectors = bench_embedding(args, chunk_df, embedder, results)
+        if args.skip_model:
+            results["embedding_model"] = {"skipped": "--skip_model"}
+        else:
+            bench_model_embedding(args, chunk_df, results)
+        numpy_dir, bm25_dir = bench_index(args, chunk_df, vectors, work_dir, results)
+        queries = bench_queries(args, chunk_df, vectors, embedder, numpy_dir, bm25_dir, results)
+        # Approximate indexes are scored against exact float32 search
+        query_vectors = embedder.encode(queries)
+        truth = exact_top_k(vectors, query_vectors, args.k)
+        bench_quantized(args, vectors, query_vectors, truth, numpy_dir, work_dir, results)
+        if args.skip_chroma:
+            results["chroma"] = {"skipped": "--skip_chroma"}
+        else:
+            bench_chroma(args, vectors, query_vectors, truth, work_dir, results)
+        if args.skip_generate:
+            results["generate_answer"] = {"skipped": "--skip_generate"}
+        else:
+            bench_generate(args, embedder, numpy_dir, queries, results)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+# === Regression check ===
+def _lookup(results: Dict, path: str) -> Optional[float]:
+    node = results
+    for key in path.split("."):
+        if not isinstance(node, dict) or key not in node:
+            return None
+        node = node[key]
+    return node if isinstance(node, (int, float)) else None
+
+
+def compare_results(current: Dict, baseline: Dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Tracked metrics that are worse than the baseline by more than `tolerance` (relative)."""
+    regressions = []
+    for path, higher_is_better in TRACKED_METRICS.items():
+        new, old = _lookup(current, path), _lookup(baseline, path)
+        if new is None or old is None or old == 0:
+            continue
+        change = (new - old) / abs(old)
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{path}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+    return regressions
+
+
+# === Main ===
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    print("=" * 60, flush=True)
+    print(f" RAG benchmarks: {args.chunks:,} chunks, {args.queries} queries, k={args.k}", flush=True)
+    print("=" * 60, flush=True)
+
+    results = run_suite(args)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f" Results saved to {output}", flush=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f" {len(regressions)} regression(s) vs {args.baseline}:", flush=True)
+            for line in regressions:
+                print(f"   {line}", flush=True)
+            return 1
+        print(f" No regressions vs {args.baseline} (tolerance {args.tolerance:.0%})", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# synthetic.py
+
+import re
+import zlib
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# === Config ===
+PRODUCTS = ["Credit card", "Personal loan", "Buy Now, Pay Later", "Savings account", "Money transfers"]
+GENERAL_VOCAB_SIZE = 4000
+PRODUCT_VOCAB_SIZE = 400
+PRODUCT_WORD_SHARE = 0.3       # share of narrative words drawn from the product's own vocabulary
+WORDS_PER_NARRATIVE = (80, 220)
+SENTENCE_WORDS = 14
+HASH_DIM = 128
+
+_SYLLABLES = ["ba", "ce", "di", "fo", "gu", "ha", "je", "ki", "lo", "mu", "na", "pe",
+              "qui", "ra", "se", "ti", "vo", "wa", "xe", "yo", "zu", "an", "el", "or"]
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def make_vocab(size: int, rng: np.random.Generator, prefix: str = "") -> np.ndarray:
+    """`size` distinct pseudo-words built from random syllables."""
+    words = set()
+    while len(words) < size:
+        n = rng.integers(2, 5)
+        words.add(prefix + "".join(rng.choice(_SYLLABLES, n)))
+    return np.array(sorted(words))
+
+
+def make_corpus(num_narratives: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic complaints in the filtered-data layout (`Complaint ID`,
+    `Product`, `cleaned_narrative`). Word frequencies are Zipf-like and each
+    product has its own topical vocabulary, so dense and BM25 search have
+    real neighbours to find.
+    """
+    rng = np.random.default_rng(seed)
+    general = make_vocab(GENERAL_VOCAB_SIZE, rng)
+    topical = {p: make_vocab(PRODUCT_VOCAB_SIZE, rng, prefix=f"p{i}") for i, p in enumerate(PRODUCTS)}
+
+    def zipf_probs(n):
+        weights = 1.0 / np.arange(1, n + 1)
+        return weights / weights.sum()
+
+    general_p = zipf_probs(len(general))
+    topical_p = zipf_probs(PRODUCT_VOCAB_SIZE)
+
+    products = rng.choice(PRODUCTS, num_narratives)
+    lengths = rng.integers(*WORDS_PER_NARRATIVE, size=num_narratives)
+    total = int(lengths.sum())
+    general_words = general[rng.choice(len(general), total, p=general_p)]
+    topical_idx = rng.choice(PRODUCT_VOCAB_SIZE, total, p=topical_p)
+    use_topical = rng.random(total) < PRODUCT_WORD_SHARE
+
+    narratives, pos = [], 0
+    for product, n in zip(products, lengths):
+        words = np.where(use_topical[pos:pos + n], topical[product][topical_idx[pos:pos + n]],
+                         general_words[pos:pos + n])
+        sentences = [" ".join(words[i:i + SENTENCE_WORDS]) for i in range(0, n, SENTENCE_WORDS)]
+        narratives.append(". ".join(sentences))
+        pos += n
+
+    return pd.DataFrame({
+        "Complaint ID": np.arange(1, num_narratives + 1, dtype=np.int64) + 10_000_000,
+        "Product": products,
+        "cleaned_narrative": narratives,
+    })
+
+
+def make_queries(chunk_texts: List[str], num_queries: int, seed: int = 0,
+                 words: int = 10) -> List[str]:
+    """Queries built from a random run of words inside randomly chosen chunks."""
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for i in rng.choice(len(chunk_texts), num_queries, replace=len(chunk_texts) < num_queries):
+        tokens = _TOKEN_RE.findall(chunk_texts[i])
+        start = rng.integers(0, max(1, len(tokens) - words))
+        queries.append(" ".join(tokens[start:start + words]))
+    return queries
+
+
+class HashingEmbedder:
+    """
+    Tiny offline embedding model: signed feature hashing of unigrams into
+    `dim` buckets, L2-normalized. Deterministic, no downloads, and exposes
+    the LangChain `embed_documents`/`embed_query` interface so it can stand
+    in for the sentence-transformer in `ComplaintRetriever`.
+    """
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+        self._buckets: Dict[str, int] = {}
+
+    def _bucket(self, token: str) -> int:
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            bucket = self._buckets[token] = zlib.crc32(token.encode("utf-8"))
+        return bucket
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        rows, hashes = [], []
+        for i, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(str(text).lower())
+            rows.extend([i] * len(tokens))
+            hashes.extend(self._bucket(t) for t in tokens)
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (np.asarray(rows, dtype=np.int64), hashes % self.dim), signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
@@ -0,0 +1,135 @@
+# batching.py
+
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+# === Config ===
+MAX_BATCH_SIZE = 16
+MAX_WAIT_MS = 5.0
+
+_BATCHERS: List["MicroBatcher"] = []
+
+
+class MicroBatcher:
+    """
+    Collects single-item requests from many threads and runs them through
+    `batch_fn` (list in, list out, same order) as one batch.
+
+    A batch is dispatched when `max_batch_size` items are waiting or
+    `max_wait_ms` has passed since its first item arrived. The scheduler is
+    an asyncio loop on its own thread; `batch_fn` runs on a separate worker
+    thread, so the next batch is collected while the current one runs.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+
+        self.batches = 0
+        self.items = 0
+        self.max_queue_depth = 0
+        self.batch_sizes: Counter = Counter()
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-worker")
+        self._loop = asyncio.new_event_loop()
+        self._queue: "asyncio.Queue" = None
+        self._task: "asyncio.Task" = None
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,),
+                                        name=f"{name}-scheduler", daemon=True)
+        self._thread.start()
+        ready.wait()
+        _BATCHERS.append(self)
+
+    # --- public API ---
+    def submit(self, item: Any) -> Future:
+        """Queue one item; the returned future resolves to its result."""
+        future: Future = Future()
+        self._loop.call_soon_threadsafe(self._enqueue, item, future)
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    async def submit_async(self, item: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(item))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
+
+    def close(self):
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._thread.join()
+            self._loop.close()
+        self._executor.shutdown(wait=True)
+        if self in _BATCHERS:
+            _BATCHERS.remove(self)
+
+    # --- scheduler ---
+    def _run_loop(self, ready: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._task = self._loop.create_task(self._dispatch())
+        ready.set()
+        self._loop.run_forever()
+
+    async def _shutdown(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._loop.call_soon(self._loop.stop)
+
+    def _enqueue(self, item: Any, future: Future):
+        self._queue.put_nowait((item, future))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    async def _dispatch(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            self.items += len(batch)
+            self.batch_sizes[len(batch)] += 1
+
+            items = [item for item, _ in batch]
+            try:
+                results = await self._loop.run_in_executor(self._executor, self.batch_fn, items)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+def batching_metrics() -> Dict[str, Dict[str, Any]]:
+    """Queue-depth and batch-size metrics of every live batcher."""
+    return {b.name: b.metrics() for b in _BATCHERS}
@@ -0,0 +1,110 @@
+# checkpoint.py
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Set
+
+SQL_VARS_PER_QUERY = 900   # stays below SQLite's default bound-parameter limit
+
+
+class CheckpointStore:
+    """
+    SQLite-backed record of committed chunk ids plus a small key/value
+    manifest (e.g. row counts of chunk files). Lookups hit the primary-key
+    index, so startup cost no longer grows with the number of embedded chunks.
+    Ids can also be recorded per source chunk file, so a file's committed
+    count is an indexed COUNT instead of a scan over the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS committed (chunk_id TEXT PRIMARY KEY) WITHOUT ROWID")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifest (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS committed_sources "
+                "(source TEXT, chunk_id TEXT, PRIMARY KEY (source, chunk_id)) WITHOUT ROWID")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS committed_sources_chunk ON committed_sources (chunk_id)")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM committed").fetchone()[0]
+
+    def count_source(self, source: str) -> int:
+        """Committed ids recorded for the chunk file `source`."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM committed_sources WHERE source = ?",
+                                      (source,)).fetchone()[0]
+
+    def add(self, chunk_ids: Iterable[str], source: Optional[str] = None):
+        """Commit ids; with `source`, also record them as committed for that chunk file."""
+        rows = [(str(cid),) for cid in chunk_ids]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO committed VALUES (?)", rows)
+            if source is not None:
+                self._conn.executemany("INSERT OR IGNORE INTO committed_sources VALUES (?, ?)",
+                                       ((source, cid) for (cid,) in rows))
+
+    def remove(self, chunk_ids: Iterable[str]):
+        rows = [(str(cid),) for cid in chunk_ids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM committed WHERE chunk_id = ?", rows)
+            self._conn.executemany("DELETE FROM committed_sources WHERE chunk_id = ?", rows)
+
+    def clear_source(self, source: str):
+        """Forget which ids were committed for `source` (e.g. after the file was rewritten)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM committed_sources WHERE source = ?", (source,))
+
+    def existing(self, chunk_ids: List[str]) -> Set[str]:
+        """Subset of `chunk_ids` that is already committed."""
+        found = set()
+        with self._lock:
+            for start in range(0, len(chunk_ids), SQL_VARS_PER_QUERY):
+                batch = chunk_ids[start:start + SQL_VARS_PER_QUERY]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT chunk_id FROM committed WHERE chunk_id IN ({placeholders})", batch)
+                found.update(r[0] for r in rows)
+        return found
+
+    def get_manifest(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM manifest WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_manifest(self, key: str, value: dict):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO manifest VALUES (?, ?)", (key, json.dumps(value)))
+
+    def import_text_checkpoint(self, path: str) -> int:
+        """One-time import of a legacy `embedded_ids.txt`. Returns the number of ids read."""
+        if not os.path.exists(path) or self.get_manifest(f"imported:{os.path.abspath(path)}"):
+            return 0
+        n, batch = 0, []
+        with open(path) as f:
+            for line in f:
+                cid = line.strip()
+                if cid:
+                    batch.append(cid)
+                if len(batch) >= 50000:
+                    self.add(batch)
+                    n += len(batch)
+                    batch = []
+        self.add(batch)
+        n += len(batch)
+        self.set_manifest(f"imported:{os.path.abspath(path)}", {"ids": n})
+        return n
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,53 +1,403 @@
 # src/chunking.py
 
 import pandas as pd
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from tqdm import tqdm
 import os
+import sys
+import argparse
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import chain
+from typing import List, Optional, Tuple
 
 # === Config ===
 INPUT_PATH = "data/processed/filtered/filtered_complaints.csv"
 OUTPUT_PATH = "data/processed/chunked/chunked_narratives.csv"
+# Streaming mode: narratives stored once, chunks reference them by offsets
+STREAM_OUTPUT_DIR = "data/processed/chunked/chunked_narratives.parquet/"
+NARRATIVES_FILE = "narratives.parquet"
+CHUNKS_FILE = "chunks.parquet"
+STREAM_BATCH_SIZE = 10000
 CHUNK_SIZE = 300
 CHUNK_OVERLAP = 50
+NARRATIVE_HASH_BYTES = 6       # 12 hex characters in chunk ids
+
+# Delta mode: only new/changed complaints are chunked; the pending snapshot
+# becomes the current one once embedding.py --delta has applied the delta
+SNAPSHOT_PATH = "data/processed/chunked/snapshot.parquet"
+PENDING_SNAPSHOT_PATH = "data/processed/chunked/snapshot.pending.parquet"
+DELTA_OUTPUT_PATH = "data/processed/chunked/delta_chunks.csv"
+DELTA_STALE_PATH = "data/processed/chunked/delta_stale.csv"
 
 def load_filtered_data(path: str) -> pd.DataFrame:
     return pd.read_csv(path)
 
-def chunk_narratives(df: pd.DataFrame, chunk_size=CHUNK_SIZE, 
-                     overlap=CHUNK_OVERLAP) -> pd.DataFrame:
-    splitter = RecursiveCharacterTextSplitter(
+def make_splitter(chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=overlap,
         separators=["\n\n", "\n", ".", " ", ""]
     )
 
-    records = []
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Chunking"):
-        chunks = splitter.split_text(row["cleaned_narrative"])
-        for i, chunk in enumerate(chunks):
-            records.append({
-                "chunk_id": f"{row.name}_{i}",
-                "product": row["Product"],
-                "complaint_id": row.get("Complaint ID", row.name),
-                "chunk_text": chunk,
-                "original_narrative": row["cleaned_narrative"]
-            })
-    return pd.DataFrame(records)
+def split_texts(texts: List[str], chunk_size=CHUNK_SIZE,
+                overlap=CHUNK_OVERLAP) -> Tuple[List[str], np.ndarray]:
+    """Split a range of narratives. Returns the flat chunk list and chunks per narrative."""
+    splitter = make_splitter(chunk_size, overlap)
+    chunks = []
+    counts = np.empty(len(texts), dtype=np.int64)
+    for j, text in enumerate(texts):
+        pieces = splitter.split_text(text)
+        chunks.extend(pieces)
+        counts[j] = len(pieces)
+    return chunks, counts
+
+def worker_pool(workers: int):
+    """Process pool for `split_frame`, or an empty context when splitting serially."""
+    return ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext()
+
+def split_frame(df: pd.DataFrame, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP,
+                workers: int = 1, progress: bool = True,
+                pool: Optional[ProcessPoolExecutor] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Split the narratives of `df`. With workers > 1 the frame is cut into row
+    ranges that are split in a process pool; output is identical either way.
+    Batch loops pass a `pool` from `worker_pool` so workers are started once.
+    """
+    texts = df["cleaned_narrative"].tolist()
+
+    if workers > 1 and len(texts) > 1:
+        n_ranges = min(len(texts), workers * 4)
+        bounds = np.linspace(0, len(texts), n_ranges + 1, dtype=np.int64)
+        with (nullcontext(pool) if pool is not None else worker_pool(workers)) as pool:
+            futures = [
+                pool.submit(split_texts, texts[a:b], chunk_size, overlap)
+                for a, b in zip(bounds[:-1], bounds[1:])
+            ]
+            results = [f.result() for f in tqdm(futures, desc=f"Chunking ({workers} workers)",
+                                                 disable=not progress)]
+        chunks = list(chain.from_iterable(r[0] for r in results))
+        counts = np.concatenate([r[1] for r in results])
+    else:
+        chunks, counts = split_texts(tqdm(texts, desc="Chunking", disable=not progress),
+                                     chunk_size, overlap)
+    return chunks, counts
+
+def chunk_narratives(df: pd.DataFrame, chunk_size=CHUNK_SIZE,
+                     overlap=CHUNK_OVERLAP, workers: int = 1) -> pd.DataFrame:
+    chunks, counts = split_frame(df, chunk_size, overlap, workers)
+    return assemble_chunks(df, chunks, counts)
+
+def narrative_hashes(texts) -> List[str]:
+    return [hashlib.blake2b(str(t).encode("utf-8"), digest_size=NARRATIVE_HASH_BYTES).hexdigest()
+            for t in texts]
+
+def make_chunk_ids(df: pd.DataFrame, counts: np.ndarray) -> np.ndarray:
+    """
+    Chunk ids are `<complaint id>_<narrative hash>_<chunk index>`: the same
+    for the same complaint text whatever the input order, and new when the
+    narrative changes.
+    """
+    prefixes = (pd.Series(get_complaint_ids(df)).astype(str) + "_"
+                + pd.Series(narrative_hashes(df["cleaned_narrative"])))
+    labels = np.repeat(prefixes.to_numpy(), counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.arange(int(counts.sum())) - starts
+    return (pd.Series(labels) + "_" + pd.Series(positions).astype(str)).to_numpy()
+
+def get_complaint_ids(df: pd.DataFrame) -> np.ndarray:
+    if "Complaint ID" in df.columns:
+        return df["Complaint ID"].to_numpy()
+    return df.index.to_numpy()
+
+def assemble_chunks(df: pd.DataFrame, chunks: List[str], counts: np.ndarray) -> pd.DataFrame:
+    """Build the chunk frame column-wise from the flat chunk list."""
+    return pd.DataFrame({
+        "chunk_id": make_chunk_ids(df, counts),
+        "product": np.repeat(df["Product"].to_numpy(), counts),
+        "complaint_id": np.repeat(get_complaint_ids(df), counts),
+        "chunk_text": chunks,
+        "original_narrative": np.repeat(df["cleaned_narrative"].to_numpy(), counts),
+    })
+
+def chunk_offsets(text: str, chunks: List[str], overlap=CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """Character (start, end) of each chunk inside `text`."""
+    offsets, index, previous_len = [], 0, 0
+    for chunk in chunks:
+        start = text.find(chunk, max(0, index + previous_len - overlap))
+        if start < 0:
+            start = text.find(chunk)
+        if start < 0:
+            raise ValueError(f"Chunk {chunk[:40]!r} is not a substring of its narrative; "
+                             f"offsets would not reproduce it")
+        offsets.append((start, start + len(chunk)))
+        index, previous_len = start, len(chunk)
+    return offsets
+
+# === Streaming (columnar) output ===
+def stream_schemas():
+    import pyarrow as pa
+
+    narratives = pa.schema([
+        ("complaint_id", pa.int64()),
+        ("product", pa.string()),
+        ("narrative", pa.string()),
+    ])
+    chunks = pa.schema([
+        ("chunk_id", pa.string()),
+        ("complaint_id", pa.int64()),
+        ("product", pa.string()),
+        ("start", pa.int32()),
+        ("end", pa.int32()),
+    ])
+    return narratives, chunks
+
+def stream_chunk_narratives(input_path: str = INPUT_PATH, output_dir: str = STREAM_OUTPUT_DIR,
+                            batch_size: int = STREAM_BATCH_SIZE, chunk_size=CHUNK_SIZE,
+                            overlap=CHUNK_OVERLAP, workers: int = 1, bm25_builder=None,
+                            snapshot_path: Optional[str] = None) -> int:
+    """
+    Chunk the filtered CSV in record batches and write two Parquet files:
+    `narratives.parquet` holds each narrative once, `chunks.parquet` holds
+    chunk ids with (start, end) offsets into it. Batch i of the input becomes
+    row group i of both files, so readers can join them group by group.
+    Chunks are also fed to `bm25_builder` when given, and the complaint
+    snapshot used by delta mode is written to `snapshot_path` when given.
+    Returns the number of chunks written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(output_dir, exist_ok=True)
+    narrative_schema, chunk_schema = stream_schemas()
+    narrative_writer = pq.ParquetWriter(os.path.join(output_dir, NARRATIVES_FILE), narrative_schema)
+    chunk_writer = pq.ParquetWriter(os.path.join(output_dir, CHUNKS_FILE), chunk_schema)
+
+    total, snapshots = 0, []
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for batch in tqdm(pd.read_csv(input_path, chunksize=batch_size), desc="Chunking batches"):
+            batch = batch[batch["cleaned_narrative"].notna()]
+            if batch.empty:
+                continue
+            if snapshot_path:
+                snapshots.append(make_snapshot(batch))
+            chunks, counts = split_frame(batch, chunk_size, overlap, workers, progress=False, pool=pool)
+            narratives = batch["cleaned_narrative"].tolist()
+            complaint_ids = get_complaint_ids(batch)
+
+            offsets, position = [], 0
+            for text, n in zip(narratives, counts):
+                offsets.extend(chunk_offsets(text, chunks[position:position + n], overlap))
+                position += n
+            offsets = np.asarray(offsets, dtype=np.int32).reshape(-1, 2)
+
+            narrative_table = pa.Table.from_arrays([
+                pa.array(complaint_ids, pa.int64()),
+                pa.array(batch["Product"].to_numpy(), pa.string()),
+                pa.array(narratives, pa.string()),
+            ], schema=narrative_schema)
+            chunk_table = pa.Table.from_arrays([
+                pa.array(make_chunk_ids(batch, counts), pa.string()),
+                pa.array(np.repeat(complaint_ids, counts), pa.int64()),
+                pa.array(np.repeat(batch["Product"].to_numpy(), counts), pa.string()),
+                pa.array(offsets[:, 0]),
+                pa.array(offsets[:, 1]),
+            ], schema=chunk_schema)
+
+            narrative_writer.write_table(narrative_table, row_group_size=max(1, len(narrative_table)))
+            chunk_writer.write_table(chunk_table, row_group_size=max(1, len(chunk_table)))
+            if bm25_builder is not None:
+                bm25_builder.add(chunk_table.column("chunk_id").to_pylist(), chunks,
+                                 chunk_table.column("product").to_pylist())
+            total += len(chunk_table)
+    finally:
+        narrative_writer.close()
+        chunk_writer.close()
+        if pool is not None:
+            pool.shutdown()
+    if snapshot_path:
+        save_snapshot(snapshots, snapshot_path)
+    return total
+
+def iter_parquet_chunks(output_dir: str, batch_size: int):
+    """
+    Yield chunk frames (chunk_id, product, complaint_id, chunk_text) of at most
+    `batch_size` rows from a streaming-mode output, one row group at a time.
+    """
+    import pyarrow.parquet as pq
+
+    narrative_file = pq.ParquetFile(os.path.join(output_dir, NARRATIVES_FILE))
+    chunk_file = pq.ParquetFile(os.path.join(output_dir, CHUNKS_FILE))
+    for group in range(chunk_file.num_row_groups):
+        narratives = narrative_file.read_row_group(group, columns=["complaint_id", "narrative"])
+        by_id = dict(zip(narratives.column("complaint_id").to_pylist(),
+                         narratives.column("narrative").to_pylist()))
+        chunks = chunk_file.read_row_group(group).to_pandas()
+        chunks["chunk_text"] = [
+            by_id[cid][start:end]
+            for cid, start, end in zip(chunks["complaint_id"], chunks["start"], chunks["end"])
+        ]
+        chunks = chunks.drop(columns=["start", "end"])
+        for start in range(0, len(chunks), batch_size):
+            yield chunks.iloc[start:start + batch_size].reset_index(drop=True)
+
+def count_parquet_chunks(output_dir: str) -> int:
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(os.path.join(output_dir, CHUNKS_FILE)).metadata.num_rows
+
+# === Delta mode ===
+def make_snapshot(df: pd.DataFrame) -> pd.DataFrame:
+    """complaint_id -> (product, narrative_hash) for one batch of the filtered data."""
+    return pd.DataFrame({
+        "complaint_id": get_complaint_ids(df),
+        "product": df["Product"].astype(str).to_numpy(),
+        "narrative_hash": narrative_hashes(df["cleaned_narrative"]),
+    })
+
+def load_snapshot(path: str = SNAPSHOT_PATH) -> pd.DataFrame:
+    """Last applied snapshot indexed by complaint_id (empty if there is none)."""
+    if not os.path.exists(path):
+        return pd.DataFrame({"product": pd.Series(dtype=str), "narrative_hash": pd.Series(dtype=str)},
+                            index=pd.Index([], dtype=np.int64, name="complaint_id"))
+    return pd.read_parquet(path).set_index("complaint_id")
+
+def chunk_delta(input_path: str = INPUT_PATH, snapshot_path: str = SNAPSHOT_PATH,
+                output_path: str = DELTA_OUTPUT_PATH, stale_path: str = DELTA_STALE_PATH,
+                pending_path: str = PENDING_SNAPSHOT_PATH, batch_size: int = STREAM_BATCH_SIZE,
+                chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, workers: int = 1) -> dict:
+    """
+    Compare the filtered data with the last snapshot by complaint_id and
+    narrative hash (and product), then chunk only new or changed complaints
+    into `output_path`. Complaint ids whose old chunks must be removed
+    (changed or no longer present) go to `stale_path`, and the new snapshot
+    to `pending_path`. The input is read in batches of `batch_size`.
+    """
+    old = load_snapshot(snapshot_path)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    parts, changed_ids = [], []
+    stats = {"new": 0, "changed": 0, "unchanged": 0, "chunks": 0}
+
+    with open(output_path, "w", newline="") as out, worker_pool(workers) as pool:
+        header = True
+        for batch in tqdm(pd.read_csv(input_path, chunksize=batch_size), desc="Diffing batches"):
+            batch = batch[batch["cleaned_narrative"].notna()]
+            snapshot = make_snapshot(batch)
+            parts.append(snapshot)
+
+            previous = old.reindex(snapshot["complaint_id"])
+            is_new = previous["narrative_hash"].isna().to_numpy()
+            differs = ((previous["narrative_hash"].to_numpy() != snapshot["narrative_hash"].to_numpy())
+                       | (previous["product"].to_numpy() != snapshot["product"].to_numpy()))
+            stats["new"] += int(is_new.sum())
+            stats["changed"] += int((differs & ~is_new).sum())
+            stats["unchanged"] += int((~differs).sum())
+            changed_ids.extend(snapshot["complaint_id"][differs & ~is_new].tolist())
+
+            todo = batch[differs]
+            if todo.empty:
+                continue
+            chunks, counts = split_frame(todo, chunk_size, overlap, workers, progress=False, pool=pool)
+            chunked = assemble_chunks(todo, chunks, counts).drop(columns=["original_narrative"])
+            chunked.to_csv(out, index=False, header=header)
+            header = False
+            stats["chunks"] += len(chunked)
+        if header:
+            out.write("chunk_id,product,complaint_id,chunk_text\n")
+
+    new = save_snapshot(parts, pending_path)
+    deleted = old.index.difference(pd.Index(new["complaint_id"]))
+    stats["deleted"] = len(deleted)
+
+    stale = pd.DataFrame({"complaint_id": np.concatenate([np.asarray(changed_ids, dtype=np.int64),
+                                                          deleted.to_numpy(dtype=np.int64)])})
+    stale.to_csv(stale_path, index=False)
+    return stats
+
+def save_snapshot(parts: List[pd.DataFrame], path: str = PENDING_SNAPSHOT_PATH) -> pd.DataFrame:
+    """Write the snapshot built from `make_snapshot` batches (last row wins per complaint)."""
+    if parts:
+        snapshot = pd.concat(parts, ignore_index=True).drop_duplicates("complaint_id", keep="last")
+    else:
+        snapshot = pd.DataFrame({"complaint_id": pd.Series(dtype=np.int64),
+                                 "product": pd.Series(dtype=str), "narrative_hash": pd.Series(dtype=str)})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    snapshot.to_parquet(path, index=False)
+    return snapshot
+
+def promote_snapshot(pending_path: str = PENDING_SNAPSHOT_PATH, snapshot_path: str = SNAPSHOT_PATH) -> bool:
+    """Make the pending snapshot current once its delta is indexed."""
+    if not os.path.exists(pending_path):
+        return False
+    os.replace(pending_path, snapshot_path)
+    return True
 
 def save_chunked_data(df: pd.DataFrame, path: str):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     df.to_csv(path, index=False)
 
+def parse_args():
+    argv = [arg for arg in sys.argv[1:] if not arg.startswith("-f")]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes used for splitting (default: 1)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Chunk in record batches and write the Parquet format")
+    parser.add_argument("--batch_size", type=int, default=STREAM_BATCH_SIZE,
+                        help="Narratives per batch in --stream mode")
+    parser.add_argument("--bm25", action="store_true",
+                        help="Also build the BM25 lexical index over chunk_text")
+    parser.add_argument("--delta", action="store_true",
+                        help="Chunk only complaints that are new or changed since the last snapshot")
+    args, _ = parser.parse_known_args(argv)
+    if args.bm25 and args.delta:
+        # The BM25 postings and IDF stats are written whole; a delta cannot patch them
+        parser.error("--bm25 cannot be combined with --delta; rebuild the lexical index with --stream --bm25")
+    return args
+
 def main():
+    args = parse_args()
+    bm25_builder = None
+    if args.bm25:
+        from lexical_index import BM25IndexBuilder, BM25_INDEX_DIR
+        bm25_builder = BM25IndexBuilder()
+
+    if args.delta:
+        print(f" Diffing {INPUT_PATH} against {SNAPSHOT_PATH}...")
+        stats = chunk_delta(INPUT_PATH, batch_size=args.batch_size, workers=args.workers)
+        print(f" New: {stats['new']:,} | Changed: {stats['changed']:,} | Deleted: {stats['deleted']:,} "
+              f"| Unchanged: {stats['unchanged']:,}")
+        print(f" Saved {stats['chunks']:,} chunks to {DELTA_OUTPUT_PATH}, stale complaint ids to "
+              f"{DELTA_STALE_PATH}")
+        print(" Apply with: python src/embedding.py --delta")
+        return
+
+    if args.stream:
+        print(f" Streaming {INPUT_PATH} in batches of {args.batch_size}...")
+        total = stream_chunk_narratives(INPUT_PATH, STREAM_OUTPUT_DIR,
+                                        batch_size=args.batch_size, workers=args.workers,
+                                        bm25_builder=bm25_builder, snapshot_path=PENDING_SNAPSHOT_PATH)
+        print(f" Saved {total} chunks to {STREAM_OUTPUT_DIR}")
+        if bm25_builder is not None:
+            print(f" Writing BM25 index to {bm25_builder.write(BM25_INDEX_DIR)}")
+        print(" Done.")
+        return
+
     print(" Loading filtered complaints...")
     df = load_filtered_data(INPUT_PATH)
 
-    print(" Splitting narratives into chunks...")
-    chunked_df = chunk_narratives(df)
+    print(f" Splitting narratives into chunks (workers = {args.workers})...")
+    chunked_df = chunk_narratives(df, workers=args.workers)
 
     print(f" Saving {len(chunked_df)} chunks to {OUTPUT_PATH}")
     save_chunked_data(chunked_df, OUTPUT_PATH)
+    save_snapshot([make_snapshot(df[df["cleaned_narrative"].notna()])], PENDING_SNAPSHOT_PATH)
+
+    if bm25_builder is not None:
+        bm25_builder.add(chunked_df["chunk_id"], chunked_df["chunk_text"], chunked_df["product"])
+        print(f" Writing BM25 index to {bm25_builder.write(BM25_INDEX_DIR)}")
     print(" Done.")
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+# context_builder.py
+
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from langchain.docstore.document import Document
+
+# === Config ===
+MIN_MERGE_OVERLAP = 20          # characters a suffix/prefix must share to be merged
+NEAR_DUPLICATE_JACCARD = 0.9    # word-shingle similarity treated as a duplicate
+SHINGLE_SIZE = 3
+PASSAGE_SEPARATOR = "\n\n"
+
+
+@dataclass
+class PackedContext:
+    """Context string plus the token accounting for one query."""
+    text: str
+    docs: List[Document]
+    tokens_before: int
+    tokens_after: int
+    dropped: List[Document] = field(default_factory=list)
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def build_context(docs: List[Document], count_tokens: Callable[[str], int],
+                  max_tokens: Optional[int] = None) -> PackedContext:
+    """
+    Turn retrieved chunks (in relevance order) into a compact context:
+
+    1. overlapping chunks of the same complaint are merged into one passage,
+    2. near-duplicate passages are dropped,
+    3. passages are packed in relevance order until `max_tokens` is reached
+       (a passage that does not fit is skipped so a smaller one may still fit).
+    """
+    naive = PASSAGE_SEPARATOR.join(d.page_content for d in docs)
+    tokens_before = count_tokens(naive) if docs else 0
+
+    passages = _remove_near_duplicates(_merge_overlapping(docs))
+
+    packed, used, dropped = [], 0, []
+    separator_tokens = count_tokens(PASSAGE_SEPARATOR)
+    for doc in passages:
+        cost = count_tokens(doc.page_content) + (separator_tokens if packed else 0)
+        if max_tokens is not None and used + cost > max_tokens:
+            dropped.append(doc)
+            continue
+        packed.append(doc)
+        used += cost
+
+    text = PASSAGE_SEPARATOR.join(d.page_content for d in packed)
+    return PackedContext(
+        text=text,
+        docs=packed,
+        tokens_before=tokens_before,
+        tokens_after=count_tokens(text) if packed else 0,
+        dropped=dropped,
+    )
+
+
+def _merge_overlapping(docs: List[Document]) -> List[Document]:
+    """Merge chunks of the same complaint whose text overlaps; keeps the best rank of each group."""
+    merged: List[Document] = []
+    by_complaint = {}
+    for doc in docs:
+        cid = doc.metadata.get("complaint_id")
+        if cid is None:
+            merged.append(doc)
+            continue
+        for i in by_complaint.get(cid, []):
+            text = _join_overlap(merged[i].page_content, doc.page_content)
+            if text is not None:
+                merged[i] = Document(page_content=text, metadata=merged[i].metadata)
+                break
+        else:
+            by_complaint.setdefault(cid, []).append(len(merged))
+            merged.append(doc)
+    return merged
+
+
+def _join_overlap(a: str, b: str) -> Optional[str]:
+    """Join two passages if one contains the other or a suffix of one starts the other."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    for left, right in ((a, b), (b, a)):
+        for size in range(min(len(left), len(right)) - 1, MIN_MERGE_OVERLAP - 1, -1):
+            if left.endswith(right[:size]):
+                return left + right[size:]
+    return None
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _remove_near_duplicates(docs: List[Document]) -> List[Document]:
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(_jaccard(shingles, other) >= NEAR_DUPLICATE_JACCARD for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
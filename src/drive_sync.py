@@ -0,0 +1,168 @@
+# drive_sync.py
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+MANIFEST_NAME = ".sync_manifest.json"
+COPY_BLOCK = 4 * 1024 * 1024
+
+
+class IncrementalSync:
+    """
+    Mirror `src_dir` into `dst_dir`, copying only files whose size/mtime
+    changed since the last sync (files with a new mtime but identical
+    content hash are skipped). Files removed from `src_dir` are removed from
+    `dst_dir`. `start()` runs syncs on a background thread; `request()` asks
+    for one and returns immediately, coalescing requests made while a copy
+    is in progress.
+
+    Writers hold `lock` while modifying `src_dir`. A sync holds it only to
+    list changed files and to swap in the new manifest; copies run outside
+    it, and a file modified while it was being copied is left for the next
+    sync instead of being published half-written.
+    """
+
+    def __init__(self, src_dir: str, dst_dir: str, manifest_path: Optional[str] = None):
+        self.src_dir = src_dir
+        self.dst_dir = dst_dir
+        self.manifest_path = manifest_path or os.path.join(dst_dir, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.manifest: Dict[str, dict] = self._load_manifest()
+        self.files_copied = 0
+        self.bytes_copied = 0
+        self.syncs = 0
+        self.error: Optional[Exception] = None
+        self._wanted = threading.Event()
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+
+    # --- background mode ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="drive-sync", daemon=True)
+        self._thread.start()
+        return self
+
+    def request(self):
+        if self._thread is None:
+            self.sync_once()
+        else:
+            self._wanted.set()
+
+    def close(self):
+        """Run a final sync and stop the background thread."""
+        if self._thread is not None:
+            self._closing = True
+            self._wanted.set()
+            self._thread.join()
+            self._thread = None
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        while True:
+            self._wanted.wait()
+            self._wanted.clear()
+            try:
+                self.sync_once()
+            except Exception as e:
+                self.error = e
+            if self._closing:
+                return
+
+    # --- sync ---
+    def sync_once(self) -> int:
+        """Copy changed files. Returns the number of files copied."""
+        with self.lock:
+            changed, seen = self._changed_files()
+
+        copied, updates = 0, {}
+        for rel, st in changed:
+            src = os.path.join(self.src_dir, rel)
+            entry = self.manifest.get(rel)
+            try:
+                if entry and entry["size"] == st.st_size and _file_hash(src) == entry["hash"]:
+                    updates[rel] = dict(entry, mtime_ns=st.st_mtime_ns)
+                    continue
+                digest = self._copy(src, os.path.join(self.dst_dir, rel), st)
+            except FileNotFoundError:
+                continue            # removed after the listing; the next sync drops it
+            if digest is None:
+                continue
+            updates[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest}
+            copied += 1
+            self.bytes_copied += st.st_size
+
+        removed = set(self.manifest) - seen
+        for rel in removed:
+            dst = os.path.join(self.dst_dir, rel)
+            if os.path.exists(dst):
+                os.remove(dst)
+
+        manifest = {rel: entry for rel, entry in self.manifest.items() if rel not in removed}
+        manifest.update(updates)
+        with self.lock:
+            self.manifest = manifest
+        self._save_manifest()
+        self.files_copied += copied
+        self.syncs += 1
+        return copied
+
+    def _changed_files(self):
+        """(relative path, stat) of files whose size/mtime differ from the manifest, plus all paths seen."""
+        changed, seen = [], set()
+        for root, _, files in os.walk(self.src_dir):
+            for name in files:
+                src = os.path.join(root, name)
+                rel = os.path.relpath(src, self.src_dir)
+                seen.add(rel)
+                st = os.stat(src)
+                entry = self.manifest.get(rel)
+                if not (entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns):
+                    changed.append((rel, st))
+        return changed, seen
+
+    def _copy(self, src: str, dst: str, st: os.stat_result) -> Optional[str]:
+        """
+        Copy via a temp file and return the content hash computed while copying,
+        or None (keeping `dst` as it was) if `src` changed since `st` was taken.
+        """
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        digest = hashlib.blake2b(digest_size=16)
+        tmp = dst + ".partial"
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            for block in iter(lambda: fin.read(COPY_BLOCK), b""):
+                digest.update(block)
+                fout.write(block)
+        try:
+            now = os.stat(src)
+        except FileNotFoundError:
+            now = None
+        if now is None or (now.st_size, now.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+            os.remove(tmp)
+            return None
+        os.replace(tmp, dst)
+        return digest.hexdigest()
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp = self.manifest_path + ".partial"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
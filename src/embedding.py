@@ -1,54 +1,136 @@
 import os
 import sys
-import shutil
+import time
+import queue
+import threading
 import pandas as pd
 import argparse
-from typing import Set, List
-from tqdm import tqdm
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.docstore.document import Document
+from typing import Dict, List, Optional
+from embedding_cache import EmbeddingCache, CachedEncoder
+from checkpoint import CheckpointStore
+from drive_sync import IncrementalSync
+from chunking import iter_parquet_chunks, count_parquet_chunks, promote_snapshot
+from chunking import DELTA_OUTPUT_PATH, DELTA_STALE_PATH
+from embedding_backends import EMBED_BACKENDS, make_encoder
+from vector_store import load_partitions, save_partitions, partition_collection_name
+from tracing import TRACER, span
 
 # === CLI compatibility ===
-def get_batch_size(default: int = 3000) -> int:
+def get_cli_args():
     if hasattr(sys, "argv"):
         argv = [arg for arg in sys.argv[1:] if not arg.startswith("-f")]
     else:
         argv = []
     parser = argparse.ArgumentParser()
-    parser.add_argument("--batch_size", type=int, default=default)
+    parser.add_argument("--batch_size", type=int, default=3000)
+    parser.add_argument("--embed_workers", type=int, default=1,
+                        help="CPU worker processes for encoding (default: 1)")
+    parser.add_argument("--embed_backend", choices=EMBED_BACKENDS, default="torch",
+                        help="torch (sentence-transformers fp32), int8, onnx or onnx-int8")
+    parser.add_argument("--embed_threads", type=int, default=0,
+                        help="Intra-op threads for the int8/onnx backends (0 = library default)")
+    parser.add_argument("--no_embed_cache", action="store_true",
+                        help="Encode every chunk instead of reusing cached vectors")
+    parser.add_argument("--partition_by_product", action="store_true",
+                        help="Also write every chunk to a per-product Chroma collection")
+    parser.add_argument("--chunked_path", type=str, default=None,
+                        help="Chunk CSV, or a streaming-mode Parquet directory")
+    parser.add_argument("--delta", action="store_true",
+                        help="Apply the delta from `chunking.py --delta`: delete stale chunks, embed new ones")
     args, _ = parser.parse_known_args(argv)
-    return args.batch_size
+    return args
+
+def get_batch_size(default: int = 3000) -> int:
+    return get_cli_args().batch_size or default
 
 # === Config ===
-CHUNKED_PATH = "data/processed/chunked/chunked_complaints.csv"
+DELTA_MODE = get_cli_args().delta
+CHUNKED_PATH = get_cli_args().chunked_path or (
+    DELTA_OUTPUT_PATH if DELTA_MODE else "data/processed/chunked/chunked_complaints.csv")
 
 # Local (fast) storage
 LOCAL_CHROMA_DIR = "/content/chroma_index/"
 # Permanent backup on Drive
 DRIVE_CHROMA_DIR = "vector_store/chroma_index/"
 
-CHECKPOINT_PATH = "vector_store/embedded_ids.txt"
+CHECKPOINT_PATH = "vector_store/checkpoint.sqlite3"
+# Imported once into CHECKPOINT_PATH if present
+LEGACY_CHECKPOINT_PATH = "vector_store/embedded_ids.txt"
+# Content-hash embedding cache, shared across re-chunking runs
+EMBED_CACHE_DIR = "vector_store/embedding_cache/"
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 BATCH_SIZE = get_batch_size()
+EMBED_WORKERS = get_cli_args().embed_workers
+EMBED_BACKEND = get_cli_args().embed_backend
+EMBED_THREADS = get_cli_args().embed_threads
+AGREEMENT_SAMPLE = 256      # chunks embedded by both models to check a fast backend
+USE_EMBED_CACHE = not get_cli_args().no_embed_cache
+PARTITION_BY_PRODUCT = get_cli_args().partition_by_product
+ENCODE_BATCH_SIZE = 64      # sentences per forward pass
+QUEUE_DEPTH = 2             # batches buffered between pipeline stages
+DELETE_BATCH_SIZE = 500     # complaint ids per Chroma delete query
+# Per-batch stage latency histograms (p50/p95/p99) written after each run
+TRACE_PATH = "vector_store/index_trace.json"
+
+# === Chroma ===
+def open_chroma(**kwargs):
+    """LangChain Chroma store under LOCAL_CHROMA_DIR; imported here so the chunk/delta helpers load without it."""
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(persist_directory=LOCAL_CHROMA_DIR, **kwargs)
+
+# === Chunk Readers ===
+def is_parquet_chunks(path: str) -> bool:
+    """Streaming-mode chunking writes a directory of Parquet files."""
+    return os.path.isdir(path)
+
+def iter_chunk_batches(chunked_path: str, batch_size: int):
+    """Yield chunk frames of at most `batch_size` rows from CSV or Parquet output."""
+    if is_parquet_chunks(chunked_path):
+        yield from iter_parquet_chunks(chunked_path, batch_size)
+    else:
+        yield from pd.read_csv(chunked_path, chunksize=batch_size)
+
+def count_chunks(chunked_path: str) -> int:
+    if is_parquet_chunks(chunked_path):
+        return count_parquet_chunks(chunked_path)
+    return sum(1 for _ in open(chunked_path)) - 1
 
 # === Checkpoint Utils ===
-def load_embedded_ids(path: str) -> Set[str]:
-    if not os.path.exists(path):
-        return set()
-    with open(path, "r") as f:
-        return set(line.strip() for line in f if line.strip())
-
-def save_embedded_ids(path: str, chunk_ids: List[str]):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "a") as f:
-        for cid in chunk_ids:
-            f.write(f"{cid}\n")
+def chunk_source(chunked_path: str) -> str:
+    """Key under which the checkpoint records a chunk file's committed ids."""
+    return os.path.abspath(chunked_path)
+
+def count_chunks_cached(chunked_path: str, checkpoint: CheckpointStore) -> int:
+    """
+    Row count of the chunk file, recounted only when its size or mtime
+    changes. A rewritten file also drops the committed ids recorded for it.
+    """
+    st = os.stat(chunked_path)
+    key = f"rows:{chunk_source(chunked_path)}"
+    entry = checkpoint.get_manifest(key)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["rows"]
+    if entry:
+        checkpoint.clear_source(chunk_source(chunked_path))
+    rows = count_chunks(chunked_path)
+    checkpoint.set_manifest(key, {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "rows": rows})
+    return rows
+
+def count_committed(chunked_path: str, checkpoint: CheckpointStore) -> int:
+    """Chunks of this file that are already committed, as recorded by the indexing run."""
+    return checkpoint.count_source(chunk_source(chunked_path))
 
 def verify_progress(chunked_path, checkpoint_path):
-    total_chunks = sum(1 for _ in open(chunked_path)) - 1
-    embedded_ids = load_embedded_ids(checkpoint_path)
-    embedded_count = len(embedded_ids)
+    checkpoint = CheckpointStore(checkpoint_path)
+    imported = checkpoint.import_text_checkpoint(LEGACY_CHECKPOINT_PATH)
+    if imported:
+        print(f" Imported {imported:,} ids from {LEGACY_CHECKPOINT_PATH}")
+
+    total_chunks = count_chunks_cached(chunked_path, checkpoint)
+    # Only ids of this file count: the checkpoint also holds other files' ids (and
+    # old row-label ids), so its global count can hide chunks that still need embedding
+    embedded_count = count_committed(chunked_path, checkpoint)
     remaining = total_chunks - embedded_count
     print("="*60)
     print(" Progress Check")
@@ -56,81 +138,393 @@ def verify_progress(chunked_path, checkpoint_path):
     print(f"   Already embedded  : {embedded_count:,}")
     print(f"   Remaining         : {remaining:,}")
     print("="*60)
-    return embedded_ids, total_chunks, remaining
+    return checkpoint, total_chunks, remaining
 
-# === Safe Sync to Drive ===
-def sync_to_drive():
+# === Incremental Sync to Drive ===
+def make_drive_sync() -> IncrementalSync:
+    """Background syncer that copies only Chroma files changed since the last sync."""
     os.makedirs(DRIVE_CHROMA_DIR, exist_ok=True)
-    shutil.copytree(LOCAL_CHROMA_DIR, DRIVE_CHROMA_DIR, dirs_exist_ok=True)
-    print(" Synced local Chroma index to Google Drive.")
+    return IncrementalSync(LOCAL_CHROMA_DIR, DRIVE_CHROMA_DIR)
+
+def sync_to_drive():
+    syncer = make_drive_sync()
+    copied = syncer.sync_once()
+    print(f" Synced local Chroma index to Google Drive ({copied} changed files).")
+
+# === Pipeline Stages ===
+class StageStats:
+    """Busy time and item count of one pipeline stage; each batch is also traced as `index.<name>`."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    def record(self, items: int, seconds: float):
+        self.items += items
+        self.batches += 1
+        self.busy_seconds += seconds
+        TRACER.record(f"index.{self.name}", seconds)
+
+    @property
+    def rate(self) -> float:
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+def report_stage_stats(stages: List[StageStats], wall_seconds: float):
+    print("=" * 60, flush=True)
+    print(" Pipeline Throughput", flush=True)
+    for st in stages:
+        print(f"   {st.name:<8}: {st.items:>9,} chunks in {st.busy_seconds:8.1f}s busy "
+              f"({st.rate:,.0f} chunks/s, {st.batches} batches)", flush=True)
+    slowest = max(stages, key=lambda st: st.busy_seconds)
+    print(f"   Wall time : {wall_seconds:.1f}s  |  Bottleneck: {slowest.name}", flush=True)
+    print("=" * 60, flush=True)
+
+_DONE = object()
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    """Blocking put that gives up once another stage has failed."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _DONE
+
+def prepare_batch(chunk_df: pd.DataFrame, checkpoint: CheckpointStore,
+                  source: Optional[str] = None) -> Optional[dict]:
+    """
+    Drop already-embedded rows and split a chunk frame into columns for Chroma.
+    Dropped rows are recorded as committed for `source` when given.
+    """
+    required_cols = {"chunk_text", "product", "complaint_id", "chunk_id"}
+    if not required_cols.issubset(chunk_df.columns):
+        missing = required_cols - set(chunk_df.columns)
+        print(f" Missing columns: {missing}. Skipping batch.", flush=True)
+        return None
+
+    chunk_df = chunk_df.assign(chunk_id=chunk_df["chunk_id"].astype(str))
+    committed = checkpoint.existing(chunk_df["chunk_id"].tolist())
+    if committed:
+        if source is not None:
+            checkpoint.add(committed, source)
+        chunk_df = chunk_df[~chunk_df["chunk_id"].isin(committed)]
+    if chunk_df.empty:
+        return None
+
+    ids = chunk_df["chunk_id"].tolist()
+    metadatas = [
+        {"product": p, "complaint_id": c, "chunk_id": cid}
+        for p, c, cid in zip(chunk_df["product"].tolist(), chunk_df["complaint_id"].tolist(), ids)
+    ]
+    return {"ids": ids, "texts": chunk_df["chunk_text"].tolist(), "metadatas": metadatas}
+
+class SentenceEncoder:
+    """Calls the sentence-transformer directly, optionally over several CPU processes."""
+
+    def __init__(self, model_name: str = EMBED_MODEL_NAME, workers: int = 1,
+                 batch_size: int = ENCODE_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.batch_size = batch_size
+        self.pool = self.model.start_multi_process_pool(["cpu"] * workers) if workers > 1 else None
+
+    def encode(self, texts: List[str]):
+        if self.pool is not None:
+            return self.model.encode_multi_process(texts, self.pool, batch_size=self.batch_size)
+        return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
 
 # === Embedding + Chroma ===
-def embed_and_index_chroma(chunked_path, checkpoint_path):
-    embedded_ids, total_rows, remaining = verify_progress(chunked_path, checkpoint_path)
+class PartitionWriter:
+    """Upserts each batch into one Chroma collection per product value."""
+
+    def __init__(self, persist_directory: str):
+        self.persist_directory = persist_directory
+        self.partitions = load_partitions(persist_directory)
+        self.collections = {}
+
+    def upsert(self, batch: dict):
+        by_product = {}
+        for i, meta in enumerate(batch["metadatas"]):
+            by_product.setdefault(meta["product"], []).append(i)
+        for product, rows in by_product.items():
+            self._collection(product).upsert(
+                ids=[batch["ids"][i] for i in rows],
+                embeddings=[batch["embeddings"][i] for i in rows],
+                metadatas=[batch["metadatas"][i] for i in rows],
+                documents=[batch["texts"][i] for i in rows],
+            )
+
+    def _collection(self, product: str):
+        if product not in self.collections:
+            if product not in self.partitions:
+                self.partitions[product] = partition_collection_name(product)
+                save_partitions(self.persist_directory, self.partitions)
+            from langchain_community.vectorstores import Chroma
+
+            self.collections[product] = Chroma(collection_name=self.partitions[product],
+                                               persist_directory=self.persist_directory)._collection
+        return self.collections[product]
+
+    def report(self):
+        print(" Product partitions:", flush=True)
+        for product, name in sorted(self.partitions.items()):
+            collection = self._collection(product)
+            print(f"   {product:<25}: {collection.count():>9,} chunks ({name})", flush=True)
+
+def make_bulk_encoder(chunked_path: str, backend: str = EMBED_BACKEND, embed_workers: int = EMBED_WORKERS,
+                      threads: int = EMBED_THREADS):
+    """
+    sentence-transformers over `embed_workers` processes for the "torch"
+    backend; otherwise a quantized/ONNX encoder that is first checked against
+    the fp32 model on a sample of the chunks to embed.
+    """
+    if backend == "torch":
+        print(f" Initializing embedding model ({embed_workers} worker(s))...", flush=True)
+        return SentenceEncoder(EMBED_MODEL_NAME, workers=embed_workers)
+    print(f" Initializing {backend} embedding backend ({threads or 'default'} threads)...", flush=True)
+    first = next(iter_chunk_batches(chunked_path, AGREEMENT_SAMPLE), None)
+    sample = first["chunk_text"].astype(str).tolist() if first is not None else None
+    return make_encoder(backend, EMBED_MODEL_NAME, threads=threads, batch_size=ENCODE_BATCH_SIZE,
+                        check_texts=sample)
+
+def embed_and_index_chroma(chunked_path, checkpoint_path, embed_workers: int = EMBED_WORKERS,
+                           use_cache: bool = USE_EMBED_CACHE,
+                           partition_by_product: bool = PARTITION_BY_PRODUCT,
+                           backend: str = EMBED_BACKEND):
+    """
+    Embed and index chunks with three stages connected by bounded queues:
+    reader (read + filter + prep) -> encoder (sentence-transformer) ->
+    writer (Chroma upsert, checkpoint). Reading and writing overlap
+    with encoding instead of running strictly one after another.
+
+    With `use_cache`, duplicate chunks and chunks seen in earlier runs are
+    served from the content-hash cache in EMBED_CACHE_DIR.
+
+    Changed Chroma files are copied to Drive by a background syncer; the
+    writer only waits while the syncer lists changed files, not while it copies.
+
+    With `partition_by_product`, every batch is also written to a
+    per-product collection (listed in partitions.json) so filtered queries
+    can skip metadata filtering over the global index. Chunks embedded
+    before partitioning was enabled can be backfilled with
+    `python src/vector_store.py --chroma_dir <dir> --partitions`.
+
+    Once every chunk is indexed, the pending snapshot written by chunking.py
+    becomes the baseline for the next `--delta` run.
+    """
+    checkpoint, total_rows, remaining = verify_progress(chunked_path, checkpoint_path)
     if remaining <= 0:
         print(" All chunks are already embedded! Nothing to do.")
+        checkpoint.close()
+        if promote_snapshot():
+            print(" Complaint snapshot updated.", flush=True)
         return
 
-    print(" Initializing embedding model...", flush=True)
-    embedder = HuggingFaceEmbeddings(model_name=EMBED_MODEL_NAME)
+    encoder = make_bulk_encoder(chunked_path, backend, embed_workers)
+    if use_cache:
+        # Vectors from different backends are cached apart
+        cache_name = EMBED_MODEL_NAME if backend == "torch" else getattr(encoder, "name", EMBED_MODEL_NAME)
+        encoder = CachedEncoder(encoder, EmbeddingCache(EMBED_CACHE_DIR, cache_name))
+        print(f" Embedding cache: {len(encoder.cache):,} vectors in {EMBED_CACHE_DIR}", flush=True)
 
     # Ensure local Chroma directory
     os.makedirs(LOCAL_CHROMA_DIR, exist_ok=True)
 
-    # Load or initialize Chroma
+    # Load or initialize Chroma (vectors are precomputed, so no embedding function)
     print(" Loading / Initializing Chroma index...")
-    vector_db = Chroma(
-        persist_directory=LOCAL_CHROMA_DIR,
-        embedding_function=embedder
-    )
+    vector_db = open_chroma()
+    syncer = make_drive_sync().start()
+    partition_writer = PartitionWriter(LOCAL_CHROMA_DIR) if partition_by_product else None
 
-    processed_rows = len(embedded_ids)
+    source = chunk_source(chunked_path)
+    prep_queue = queue.Queue(maxsize=QUEUE_DEPTH)
+    write_queue = queue.Queue(maxsize=QUEUE_DEPTH)
+    stop = threading.Event()
+    errors = []
+    stats = {name: StageStats(name) for name in ("read", "encode", "write")}
 
-    for i, chunk_df in enumerate(pd.read_csv(chunked_path, chunksize=BATCH_SIZE)):
-        print(f"\n Processing batch {i + 1} (batch size = {BATCH_SIZE})...", flush=True)
+    def reader():
+        try:
+            batches = iter_chunk_batches(chunked_path, BATCH_SIZE)
+            while True:
+                start = time.perf_counter()
+                chunk_df = next(batches, None)
+                if chunk_df is None:
+                    break
+                batch = prepare_batch(chunk_df, checkpoint, source)
+                stats["read"].record(len(batch["ids"]) if batch else 0, time.perf_counter() - start)
+                if batch is not None and not _put(prep_queue, batch, stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(prep_queue, _DONE, stop)
 
-        required_cols = {"chunk_text", "product", "complaint_id", "chunk_id"}
-        if not required_cols.issubset(chunk_df.columns):
-            missing = required_cols - set(chunk_df.columns)
-            print(f" Missing columns: {missing}. Skipping batch.", flush=True)
-            continue
+    def writer():
+        processed_rows = total_rows - remaining
+        try:
+            while True:
+                batch = _get(write_queue, stop)
+                if batch is _DONE:
+                    break
+                start = time.perf_counter()
+                with syncer.lock, span("index.upsert"):
+                    vector_db._collection.upsert(
+                        ids=batch["ids"],
+                        embeddings=batch["embeddings"],
+                        metadatas=batch["metadatas"],
+                        documents=batch["texts"],
+                    )
+                    if partition_writer is not None:
+                        partition_writer.upsert(batch)
+                    vector_db.persist()
+                with span("index.checkpoint"):
+                    checkpoint.add(batch["ids"], source)
 
-        # Filter out already embedded
-        chunk_df["chunk_id"] = chunk_df["chunk_id"].astype(str)
-        chunk_df = chunk_df[~chunk_df["chunk_id"].isin(embedded_ids)]
+                # Ask the background syncer to copy changed files to Drive
+                syncer.request()
+                stats["write"].record(len(batch["ids"]), time.perf_counter() - start)
 
-        if chunk_df.empty:
-            print(" Skipping (all chunks already embedded)", flush=True)
-            continue
+                processed_rows += len(batch["ids"])
+                print(f" Batch embedded. Progress: {processed_rows}/{total_rows} rows.", flush=True)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
 
-        documents, ids = [], []
-        for _, row in tqdm(chunk_df.iterrows(), total=len(chunk_df), desc="Creating documents"):
-            documents.append(
-                Document(
-                    page_content=row["chunk_text"],
-                    metadata={
-                        "product": row["product"],
-                        "complaint_id": row["complaint_id"],
-                        "chunk_id": row["chunk_id"]
-                    },
-                )
-            )
-            ids.append(row["chunk_id"])
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=reader, name="reader", daemon=True),
+               threading.Thread(target=writer, name="writer", daemon=True)]
+    for t in threads:
+        t.start()
 
-        print(f" Embedding {len(documents)} new chunks...", flush=True)
-        vector_db.add_documents(documents, ids=ids)
-        vector_db.persist()
+    # Encoding runs on the main thread (and its worker processes)
+    try:
+        while True:
+            batch = _get(prep_queue, stop)
+            if batch is _DONE:
+                break
+            start = time.perf_counter()
+            print(f"\n Embedding {len(batch['ids'])} new chunks...", flush=True)
+            batch["embeddings"] = encoder.encode(batch["texts"]).tolist()
+            stats["encode"].record(len(batch["ids"]), time.perf_counter() - start)
+            if not _put(write_queue, batch, stop):
+                break
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        _put(write_queue, _DONE, stop)
+        for t in threads:
+            t.join()
+        encoder.close()
+        print(" Waiting for final Drive sync...", flush=True)
+        syncer.close()
+        checkpoint.close()
 
-        save_embedded_ids(checkpoint_path, ids)
-        embedded_ids.update(ids)
+    if errors:
+        raise errors[0]
+    print(f" Drive sync: {syncer.files_copied:,} files / {syncer.bytes_copied / 1e6:,.1f} MB "
+          f"copied over {syncer.syncs} syncs.", flush=True)
 
-        processed_rows += len(documents)
-        print(f" Batch {i + 1} embedded. Progress: {processed_rows}/{total_rows} rows.", flush=True)
+    report_stage_stats(list(stats.values()), time.perf_counter() - wall_start)
+    TRACER.to_json(TRACE_PATH)
+    print(f" Per-batch stage latencies written to {TRACE_PATH}", flush=True)
+    if partition_writer is not None:
+        partition_writer.report()
+    if use_cache:
+        print(f" Dedup: {encoder.total - encoder.encoded:,}/{encoder.total:,} chunks reused "
+              f"cached vectors (dedup ratio {encoder.dedup_ratio:.1%}); "
+              f"{encoder.encoded:,} sent to the model.", flush=True)
+    if promote_snapshot():
+        print(" Complaint snapshot updated.", flush=True)
+    print("\n All batches completed and Chroma index saved!", flush=True)
 
-        # Sync to Drive after each batch
-        sync_to_drive()
+# === Delta refresh ===
+def stale_chunk_ids(collection, complaint_ids: List[int], keep: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    Ids of chunks stored for `complaint_ids`, except current versions: ids in
+    `keep` (chunk id -> product) whose stored product still matches. The
+    chunk id only hashes the narrative, so a product-only change keeps its id.
+    """
+    keep = keep or {}
+    found = collection.get(where={"complaint_id": {"$in": complaint_ids}}, include=["metadatas"])
+    return [cid for cid, meta in zip(found["ids"], found["metadatas"])
+            if cid not in keep or (meta or {}).get("product") != keep[cid]]
 
-    print("\n All batches completed and Chroma index saved!", flush=True)
+def delete_stale_chunks(collection, checkpoint: CheckpointStore, complaint_ids: List[int],
+                        keep: Optional[Dict[str, str]] = None, partitions=()) -> int:
+    """
+    Delete old chunks of changed or removed complaints from the main
+    collection (and checkpoint) and from every product partition. Chunks in
+    `keep` (chunk id -> product of the current version) stay when their
+    stored product matches, so re-running after an interrupted refresh is
+    safe; a chunk whose product changed is deleted and leaves the
+    checkpoint, so the upsert rewrites it. Returns the number of chunks removed.
+    """
+    removed = 0
+    for start in range(0, len(complaint_ids), DELETE_BATCH_SIZE):
+        batch = complaint_ids[start:start + DELETE_BATCH_SIZE]
+        stale = stale_chunk_ids(collection, batch, keep)
+        if stale:
+            collection.delete(ids=stale)
+            checkpoint.remove(stale)
+            removed += len(stale)
+        for partition in partitions:
+            stale = stale_chunk_ids(partition, batch, keep)
+            if stale:
+                partition.delete(ids=stale)
+    return removed
+
+def apply_delta(chunked_path: str = DELTA_OUTPUT_PATH, stale_path: str = DELTA_STALE_PATH,
+                checkpoint_path: str = CHECKPOINT_PATH,
+                partition_by_product: bool = PARTITION_BY_PRODUCT):
+    """
+    Apply the output of `chunking.py --delta`: delete stale chunks, then
+    embed and upsert the new/changed ones. Unchanged complaints are not touched.
+    """
+    stale_ids = pd.read_csv(stale_path)["complaint_id"].tolist() if os.path.exists(stale_path) else []
+    delta = pd.read_csv(chunked_path, usecols=["chunk_id", "product"])
+    keep = dict(zip(delta["chunk_id"].astype(str), delta["product"].astype(str)))
+    print(f" Delta: {len(keep):,} chunks to upsert, {len(stale_ids):,} complaints with stale chunks",
+          flush=True)
+
+    removed = 0
+    if stale_ids:
+        os.makedirs(LOCAL_CHROMA_DIR, exist_ok=True)
+        vector_db = open_chroma()
+        # Existing partitions are cleaned even if this run doesn't write them
+        partitions = [open_chroma(collection_name=name)._collection
+                      for name in load_partitions(LOCAL_CHROMA_DIR).values()]
+        checkpoint = CheckpointStore(checkpoint_path)
+        try:
+            removed = delete_stale_chunks(vector_db._collection, checkpoint, stale_ids, keep, partitions)
+        finally:
+            checkpoint.close()
+        vector_db.persist()
+        print(f" Deleted {removed:,} stale chunks.", flush=True)
+
+    embed_and_index_chroma(chunked_path, checkpoint_path,
+                           partition_by_product=partition_by_product)
+    if removed:
+        sync_to_drive()
 
 # === Main ===
 def main():
@@ -140,8 +534,16 @@ def main():
     print(f"Chunked data: {CHUNKED_PATH}", flush=True)
     print(f"Checkpoint: {CHECKPOINT_PATH}", flush=True)
     print(f"Batch size: {BATCH_SIZE}", flush=True)
+    print(f"Embed workers: {EMBED_WORKERS}", flush=True)
+    print(f"Embed backend: {EMBED_BACKEND}", flush=True)
+    print(f"Partition by product: {PARTITION_BY_PRODUCT}", flush=True)
+    print(f"Delta mode: {DELTA_MODE}", flush=True)
     print("=" * 60, flush=True)
 
+    if DELTA_MODE:
+        apply_delta(chunked_path=CHUNKED_PATH)
+        return
+
     embed_and_index_chroma(
         chunked_path=CHUNKED_PATH,
         checkpoint_path=CHECKPOINT_PATH,
@@ -0,0 +1,223 @@
+# embedding_backends.py
+
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# === Config ===
+# "torch" keeps the sentence-transformers / HuggingFaceEmbeddings path;
+# "int8" is PyTorch with dynamically quantized Linear layers; "onnx" and
+# "onnx-int8" run an exported graph (fp32 / dynamic int8) with onnxruntime.
+EMBED_BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "torch")
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", 0))     # intra-op threads, 0 = library default
+ENCODE_BATCH_SIZE = 64
+MAX_SEQ_LENGTH = 256           # all-MiniLM-L6-v2 truncates here too
+ONNX_EXPORT_DIR = "vector_store/onnx/"
+ONNX_OPSET = 14
+MIN_MEAN_COSINE = 0.995        # agreement with the fp32 model required to keep a fast backend
+MIN_WORST_COSINE = 0.98
+
+# Used for the agreement check when no sample of real texts is given
+AGREEMENT_TEXTS = [
+    "Credit card late payment issues",
+    "Unauthorized transactions in my bank account",
+    "Problems with BNPL refunds",
+    "Difficulties with personal loan repayment",
+    "Delays in money transfers abroad",
+    "i was charged an annual fee on my credit card even though the offer said there would be no fee "
+    "for the first year and customer service refused to reverse it",
+    "the bank closed my savings account without notice and i still have not received the remaining balance",
+    "a wire transfer to my family overseas was held for weeks and the money service would not explain why",
+]
+
+
+def length_sorted_batches(lengths, batch_size: int) -> List[np.ndarray]:
+    """Row indices grouped into batches of similar length, so little of each batch is padding."""
+    order = np.argsort(np.asarray(lengths), kind="stable")
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def mean_pool(hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Mean of token vectors under the attention mask, L2-normalized (the all-MiniLM pooling)."""
+    mask = mask[..., None].astype(hidden.dtype)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return pooled / np.where(norms > 0, norms, 1)
+
+
+def cosine_agreement(candidate: np.ndarray, reference: np.ndarray) -> Dict[str, float]:
+    """Row-wise cosine similarity between two embeddings of the same texts."""
+    a = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    b = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    cos = (a * b).sum(axis=1)
+    return {"mean": float(cos.mean()), "min": float(cos.min()), "p05": float(np.percentile(cos, 5))}
+
+
+class _BaseEncoder:
+    """Tokenizes once, runs length-sorted batches and returns rows in input order."""
+
+    def __init__(self, model_name: str, batch_size: int, max_length: int):
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        texts = [str(t) for t in texts]
+        tokens = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        features = list(tokens.keys())
+        out = None
+        for rows in length_sorted_batches([len(ids) for ids in tokens["input_ids"]], self.batch_size):
+            batch = self.tokenizer.pad({f: [tokens[f][i] for i in rows] for f in features},
+                                       return_tensors="np")
+            vectors = self._forward(batch)
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[rows] = vectors
+        return out if out is not None else np.empty((0, 0), dtype=np.float32)
+
+    def _forward(self, batch) -> np.ndarray:
+        raise NotImplementedError
+
+    # LangChain embeddings interface, so the encoder can back ComplaintRetriever
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+    def close(self):
+        pass
+
+
+class TorchEncoder(_BaseEncoder):
+    """PyTorch CPU encoder, fp32 or with Linear layers dynamically quantized to int8."""
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = EMBED_THREADS,
+                 batch_size: int = ENCODE_BATCH_SIZE, max_length: int = MAX_SEQ_LENGTH):
+        import torch
+        from transformers import AutoModel
+
+        super().__init__(model_name, batch_size, max_length)
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        if quantize:
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.name = f"{model_name}:{'int8' if quantize else 'fp32'}"
+
+    def _forward(self, batch) -> np.ndarray:
+        import torch
+
+        inputs = {k: torch.from_numpy(np.asarray(v)) for k, v in batch.items()}
+        with torch.inference_mode():
+            hidden = self.model(**inputs).last_hidden_state.numpy()
+        return mean_pool(hidden, np.asarray(batch["attention_mask"]))
+
+
+class OnnxEncoder(_BaseEncoder):
+    """
+    onnxruntime encoder over a graph exported once to ONNX_EXPORT_DIR
+    (optionally dynamically quantized to int8 weights).
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = EMBED_THREADS,
+                 batch_size: int = ENCODE_BATCH_SIZE, max_length: int = MAX_SEQ_LENGTH,
+                 export_dir: str = ONNX_EXPORT_DIR):
+        import onnxruntime as ort
+
+        super().__init__(model_name, batch_size, max_length)
+        path = export_onnx(model_name, export_dir, quantize=quantize)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.name = f"{model_name}:onnx{'-int8' if quantize else ''}"
+
+    def _forward(self, batch) -> np.ndarray:
+        feed = {name: np.asarray(batch[name], dtype=np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        return mean_pool(hidden, np.asarray(batch["attention_mask"]))
+
+
+def export_onnx(model_name: str, export_dir: str = ONNX_EXPORT_DIR, quantize: bool = False) -> str:
+    """Export the transformer to ONNX (and an int8 copy) once; returns the graph path."""
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    out_dir = os.path.join(export_dir, slug)
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    int8_path = os.path.join(out_dir, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        print(f" Exporting {model_name} to {fp32_path}...", flush=True)
+        os.makedirs(out_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        names = list(sample.keys())
+        axes = {name: {0: "batch", 1: "sequence"} for name in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        with torch.inference_mode():
+            torch.onnx.export(model, tuple(sample[n] for n in names), fp32_path, input_names=names,
+                              output_names=["last_hidden_state"], dynamic_axes=axes,
+                              opset_version=ONNX_OPSET)
+
+    if not quantize:
+        return fp32_path
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f" Quantizing {fp32_path} to int8...", flush=True)
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def make_encoder(backend: str = EMBED_BACKEND, model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 threads: int = EMBED_THREADS, batch_size: int = ENCODE_BATCH_SIZE,
+                 check_texts: Optional[List[str]] = None, check: bool = True):
+    """
+    Build a fast CPU encoder for `backend` ("int8", "onnx" or "onnx-int8").
+    Unless `check` is off, its embeddings of `check_texts` are compared with
+    the fp32 model; if agreement is below MIN_MEAN_COSINE / MIN_WORST_COSINE
+    the fp32 encoder is returned instead.
+    """
+    if backend not in EMBED_BACKENDS or backend == "torch":
+        raise ValueError(f"Unknown fast embedding backend: {backend!r} (expected int8, onnx or onnx-int8)")
+
+    if backend == "int8":
+        encoder = TorchEncoder(model_name, quantize=True, threads=threads, batch_size=batch_size)
+    else:
+        encoder = OnnxEncoder(model_name, quantize=backend == "onnx-int8", threads=threads,
+                              batch_size=batch_size)
+    if not check:
+        return encoder
+
+    reference = TorchEncoder(model_name, threads=threads, batch_size=batch_size)
+    texts = list(check_texts or AGREEMENT_TEXTS)
+    start = time.perf_counter()
+    expected = reference.encode(texts)
+    reference_s = time.perf_counter() - start
+    start = time.perf_counter()
+    got = encoder.encode(texts)
+    candidate_s = time.perf_counter() - start
+
+    agreement = cosine_agreement(got, expected)
+    print(f" Embedding backend {encoder.name}: cosine vs fp32 mean {agreement['mean']:.4f}, "
+          f"min {agreement['min']:.4f} on {len(texts)} texts; "
+          f"{reference_s / candidate_s if candidate_s else 0:.1f}x faster", flush=True)
+    if agreement["mean"] < MIN_MEAN_COSINE or agreement["min"] < MIN_WORST_COSINE:
+        print(f" Agreement below {MIN_MEAN_COSINE} / {MIN_WORST_COSINE}; using the fp32 model.", flush=True)
+        encoder.close()
+        return reference
+    reference.close()
+    return encoder
@@ -0,0 +1,144 @@
+# embedding_cache.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import List
+
+import numpy as np
+
+KEY_BYTES = 16
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form of a chunk; the tokenizer sees the same tokens."""
+    return re.sub(r"\s+", " ", str(text)).strip()
+
+
+class EmbeddingCache:
+    """
+    Persistent text -> vector cache keyed by a hash of (model name, normalized
+    text). Keys live in an append-only `keys.bin` of 16-byte digests and
+    vectors in a memory-mapped `vectors.bin`; both are independent of chunk
+    size/overlap, so a re-chunking run reuses every passage it has seen.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dtype: str = "float32"):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.dir = os.path.join(cache_dir, slug)
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self._keys_path = os.path.join(self.dir, "keys.bin")
+        self._vectors_path = os.path.join(self.dir, "vectors.bin")
+        self._meta_path = os.path.join(self.dir, "meta.json")
+        self._index = {}
+        self._vectors = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def key(self, text: str) -> bytes:
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.blake2b(payload, digest_size=KEY_BYTES).digest()
+
+    def lookup(self, keys: List[bytes]) -> np.ndarray:
+        """Row of each key in the vector file, or -1 when it is not cached."""
+        return np.fromiter((self._index.get(k, -1) for k in keys), dtype=np.int64, count=len(keys))
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        if len(rows) == 0:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        with self._lock:
+            if self._vectors is None or len(self._vectors) < len(self._index):
+                self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r",
+                                          shape=(len(self._index), self.dim))
+            return np.asarray(self._vectors[rows], dtype=np.float32)
+
+    def add(self, keys: List[bytes], vectors: np.ndarray):
+        """Append new vectors. Vectors are written before keys so a crash never leaves a dangling key."""
+        if not keys:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                os.makedirs(self.dir, exist_ok=True)
+                with open(self._meta_path, "w") as f:
+                    json.dump({"model_name": self.model_name, "dim": self.dim,
+                               "dtype": self.dtype.name}, f)
+            new = [(k, v) for k, v in zip(keys, vectors) if k not in self._index]
+            if not new:
+                return
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.stack([v for _, v in new]).tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(k for k, _ in new))
+            start = len(self._index)
+            for offset, (k, _) in enumerate(new):
+                self._index[k] = start + offset
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+
+        raw = b""
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, "rb") as f:
+                raw = f.read()
+        row_bytes = self.dim * self.dtype.itemsize
+        vector_bytes = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        n = min(len(raw) // KEY_BYTES, vector_bytes // row_bytes)
+        # Drop rows a crashed `add` wrote to only one file, so later appends stay aligned
+        for path, size in ((self._keys_path, n * KEY_BYTES), (self._vectors_path, n * row_bytes)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+        self._index = {raw[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(n)}
+
+
+class CachedEncoder:
+    """
+    Wraps an encoder so duplicate chunks (within a batch and across runs)
+    are encoded once. Tracks how many texts actually reached the model.
+    """
+
+    def __init__(self, encoder, cache: EmbeddingCache):
+        self.encoder = encoder
+        self.cache = cache
+        self.total = 0
+        self.encoded = 0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        keys = [self.cache.key(t) for t in texts]
+        unique = {}
+        for i, k in enumerate(keys):
+            unique.setdefault(k, i)
+        unique_keys = list(unique)
+        rows = self.cache.lookup(unique_keys)
+
+        missing = [k for k, r in zip(unique_keys, rows) if r < 0]
+        if missing:
+            vectors = np.asarray(self.encoder.encode([texts[unique[k]] for k in missing]))
+            self.cache.add(missing, vectors)
+            rows = self.cache.lookup(unique_keys)
+
+        self.total += len(texts)
+        self.encoded += len(missing)
+        by_key = dict(zip(unique_keys, self.cache.get(rows)))
+        return np.stack([by_key[k] for k in keys])
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Share of texts served without running the model."""
+        return 1 - self.encoded / self.total if self.total else 0.0
+
+    def close(self):
+        self.encoder.close()
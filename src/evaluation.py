@@ -0,0 +1,316 @@
+# evaluation.py
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain.docstore.document import Document
+
+import rag_pipline
+from rag_pipline import TOP_K, format_sources
+
+# === Config ===
+EVAL_QUESTIONS_PATH = "data/eval/questions.jsonl"
+EVAL_OUTPUT_DIR = "reports/evaluation/"
+EVAL_RETRIEVAL_BATCH = 32       # questions per retrieve_many call
+EVAL_GENERATION_BATCH = 16      # prompts per generate_many call
+EVAL_WORKERS = 4                # retrieval batches in flight
+NO_CONTEXT_ANSWER = "⚠️ No relevant context retrieved."
+
+
+# === Questions ===
+def load_questions(path: str) -> List[dict]:
+    """
+    Read a JSONL question set, one {"id", "question", "product", "complaint_ids"}
+    object per line. Only "question" is required; ids default to a hash of
+    question and product, and labels (`complaint_ids` or `complaint_id`)
+    enable hit-rate@k and MRR.
+    """
+    questions, seen = [], set()
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not str(item.get("question", "")).strip():
+                raise ValueError(f"{path}:{line_no}: missing 'question'")
+            labels = item.get("complaint_ids", item.get("complaint_id"))
+            if labels is not None and not isinstance(labels, list):
+                labels = [labels]
+            qid = str(item.get("id") or hashlib.blake2b(
+                f"{item['question']}\x00{item.get('product') or ''}".encode("utf-8"), digest_size=6).hexdigest())
+            if qid in seen:
+                raise ValueError(f"{path}:{line_no}: duplicate question id {qid!r}")
+            seen.add(qid)
+            questions.append({
+                "id": qid,
+                "question": item["question"],
+                "product": item.get("product") or None,
+                "complaint_ids": [int(c) for c in labels] if labels is not None else None,
+            })
+    return questions
+
+
+# === Checkpoint log ===
+class ResultLog:
+    """
+    Append-only JSONL of per-question records keyed by "id". Each batch is
+    flushed and fsynced; a torn last line from a crash is ignored on load.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, dict]:
+        records = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    records[record["id"]] = record
+        return records
+
+    def append(self, records: Iterable[dict]):
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def doc_to_dict(doc: Document) -> dict:
+    return {"page_content": doc.page_content, "metadata": dict(doc.metadata)}
+
+
+def doc_from_dict(item: dict) -> Document:
+    return Document(page_content=item["page_content"], metadata=item["metadata"])
+
+
+def first_hit_rank(docs: List[dict], labels: Optional[List[int]]) -> Optional[int]:
+    """1-based rank of the first retrieved chunk from a labeled complaint; 0 if none, None if unlabeled."""
+    if labels is None:
+        return None
+    wanted = set(labels)
+    for rank, doc in enumerate(docs, 1):
+        try:
+            if int(doc["metadata"].get("complaint_id")) in wanted:
+                return rank
+        except (TypeError, ValueError):
+            continue
+    return 0
+
+
+# === Phases ===
+def _batches(items: List[dict], size: int) -> List[List[dict]]:
+    """Batches of at most `size` questions that share a product filter."""
+    by_product: Dict[Optional[str], List[dict]] = {}
+    for item in items:
+        by_product.setdefault(item["product"], []).append(item)
+    return [group[i:i + size] for group in by_product.values() for i in range(0, len(group), size)]
+
+
+def run_retrieval(questions: List[dict], log: ResultLog, k: int = TOP_K, retriever=None,
+                  batch_size: int = EVAL_RETRIEVAL_BATCH, workers: int = EVAL_WORKERS) -> Dict[str, dict]:
+    """Retrieve for every question not yet in `log`; returns all retrieval records."""
+    done = log.load()
+    todo = [q for q in questions if q["id"] not in done]
+    if not todo:
+        return done
+    retriever = retriever or rag_pipline.get_retriever()
+    print(f" Retrieval: {len(todo)} questions ({len(done)} already done)...", flush=True)
+
+    def run(batch: List[dict]) -> List[dict]:
+        start = time.perf_counter()
+        all_docs = retriever.retrieve_many([q["question"] for q in batch], k=k,
+                                           product_filter=batch[0]["product"])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        records = []
+        for q, docs in zip(batch, all_docs):
+            docs = [doc_to_dict(d) for d in docs]
+            records.append({
+                **q,
+                "docs": docs,
+                "hit_rank": first_hit_rank(docs, q["complaint_ids"]),
+                "retrieve_ms": elapsed_ms / len(batch),     # batch time shared across its questions
+                "retrieve_batch_ms": elapsed_ms,
+                "retrieve_batch_size": len(batch),
+            })
+        log.append(records)
+        return records
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for records in pool.map(run, _batches(todo, batch_size)):
+            done.update((r["id"], r) for r in records)
+            print(f"   {len(done)}/{len(questions)} retrieved", flush=True)
+    return done
+
+
+def run_generation(retrieved: Dict[str, dict], log: ResultLog, llm=None,
+                   batch_size: int = EVAL_GENERATION_BATCH) -> Dict[str, dict]:
+    """Generate answers for retrieved questions not yet in `log`; returns all generation records."""
+    done = log.load()
+    todo = [r for r in retrieved.values() if r["id"] not in done]
+    if not todo:
+        return done
+    llm = llm or rag_pipline.get_llm()
+    print(f" Generation: {len(todo)} questions ({len(done)} already done)...", flush=True)
+
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        with_context = [r for r in batch if r["docs"]]
+        t0 = time.perf_counter()
+        prompts = [rag_pipline.build_prompt(r["question"], [doc_from_dict(d) for d in r["docs"]], llm)
+                   for r in with_context]
+        prompt_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        answers = dict(zip((r["id"] for r in with_context), llm.generate_many(prompts))) if prompts else {}
+        generate_ms = (time.perf_counter() - t0) * 1000
+
+        records = [{
+            "id": r["id"],
+            "answer": answers.get(r["id"], NO_CONTEXT_ANSWER),
+            "prompt_ms": prompt_ms / len(with_context) if r["id"] in answers else 0.0,
+            "generate_ms": generate_ms / len(with_context) if r["id"] in answers else 0.0,
+            "generate_batch_ms": generate_ms,
+            "generate_batch_size": len(with_context),
+        } for r in batch]
+        log.append(records)
+        done.update((r["id"], r) for r in records)
+        print(f"   {len(done)}/{len(retrieved)} answered", flush=True)
+    return done
+
+
+# === Report ===
+def _latency(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    p50, p95 = np.percentile(values, [50, 95])
+    return {"mean_ms": float(np.mean(values)), "p50_ms": float(p50), "p95_ms": float(p95)}
+
+
+def summarize(questions: List[dict], retrieved: Dict[str, dict],
+              generated: Optional[Dict[str, dict]] = None) -> dict:
+    """Hit-rate@k / MRR over labeled questions plus per-phase latency."""
+    records = [retrieved[q["id"]] for q in questions if q["id"] in retrieved]
+    ranks = [r["hit_rank"] for r in records if r["hit_rank"] is not None]
+    summary = {
+        "questions": len(questions),
+        "retrieved": len(records),
+        "labeled": len(ranks),
+        "hit_rate": sum(1 for rank in ranks if rank) / len(ranks) if ranks else None,
+        "mrr": sum(1 / rank for rank in ranks if rank) / len(ranks) if ranks else None,
+        "retrieval": _latency([r["retrieve_ms"] for r in records]),
+    }
+    if generated is not None:
+        answered = [generated[q["id"]] for q in questions if q["id"] in generated]
+        summary["answered"] = len(answered)
+        summary["generation"] = _latency([g["generate_ms"] for g in answered if g["generate_batch_size"]])
+    return summary
+
+
+def write_markdown(path: str, questions: List[dict], retrieved: Dict[str, dict],
+                   generated: Dict[str, dict], summary: dict):
+    """Evaluation table in the layout of `rag_pipline.evaluate_pipeline`, plus retrieval metrics."""
+    import pandas as pd
+
+    rows = []
+    for q in questions:
+        r, g = retrieved.get(q["id"]), generated.get(q["id"])
+        if r is None or g is None:
+            continue
+        srcs = format_sources([doc_from_dict(d) for d in r["docs"]])
+        rows.append({
+            "Question": q["question"],
+            "Generated Answer": g["answer"],
+            "Retrieved Sources": "\n".join(srcs[:2]),
+            "Hit Rank": "" if r["hit_rank"] is None else r["hit_rank"],
+            "Quality Score (1-5)": "",
+            "Comments": "",
+        })
+    with open(path, "w") as f:
+        f.write("# RAG Evaluation Results\n\n")
+        f.write(pd.DataFrame(rows).to_markdown(index=False))
+        f.write("\n\n## Summary\n\n```json\n" + json.dumps(summary, indent=2) + "\n```\n")
+
+
+def run_evaluation(questions: List[dict], out_dir: str = EVAL_OUTPUT_DIR, k: int = TOP_K,
+                   retrieval_only: bool = False, fresh: bool = False, retriever=None, llm=None,
+                   retrieval_batch: int = EVAL_RETRIEVAL_BATCH, generation_batch: int = EVAL_GENERATION_BATCH,
+                   workers: int = EVAL_WORKERS) -> dict:
+    """
+    Run (or resume) an evaluation into `out_dir`. A run is tied to its k and
+    vector backend; resuming with different settings raises unless `fresh`.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {name: os.path.join(out_dir, name) for name in
+             ("run.json", "retrieval.jsonl", "generation.jsonl", "summary.json", "evaluation_results.md")}
+    config = {"k": k, "vector_backend": rag_pipline.VECTOR_BACKEND, "retrieval_mode": rag_pipline.RETRIEVAL_MODE}
+    if fresh:
+        for name in ("retrieval.jsonl", "generation.jsonl"):
+            if os.path.exists(paths[name]):
+                os.remove(paths[name])
+    elif os.path.exists(paths["run.json"]):
+        with open(paths["run.json"]) as f:
+            previous = json.load(f)
+        if previous != config:
+            raise ValueError(f"{out_dir} holds a run with {previous}, not {config}; use --fresh to restart")
+    with open(paths["run.json"], "w") as f:
+        json.dump(config, f)
+
+    retrieved = run_retrieval(questions, ResultLog(paths["retrieval.jsonl"]), k=k, retriever=retriever,
+                              batch_size=retrieval_batch, workers=workers)
+    generated = None
+    if not retrieval_only:
+        wanted = {q["id"] for q in questions}
+        generated = run_generation({i: r for i, r in retrieved.items() if i in wanted},
+                                   ResultLog(paths["generation.jsonl"]), llm=llm, batch_size=generation_batch)
+
+    summary = summarize(questions, retrieved, generated)
+    with open(paths["summary.json"], "w") as f:
+        json.dump(summary, f, indent=2)
+    if generated is not None:
+        write_markdown(paths["evaluation_results.md"], questions, retrieved, generated, summary)
+
+    if summary["labeled"]:
+        print(f" hit@{k} {summary['hit_rate']:.3f}, MRR {summary['mrr']:.3f} "
+              f"over {summary['labeled']} labeled questions", flush=True)
+    print(f" Retrieval p50 {summary['retrieval'].get('p50_ms', 0):.1f} ms/question"
+          + (f", generation p50 {summary['generation'].get('p50_ms', 0):.0f} ms/question"
+             if generated is not None else ""), flush=True)
+    print(f"✅ Evaluation saved to {out_dir}", flush=True)
+    return summary
+
+
+# === Main ===
+def main():
+    argv = [arg for arg in sys.argv[1:] if not arg.startswith("-f")]
+    parser = argparse.ArgumentParser(description="Batched, resumable RAG evaluation over a JSONL question set.")
+    parser.add_argument("--questions", default=EVAL_QUESTIONS_PATH)
+    parser.add_argument("--out_dir", default=EVAL_OUTPUT_DIR)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--retrieval_only", action="store_true", help="Skip generation; report hit-rate/MRR")
+    parser.add_argument("--fresh", action="store_true", help="Discard checkpointed results in --out_dir")
+    parser.add_argument("--retrieval_batch", type=int, default=EVAL_RETRIEVAL_BATCH)
+    parser.add_argument("--generation_batch", type=int, default=EVAL_GENERATION_BATCH)
+    parser.add_argument("--workers", type=int, default=EVAL_WORKERS)
+    args, _ = parser.parse_known_args(argv)
+
+    run_evaluation(load_questions(args.questions), out_dir=args.out_dir, k=args.k,
+                   retrieval_only=args.retrieval_only, fresh=args.fresh,
+                   retrieval_batch=args.retrieval_batch, generation_batch=args.generation_batch,
+                   workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
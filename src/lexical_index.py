@@ -0,0 +1,157 @@
+# lexical_index.py
+
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from vector_store import StringColumn, StringColumnWriter
+
+# === Config ===
+BM25_INDEX_DIR = "vector_store/bm25_index/"
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_DF_RATIO = 0.5     # query terms in more than this share of chunks are skipped
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class BM25IndexBuilder:
+    """
+    Accumulates chunks batch by batch and writes a BM25 index as flat
+    postings arrays (CSR layout: term_offsets -> postings_docs/postings_tf).
+    """
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.chunk_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.products: List[int] = []
+        self.product_codes: Dict[str, int] = {}
+        self._parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def add(self, chunk_ids: Iterable[str], texts: Iterable[str], products: Iterable[str]):
+        terms, docs, tfs = [], [], []
+        for cid, text, product in zip(chunk_ids, texts, products):
+            doc = len(self.chunk_ids)
+            counts = Counter(tokenize(text))
+            self.chunk_ids.append(str(cid))
+            self.doc_lengths.append(sum(counts.values()))
+            self.products.append(self.product_codes.setdefault(product, len(self.product_codes)))
+            for term, tf in counts.items():
+                terms.append(self.vocab.setdefault(term, len(self.vocab)))
+                docs.append(doc)
+                tfs.append(min(tf, 65535))
+        self._parts.append((np.asarray(terms, np.int32), np.asarray(docs, np.int32),
+                            np.asarray(tfs, np.uint16)))
+
+    def write(self, out_dir: str = BM25_INDEX_DIR) -> str:
+        os.makedirs(out_dir, exist_ok=True)
+        terms = np.concatenate([p[0] for p in self._parts]) if self._parts else np.empty(0, np.int32)
+        docs = np.concatenate([p[1] for p in self._parts]) if self._parts else np.empty(0, np.int32)
+        tfs = np.concatenate([p[2] for p in self._parts]) if self._parts else np.empty(0, np.uint16)
+
+        order = np.lexsort((docs, terms))
+        term_offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self.vocab)), out=term_offsets[1:])
+
+        np.save(os.path.join(out_dir, "postings_docs.npy"), docs[order])
+        np.save(os.path.join(out_dir, "postings_tf.npy"), tfs[order])
+        np.save(os.path.join(out_dir, "term_offsets.npy"), term_offsets)
+        np.save(os.path.join(out_dir, "doc_lengths.npy"), np.asarray(self.doc_lengths, np.int32))
+        np.save(os.path.join(out_dir, "products.npy"), np.asarray(self.products, np.uint16))
+
+        ids = StringColumnWriter(os.path.join(out_dir, "chunk_ids.bin"),
+                                 os.path.join(out_dir, "chunk_ids_offsets.npy"), len(self.chunk_ids))
+        ids.extend(self.chunk_ids)
+        ids.close()
+
+        with open(os.path.join(out_dir, "vocab.json"), "w") as f:
+            json.dump(sorted(self.vocab, key=self.vocab.get), f)
+        with open(os.path.join(out_dir, "meta.json"), "w") as f:
+            json.dump({
+                "num_docs": len(self.chunk_ids),
+                "avg_doc_length": float(np.mean(self.doc_lengths)) if self.doc_lengths else 0.0,
+                "product_names": sorted(self.product_codes, key=self.product_codes.get),
+            }, f)
+        return out_dir
+
+
+class BM25Index:
+    """Memory-mapped BM25 index written by `BM25IndexBuilder`."""
+
+    def __init__(self, index_dir: str = BM25_INDEX_DIR, k1: float = BM25_K1, b: float = BM25_B):
+        def load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        self.index_dir = index_dir
+        self.postings_docs = load("postings_docs.npy")
+        self.postings_tf = load("postings_tf.npy")
+        self.term_offsets = load("term_offsets.npy")
+        self.products = load("products.npy")
+        self.chunk_ids = StringColumn(os.path.join(index_dir, "chunk_ids.bin"),
+                                      os.path.join(index_dir, "chunk_ids_offsets.npy"))
+        with open(os.path.join(index_dir, "vocab.json")) as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            meta = json.load(f)
+        self.num_docs = meta["num_docs"]
+        self.product_codes = {name: i for i, name in enumerate(meta["product_names"])}
+
+        # Per-document BM25 length normalization, computed once
+        doc_lengths = np.asarray(load("doc_lengths.npy"), dtype=np.float32)
+        avgdl = meta["avg_doc_length"] or 1.0
+        self.k1 = k1
+        self._length_norm = k1 * (1 - b + b * doc_lengths / avgdl)
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def idf(self, df: int) -> float:
+        return math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int, product: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (rows, scores), best first."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.term_offsets[t], self.term_offsets[t + 1]
+            if end - start > MAX_DF_RATIO * self.num_docs:
+                continue
+            docs = self.postings_docs[start:end]
+            tf = np.asarray(self.postings_tf[start:end], dtype=np.float32)
+            # Doc ids are unique within a posting list, so fancy-index add is safe
+            scores[docs] += self.idf(end - start) * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+
+        rows = np.flatnonzero(scores)
+        if product:
+            code = self.product_codes.get(product)
+            rows = rows[np.asarray(self.products[rows]) == code] if code is not None else rows[:0]
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-scores[rows])]
+        return rows, scores[rows]
+
+    def search_ids(self, query: str, k: int, product: Optional[str] = None) -> List[str]:
+        rows, _ = self.search(query, k, product)
+        return [self.chunk_ids[int(r)] for r in rows]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[str]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
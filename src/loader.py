@@ -1,7 +1,61 @@
 import os
+import time
 import zipfile
-import gdown
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Dict
+
+import pandas as pd
+from tqdm import tqdm
+
+# === Config ===
+FILTERED_PATH = "data/processed/filtered/filtered_complaints.csv"
+PREPROCESS_BATCH_SIZE = 50000      # CSV rows per batch; bounds peak memory
+NARRATIVE_COLUMN = "Consumer complaint narrative"
+# Columns read from the raw CSV and their compact dtypes (everything else is skipped)
+RAW_COLUMNS = {
+    "Date received": "string",
+    "Product": "category",
+    "Issue": "category",
+    "Company": "category",
+    "Complaint ID": "int64",
+    NARRATIVE_COLUMN: "string",
+}
+
+# Same remapping and target set as the EDA notebook
+PRODUCT_REMAP = {
+    "Credit card": "Credit card",
+    "Credit card or prepaid card": "Credit card",
+    "Consumer Loan": "Personal loan",
+    "Payday loan, title loan, personal loan, or advance loan": "Personal loan",
+    "Payday loan, title loan, or personal loan": "Personal loan",
+    "Checking or savings account": "Savings account",
+    "Bank account or service": "Savings account",
+    "Money transfer, virtual currency, or money service": "Money transfers",
+    "Money transfers": "Money transfers",
+    "Other financial service": "Buy Now, Pay Later",
+}
+TARGET_PRODUCTS = ["Credit card", "Personal loan", "Buy Now, Pay Later", "Savings account", "Money transfers"]
+
+
+def clean_narratives(texts: pd.Series) -> pd.Series:
+    """Vectorized `clean_text` from the EDA notebook: lowercase, keep [a-z0-9] and whitespace, collapse spaces."""
+    return (texts.str.lower()
+                 .str.replace(r"[^a-z0-9\s]", "", regex=True)
+                 .str.replace(r"\s+", " ", regex=True)
+                 .str.strip())
+
+
+def filter_batch(batch: pd.DataFrame) -> pd.DataFrame:
+    """Remap products, keep target products with a non-empty cleaned narrative."""
+    products = batch["Product"].map(lambda p: PRODUCT_REMAP.get(p, p))
+    keep = (products.isin(TARGET_PRODUCTS) & batch[NARRATIVE_COLUMN].notna()).to_numpy()
+    batch = batch[keep].assign(
+        Product=products[keep].astype(pd.CategoricalDtype(TARGET_PRODUCTS)).values,
+        cleaned_narrative=clean_narratives(batch.loc[keep, NARRATIVE_COLUMN]),
+    ).drop(columns=[NARRATIVE_COLUMN])
+    return batch[batch["cleaned_narrative"].str.len() > 0]
+
 
 class DataLoader:
     def __init__(self, raw_dir="data/raw/", zip_file_id="YOUR_FILE_ID_HERE"):
@@ -25,6 +79,8 @@ class DataLoader:
     def download_zip(self):
         """Download the 'complaints.csv.zip' file from Google Drive using the file ID."""
         if not self.zip_file.exists():
+            import gdown
+
             print(f"Downloading {self.zip_file.name} from Google Drive...")
             url = f"https://drive.google.com/uc?id={self.zip_file_id}"
             try:
@@ -58,6 +114,69 @@ class DataLoader:
         self.unzip_file()
         return self
 
+    @contextmanager
+    def open_raw_csv(self):
+        """Open 'complaints.csv' for streaming reads: straight out of the zip if present, else the extracted file."""
+        if self.zip_file.exists():
+            with zipfile.ZipFile(self.zip_file, 'r') as zip_ref:
+                try:
+                    raw = zip_ref.open('complaints.csv')
+                except KeyError:
+                    raise ValueError("Zip file does not contain 'complaints.csv'. Check the file contents.")
+                with raw:
+                    yield raw
+            return
+        if self.csv_file.exists():
+            with open(self.csv_file, 'rb') as raw:
+                yield raw
+            return
+        raise FileNotFoundError(f"Neither {self.zip_file} nor {self.csv_file} found. Run download_zip() first.")
+
+    def preprocess(self, output_path: str = FILTERED_PATH,
+                   batch_size: int = PREPROCESS_BATCH_SIZE) -> Dict[str, object]:
+        """
+        Stream the raw complaints into the filtered CSV used by chunking.py
+        without extracting the zip: only RAW_COLUMNS are parsed, products are
+        remapped and filtered, narratives cleaned, and each batch is appended
+        to `output_path` before the next one is read, so peak memory depends
+        on `batch_size` only. The raw narrative column is not written.
+
+        Returns row counts and the per-product distribution.
+        """
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        tmp_path = f"{output_path}.tmp"
+        rows_read, rows_kept = 0, 0
+        header_written, columns = False, None
+        product_counts = pd.Series(0, index=TARGET_PRODUCTS, dtype="int64")
+        start = time.perf_counter()
+
+        with self.open_raw_csv() as raw, open(tmp_path, "w", newline="") as out:
+            batches = pd.read_csv(raw, usecols=list(RAW_COLUMNS), dtype=RAW_COLUMNS, chunksize=batch_size)
+            for batch in tqdm(batches, desc="Filtering", unit="batch"):
+                rows_read += len(batch)
+                batch = filter_batch(batch)
+                columns = batch.columns
+                if batch.empty:
+                    continue
+                batch.to_csv(out, index=False, header=not header_written)
+                header_written = True
+                rows_kept += len(batch)
+                product_counts = product_counts.add(batch["Product"].value_counts(), fill_value=0)
+            if not header_written and columns is not None:
+                # No complaint survived the filter; still write a readable, header-only CSV
+                pd.DataFrame(columns=columns).to_csv(out, index=False)
+        os.replace(tmp_path, output_path)
+
+        elapsed = time.perf_counter() - start
+        print(f"Kept {rows_kept:,}/{rows_read:,} complaints in {elapsed:.1f}s "
+              f"({rows_read / elapsed if elapsed else 0:,.0f} rows/s). Saved {output_path}.")
+        return {
+            "rows_read": rows_read,
+            "rows_kept": rows_kept,
+            "product_counts": product_counts.astype("int64").to_dict(),
+            "seconds": elapsed,
+        }
+
     def get_data_path(self):
         """Return the path to the processed CSV."""
         if not self.csv_file.exists():
@@ -69,7 +188,9 @@ if __name__ == "__main__":
     # Replace 'YOUR_FILE_ID_HERE' with the actual Google Drive file ID for 'complaints.csv.zip'
     loader = DataLoader(zip_file_id="1xzGB5_K4IWvQOZDXGpzgrmBmfdaDek4Y")
     try:
-        loader.load_data()
-        print(f"Data ready at: {loader.get_data_path()}")
+        loader.setup_directories()
+        loader.download_zip()
+        loader.preprocess()
+        print(f"Filtered data ready at: {FILTERED_PATH}")
     except Exception as e:
         print(f"Error: {str(e)}")
\ No newline at end of file
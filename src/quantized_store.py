@@ -0,0 +1,470 @@
+# quantized_store.py
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from vector_store import (NumpyVectorStore, SortedIdIndex, StringColumn, StringColumnWriter, SEARCH_BLOCK_ROWS,
+                          NUMPY_INDEX_DIR, _as_int, _normalize, _top_k, write_id_index)
+
+# === Config ===
+QUANTIZED_INDEX_DIR = "vector_store/quantized_index/"
+QUANT_MODES = ("sq8", "pq")
+# Re-rank tier read for the candidates only: "sq8" dequantizes int8 codes (for
+# "sq8" indexes those are the scan codes, so there is no extra step); float16 /
+# float32 keep a full float copy and make the index larger on disk.
+RERANK_TIERS = ("sq8", "float16", "float32")
+# "auto" rescores with the next more precise tier: float16 for sq8, int8 codes for pq
+DEFAULT_RERANK = "auto"
+AUTO_RERANK = {"sq8": "float16", "pq": "sq8"}
+RERANK_FACTOR = 4              # candidates scored on codes = k * RERANK_FACTOR
+PQ_SUBVECTOR_DIM = 8           # 384-dim MiniLM -> 48 one-byte codes per vector
+PQ_CENTROIDS = 256
+PQ_TRAIN_SAMPLE = 65536
+PQ_ITERATIONS = 15
+TEXT_BLOCK_SIZE = 64           # chunk texts per zlib block
+TEXT_CACHE_BLOCKS = 256        # decompressed blocks kept in memory
+ZLIB_LEVEL = 6
+
+
+# === Compressed text store ===
+class CompressedTextWriter:
+    """Writes texts as zlib-compressed JSON blocks of TEXT_BLOCK_SIZE plus a block offset array."""
+
+    def __init__(self, out_dir: str, block_size: int = TEXT_BLOCK_SIZE, level: int = ZLIB_LEVEL):
+        self.out_dir = out_dir
+        self.block_size = block_size
+        self.level = level
+        self._file = open(os.path.join(out_dir, "texts.zblocks"), "wb")
+        self._offsets = [0]
+        self._pending: List[str] = []
+
+    def extend(self, texts: Iterable[str]):
+        for text in texts:
+            self._pending.append(str(text))
+            if len(self._pending) == self.block_size:
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            data = zlib.compress(json.dumps(self._pending).encode("utf-8"), self.level)
+            self._file.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+            self._pending = []
+
+    def close(self):
+        self._flush()
+        self._file.close()
+        np.save(os.path.join(self.out_dir, "texts_blocks.npy"), np.asarray(self._offsets, dtype=np.int64))
+        with open(os.path.join(self.out_dir, "texts_meta.json"), "w") as f:
+            json.dump({"block_size": self.block_size}, f)
+
+
+class CompressedTextStore:
+    """Read side of `CompressedTextWriter`; only blocks holding requested rows are decompressed."""
+
+    def __init__(self, index_dir: str, cache_blocks: int = TEXT_CACHE_BLOCKS):
+        self.offsets = np.load(os.path.join(index_dir, "texts_blocks.npy"))
+        with open(os.path.join(index_dir, "texts_meta.json")) as f:
+            self.block_size = json.load(f)["block_size"]
+        path = os.path.join(index_dir, "texts.zblocks")
+        self.blob = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.empty(0, np.uint8)
+        self.cache_blocks = cache_blocks
+        self._cache: "OrderedDict[int, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, row: int) -> str:
+        block, pos = divmod(int(row), self.block_size)
+        with self._lock:
+            texts = self._cache.get(block)
+            if texts is not None:
+                self._cache.move_to_end(block)
+                return texts[pos]
+        # Decompress outside the lock; two threads missing the same block both decode it
+        data = bytes(self.blob[self.offsets[block]:self.offsets[block + 1]])
+        texts = json.loads(zlib.decompress(data).decode("utf-8"))
+        with self._lock:
+            self._cache[block] = texts
+            self._cache.move_to_end(block)
+            if len(self._cache) > self.cache_blocks:
+                self._cache.popitem(last=False)
+        return texts[pos]
+
+
+# === Quantizers ===
+def train_sq8(vectors: np.ndarray, block: int = SEARCH_BLOCK_ROWS) -> np.ndarray:
+    """Per-dimension symmetric int8 scale: max |value| / 127."""
+    peak = np.zeros(vectors.shape[1], dtype=np.float32)
+    for start in range(0, len(vectors), block):
+        peak = np.maximum(peak, np.abs(np.asarray(vectors[start:start + block], dtype=np.float32)).max(axis=0))
+    return np.where(peak > 0, peak / 127, 1).astype(np.float32)
+
+
+def encode_sq8(vectors: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+
+
+def train_pq(vectors: np.ndarray, sub_dim: int = PQ_SUBVECTOR_DIM, centroids: int = PQ_CENTROIDS,
+             sample: int = PQ_TRAIN_SAMPLE, iterations: int = PQ_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """k-means codebooks per subspace, shape (subspaces, centroids, sub_dim)."""
+    n, dim = vectors.shape
+    if dim % sub_dim:
+        raise ValueError(f"Dimension {dim} is not divisible by the PQ sub-vector size {sub_dim}")
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(n, min(n, sample), replace=False))
+    train = np.asarray(vectors[rows], dtype=np.float32)
+    k = min(centroids, len(train))
+
+    books = np.zeros((dim // sub_dim, centroids, sub_dim), dtype=np.float32)
+    for j in range(dim // sub_dim):
+        sub = train[:, j * sub_dim:(j + 1) * sub_dim]
+        book = sub[rng.choice(len(sub), k, replace=False)].copy()
+        for _ in range(iterations):
+            assign = _nearest(sub, book)
+            sums = np.zeros_like(book)
+            np.add.at(sums, assign, sub)
+            counts = np.bincount(assign, minlength=k)[:, None]
+            # Empty clusters keep their old centroid
+            book = np.where(counts > 0, sums / np.maximum(counts, 1), book)
+        books[j, :k] = book
+        books[j, k:] = book[0]
+    return books
+
+
+def encode_pq(vectors: np.ndarray, books: np.ndarray) -> np.ndarray:
+    sub_dim = books.shape[2]
+    codes = np.empty((len(vectors), books.shape[0]), dtype=np.uint8)
+    for j in range(books.shape[0]):
+        codes[:, j] = _nearest(vectors[:, j * sub_dim:(j + 1) * sub_dim], books[j])
+    return codes
+
+
+def _nearest(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    # argmin ||p - c||^2 = argmin (||c||^2 - 2 p.c)
+    return np.argmin((centers * centers).sum(axis=1) - 2 * points @ centers.T, axis=1)
+
+
+# === Store ===
+class QuantizedVectorStore:
+    """
+    Same interface as NumpyVectorStore, over int8 scalar-quantized ("sq8",
+    1 byte per dimension) or product-quantized ("pq", 1 byte per
+    PQ_SUBVECTOR_DIM dimensions) codes:
+
+        codes.npy               scanned for every query
+        sq_scale.npy / pq_codebooks.npy
+        rerank.npy              float16/float32 copy rescoring the k * RERANK_FACTOR
+                                candidates (default for "sq8")
+        rerank_codes.npy        int8 codes + rerank_scale.npy, dequantized for the
+                                candidates instead (default for "pq")
+        texts.zblocks           zlib-compressed chunk text, read only for the final top-k
+        products.npy, complaint_ids.npy, chunk_ids.*  as in NumpyVectorStore
+    """
+
+    def __init__(self, index_dir: str = QUANTIZED_INDEX_DIR, rerank_factor: int = RERANK_FACTOR):
+        def load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        self.index_dir = index_dir
+        self.rerank_factor = rerank_factor
+        with open(os.path.join(index_dir, "quant.json")) as f:
+            self.meta = json.load(f)
+        self.mode = self.meta["mode"]
+        self.codes = load("codes.npy")
+        if self.mode == "sq8":
+            self.scale = np.load(os.path.join(index_dir, "sq_scale.npy"))
+        else:
+            self.codebooks = np.load(os.path.join(index_dir, "pq_codebooks.npy"))
+        # None, "sq8" or a float dtype (see RERANK_TIERS)
+        self.rerank = self.meta.get("rerank")
+        self.rerank_vectors = self.rerank_scale = None
+        if self.rerank == "sq8":
+            self.rerank_vectors = load("rerank_codes.npy")
+            self.rerank_scale = np.load(os.path.join(index_dir, "rerank_scale.npy"))
+        elif self.rerank:
+            self.rerank_vectors = load("rerank.npy")
+
+        self.products = load("products.npy")
+        self.complaint_ids = load("complaint_ids.npy")
+        with open(os.path.join(index_dir, "product_names.json")) as f:
+            self.product_names: List[str] = json.load(f)
+        self.chunk_ids = StringColumn(os.path.join(index_dir, "chunk_ids.bin"),
+                                      os.path.join(index_dir, "chunk_ids_offsets.npy"))
+        self.texts = CompressedTextStore(index_dir)
+        self._product_codes = {name: code for code, name in enumerate(self.product_names)}
+        self._product_rows: Dict[int, np.ndarray] = {}
+        self._id_index: Optional[SortedIdIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def search(self, vectors, k: int, product: Optional[str] = None) -> List[List[Document]]:
+        return [
+            [self.document(row) for row in rows]
+            for rows, _ in self.search_rows(vectors, k, product)
+        ]
+
+    def search_rows(self, vectors, k: int, product: Optional[str] = None,
+                    rerank: bool = True) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k (rows, scores) per query, best first: code scan, then re-rank of the candidates."""
+        queries = _normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        rerank = rerank and self.rerank is not None
+        n_candidates = k * self.rerank_factor if rerank else k
+        results = []
+        for q in queries:
+            rows, scores = self._scan(q, n_candidates, product)
+            if rerank and len(rows):
+                order = np.argsort(rows)          # sorted reads from the memmap
+                rows = rows[order]
+                scores = self._rerank_scores(rows, q)
+            top = np.argsort(-scores)[:k]
+            results.append((rows[top], scores[top]))
+        return results
+
+    def _rerank_scores(self, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(self.rerank_vectors[rows]).astype(np.float32)
+        return vectors @ (q * self.rerank_scale) if self.rerank == "sq8" else vectors @ q
+
+    def _scan(self, q: np.ndarray, n: int, product: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        candidates = self.product_rows(product)
+        total = len(self) if candidates is None else len(candidates)
+        if self.mode == "sq8":
+            weights = q * self.scale
+        else:
+            sub_dim = self.codebooks.shape[2]
+            # Lookup table of q's inner product with every centroid: (subspaces, centroids)
+            lut = np.einsum("jcd,jd->jc", self.codebooks, q.reshape(-1, sub_dim))
+            subspaces = np.arange(lut.shape[0])
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            if candidates is None:
+                rows = np.arange(start, min(start + SEARCH_BLOCK_ROWS, total))
+                block = np.asarray(self.codes[start:start + SEARCH_BLOCK_ROWS])
+            else:
+                rows = candidates[start:start + SEARCH_BLOCK_ROWS]
+                block = np.asarray(self.codes[rows])
+            if self.mode == "sq8":
+                scores = block.astype(np.float32) @ weights
+            else:
+                scores = lut[subspaces, block].sum(axis=1)
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores.astype(np.float32)])
+            keep = _top_k(best_scores[None, :], n)[0]
+            best_rows, best_scores = best_rows[keep], best_scores[keep]
+        return best_rows, best_scores
+
+    def product_rows(self, product: Optional[str]) -> Optional[np.ndarray]:
+        if not product:
+            return None
+        code = self._product_codes.get(product)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        if code not in self._product_rows:
+            self._product_rows[code] = np.flatnonzero(np.asarray(self.products) == code)
+        return self._product_rows[code]
+
+    def document(self, row: int) -> Document:
+        row = int(row)
+        return Document(
+            page_content=self.texts[row],
+            metadata={
+                "product": self.product_names[self.products[row]],
+                "complaint_id": int(self.complaint_ids[row]),
+                "chunk_id": self.chunk_ids[row],
+            },
+        )
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        if self._id_index is None:
+            self._id_index = SortedIdIndex(self.index_dir)
+        return [self.document(row) for row in self._id_index.rows(ids) if row >= 0]
+
+    def count(self) -> int:
+        return len(self)
+
+    def fingerprint(self):
+        return len(self), os.path.getmtime(os.path.join(self.index_dir, "codes.npy"))
+
+
+# === Building ===
+def build_quantized_store(out_dir: str, batches: Iterable[Tuple[List[str], np.ndarray, List[str], List[dict]]],
+                          total: int, dim: int, mode: str = "sq8", rerank: Optional[str] = DEFAULT_RERANK,
+                          sub_dim: int = PQ_SUBVECTOR_DIM) -> str:
+    """
+    Write a QuantizedVectorStore from (ids, embeddings, documents, metadatas)
+    batches. Vectors are normalized and staged in a memmap (kept as the
+    re-rank copy when `rerank` is a float dtype), the quantizer is trained
+    on it, and codes are written block by block. `rerank="auto"` picks the
+    mode's tier from AUTO_RERANK; None builds an index without re-ranking.
+    """
+    if mode not in QUANT_MODES:
+        raise ValueError(f"Unknown quantization mode: {mode!r}")
+    if rerank == "auto":
+        rerank = AUTO_RERANK[mode]
+    if rerank is not None and rerank not in RERANK_TIERS:
+        raise ValueError(f"Unknown re-rank tier: {rerank!r}")
+    if mode == "sq8" and rerank == "sq8":
+        rerank = None                     # the scan codes already are the int8 tier
+    float_rerank = rerank in ("float16", "float32")
+    os.makedirs(out_dir, exist_ok=True)
+    staged_path = os.path.join(out_dir, "rerank.npy" if float_rerank else "staging.npy")
+    staged = np.lib.format.open_memmap(staged_path, mode="w+", shape=(total, dim),
+                                       dtype=np.dtype(rerank if float_rerank else "float32"))
+    products = np.lib.format.open_memmap(os.path.join(out_dir, "products.npy"),
+                                         mode="w+", dtype=np.uint16, shape=(total,))
+    complaint_ids = np.lib.format.open_memmap(os.path.join(out_dir, "complaint_ids.npy"),
+                                              mode="w+", dtype=np.int64, shape=(total,))
+    chunk_ids = StringColumnWriter(os.path.join(out_dir, "chunk_ids.bin"),
+                                   os.path.join(out_dir, "chunk_ids_offsets.npy"), total)
+    texts = CompressedTextWriter(out_dir)
+    product_codes: Dict[str, int] = {}
+
+    row = 0
+    for ids, vectors, documents, metadatas in batches:
+        n = len(ids)
+        staged[row:row + n] = _normalize(np.asarray(vectors, dtype=np.float32))
+        products[row:row + n] = [
+            product_codes.setdefault(m.get("product", ""), len(product_codes)) for m in metadatas
+        ]
+        complaint_ids[row:row + n] = [_as_int(m.get("complaint_id")) for m in metadatas]
+        chunk_ids.extend(ids)
+        texts.extend(documents)
+        row += n
+    if row != total:
+        raise ValueError(f"Expected {total} rows, got {row}")
+    staged.flush()
+    products.flush()
+    complaint_ids.flush()
+    chunk_ids.close()
+    texts.close()
+    write_id_index(out_dir)
+
+    if mode == "sq8":
+        params = train_sq8(staged)
+        np.save(os.path.join(out_dir, "sq_scale.npy"), params)
+        codes = np.lib.format.open_memmap(os.path.join(out_dir, "codes.npy"), mode="w+",
+                                          dtype=np.int8, shape=(total, dim))
+    else:
+        params = train_pq(staged, sub_dim)
+        np.save(os.path.join(out_dir, "pq_codebooks.npy"), params)
+        codes = np.lib.format.open_memmap(os.path.join(out_dir, "codes.npy"), mode="w+",
+                                          dtype=np.uint8, shape=(total, dim // sub_dim))
+    rerank_codes = None
+    if rerank == "sq8":
+        rerank_scale = train_sq8(staged)
+        np.save(os.path.join(out_dir, "rerank_scale.npy"), rerank_scale)
+        rerank_codes = np.lib.format.open_memmap(os.path.join(out_dir, "rerank_codes.npy"), mode="w+",
+                                                 dtype=np.int8, shape=(total, dim))
+    for start in range(0, total, SEARCH_BLOCK_ROWS):
+        block = np.asarray(staged[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+        codes[start:start + len(block)] = encode_sq8(block, params) if mode == "sq8" else encode_pq(block, params)
+        if rerank_codes is not None:
+            rerank_codes[start:start + len(block)] = encode_sq8(block, rerank_scale)
+    codes.flush()
+    if rerank_codes is not None:
+        rerank_codes.flush()
+    del codes, staged, rerank_codes
+    if not float_rerank:
+        os.remove(staged_path)
+
+    with open(os.path.join(out_dir, "product_names.json"), "w") as f:
+        json.dump(sorted(product_codes, key=product_codes.get), f)
+    with open(os.path.join(out_dir, "quant.json"), "w") as f:
+        json.dump({"mode": mode, "dim": dim, "count": total, "rerank": rerank,
+                   "pq_subvector_dim": sub_dim if mode == "pq" else None}, f)
+    return out_dir
+
+
+def iter_numpy_store(store: NumpyVectorStore, page_size: int = SEARCH_BLOCK_ROWS):
+    """Yield (ids, embeddings, documents, metadatas) pages from a NumpyVectorStore."""
+    for start in range(0, len(store), page_size):
+        rows = range(start, min(start + page_size, len(store)))
+        yield ([store.chunk_ids[r] for r in rows],
+               np.asarray(store.embeddings[start:start + page_size], dtype=np.float32),
+               [store.texts[r] for r in rows],
+               [{"product": store.product_names[store.products[r]],
+                 "complaint_id": int(store.complaint_ids[r])} for r in rows])
+
+
+# === Report ===
+def store_footprint(index_dir: str) -> Dict[str, float]:
+    """Disk size per component (MB) and the hot set scanned on every query."""
+    sizes = {f: os.path.getsize(os.path.join(index_dir, f)) / 1e6 for f in os.listdir(index_dir)}
+    vectors = sizes.get("codes.npy", sizes.get("embeddings.npy", 0.0))
+    texts = sum(v for f, v in sizes.items() if f.startswith("texts"))
+    return {
+        "disk_mb": sum(sizes.values()),
+        "scan_mb": vectors + sizes.get("products.npy", 0.0),
+        "vectors_mb": vectors,
+        "rerank_mb": sizes.get("rerank.npy", 0.0) + sizes.get("rerank_codes.npy", 0.0),
+        "text_mb": texts,
+    }
+
+
+def recall_report(stores: Dict[str, object], queries: np.ndarray, truth: np.ndarray, k: int) -> Dict[str, Dict]:
+    """recall@k against `truth` rows for every store (with and without re-rank where available)."""
+    report = {}
+    for name, store in stores.items():
+        variants = {"": {}}
+        if isinstance(store, QuantizedVectorStore) and store.rerank is not None:
+            variants = {"": {}, " (no rerank)": {"rerank": False}}
+        for suffix, kwargs in variants.items():
+            found = store.search_rows(queries, k, **kwargs)
+            hits = sum(len(set(map(int, rows)) & set(map(int, t))) for (rows, _), t in zip(found, truth))
+            entry = dict(store_footprint(store.index_dir))
+            entry["recall_at_k"] = hits / (len(truth) * k)
+            report[name + suffix] = entry
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build quantized indexes from a NumPy store and compare them.")
+    parser.add_argument("--numpy_dir", default=NUMPY_INDEX_DIR)
+    parser.add_argument("--out_dir", default=QUANTIZED_INDEX_DIR)
+    parser.add_argument("--mode", choices=list(QUANT_MODES) + ["both"], default="sq8")
+    parser.add_argument("--rerank", choices=["auto"] + list(RERANK_TIERS) + ["none"], default=DEFAULT_RERANK,
+                        help="Re-rank tier (auto: float16 for sq8, sq8 for pq); "
+                             "float16/float32 add a full float copy on disk")
+    parser.add_argument("--queries", type=int, default=200, help="Held-in query sample for the recall report")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    source = NumpyVectorStore(args.numpy_dir)
+    modes = list(QUANT_MODES) if args.mode == "both" else [args.mode]
+    rerank = None if args.rerank == "none" else args.rerank
+    stores = {"numpy": source}
+    for mode in modes:
+        out_dir = os.path.join(args.out_dir, mode) if len(modes) > 1 else args.out_dir
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        print(f" Building {mode} index {args.numpy_dir} -> {out_dir}...", flush=True)
+        build_quantized_store(out_dir, iter_numpy_store(source), total=len(source),
+                              dim=source.embeddings.shape[1], mode=mode, rerank=rerank)
+        stores[mode] = QuantizedVectorStore(out_dir)
+
+    # Stored vectors plus noise stand in for queries; exact search over the source is the reference
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(source), min(args.queries, len(source)), replace=False)
+    queries = np.asarray(source.embeddings[np.sort(rows)], dtype=np.float32)
+    queries += rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+    truth = [r for r, _ in source.search_rows(queries, args.k)]
+
+    print(f" {'index':<20} {'disk MB':>9} {'scan MB':>9} {'rerank MB':>10} {'text MB':>9} "
+          f"{'recall@' + str(args.k):>9}", flush=True)
+    for name, r in recall_report(stores, queries, truth, args.k).items():
+        print(f" {name:<20} {r['disk_mb']:>9.1f} {r['scan_mb']:>9.1f} {r['rerank_mb']:>10.1f} "
+              f"{r['text_mb']:>9.1f} {r['recall_at_k']:>9.3f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
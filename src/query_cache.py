@@ -0,0 +1,125 @@
+# query_cache.py
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+_MISSING = object()
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry."""
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional TTL and hit/miss counters."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, stored_at = entry
+                if self.ttl is None or time.monotonic() - stored_at <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by query embedding. A lookup hits when a cached query
+    with the same `scope` (the retrieval parameters that shape the answer,
+    e.g. product filter and k) has cosine similarity >= `threshold`.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = 3600.0,
+                 threshold: float = 0.95):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (scope, vector, value, stored_at)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, embedding, scope: Hashable = None) -> Any:
+        """Return the cached value for the most similar query, or None."""
+        query = _unit(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            candidates = [(eid, e[1]) for eid, e in self._entries.items() if e[0] == scope]
+            if candidates:
+                ids, vectors = zip(*candidates)
+                scores = np.stack(vectors) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._entries.move_to_end(ids[best])
+                    self.hits += 1
+                    return self._entries[ids[best]][2]
+            self.misses += 1
+            return None
+
+    def add(self, embedding, scope: Hashable, value: Any):
+        with self._lock:
+            self._entries[self._next_id] = (scope, _unit(embedding), value, time.monotonic())
+            self._next_id += 1
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _expire(self, now: float):
+        if self.ttl is None:
+            return
+        expired = [eid for eid, e in self._entries.items() if now - e[3] > self.ttl]
+        for eid in expired:
+            del self._entries[eid]
+
+
+def _unit(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else v
@@ -1,17 +1,58 @@
 # rag_pipeline.py
 
+from __future__ import annotations
+
+import json
 import os
-from typing import List, Optional
-import pandas as pd
-from transformers import pipeline
-from langchain_huggingface import HuggingFacePipeline, HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.docstore.document import Document
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+from query_cache import LRUCache, SemanticAnswerCache, normalize_query
+from tracing import TRACER, span
+
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+    from context_builder import PackedContext
+
+# LangChain, the vector stores, torch, transformers and the embedding model are
+# imported where they are first used, so importing this module (e.g. for
+# format_sources) stays fast.
 
 # === Config ===
 CHROMA_DIR = "/content/drive/MyDrive/credit-complaint-chatbot/vector_store/chroma_index/"
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 TOP_K = 5
+# Vector backend: "chroma", "partitioned" (one Chroma collection per product)
+# "numpy" (exact search over a memmap built by vector_store.py) or "quantized"
+# (int8 / PQ codes with a float re-rank, built by quantized_store.py)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+# Retrieval mode: "dense" or "hybrid" (BM25 + dense fused with reciprocal rank fusion)
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "dense")
+HYBRID_CANDIDATES = 4              # candidates per list = k * HYBRID_CANDIDATES
+GEN_MODEL_NAME = "google/flan-t5-large"   # can downgrade to flan-t5-base if OOM
+MAX_INPUT_TOKENS = 512
+MAX_NEW_TOKENS = 256
+GEN_BATCH_SIZE = 8
+GEN_CONCURRENCY = 1                # generate() calls allowed to run at once per model
+# Load weights as memory-mapped safetensors (CPU only), so worker processes
+# on one host share the weight pages instead of each holding a private copy
+GEN_MMAP_WEIGHTS = os.environ.get("GEN_MMAP_WEIGHTS", "0") == "1"
+
+# Micro-batching of concurrent single-query embed/generate calls
+USE_MICRO_BATCHING = os.environ.get("USE_MICRO_BATCHING", "0") == "1"
+EMBED_MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", 32))
+EMBED_MAX_WAIT_MS = float(os.environ.get("EMBED_MAX_WAIT_MS", 2))
+GEN_MAX_BATCH = int(os.environ.get("GEN_MAX_BATCH", 8))
+GEN_MAX_WAIT_MS = float(os.environ.get("GEN_MAX_WAIT_MS", 10))
+
+# Query caches
+EMBED_CACHE_SIZE = 4096
+RESULT_CACHE_SIZE = 4096
+CACHE_TTL_SECONDS = 3600
+CACHE_CHECK_INTERVAL = 30          # seconds between Chroma change checks
+ANSWER_CACHE_ENABLED = False
+ANSWER_CACHE_SIZE = 512
+ANSWER_CACHE_THRESHOLD = 0.95      # cosine similarity for a semantic hit
 
 # === Prompt Template ===
 PROMPT_TEMPLATE = """You are a financial analyst assistant for CrediTrust. 
@@ -27,50 +68,538 @@ Question: {question}
 Answer:"""
 
 # === Retriever ===
-def get_relevant_chunks(query: str, k: int = TOP_K, product: Optional[str] = None) -> List[Document]:
-    """Retrieve top-k relevant chunks as LangChain Documents from Chroma."""
-    embedder = HuggingFaceEmbeddings(model_name=EMBED_MODEL_NAME)
+class ComplaintRetriever:
+    """
+    Long-lived retriever that loads the embedding model and opens the vector
+    store (Chroma or the NumPy memmap backend) once, then serves every query
+    from the same warm handles.
+
+    Query embedding and Chroma reads are thread-safe, so a single instance can
+    be shared by all request threads (see `get_retriever`).
+
+    In "hybrid" mode, dense candidates are fused with BM25 candidates from
+    the lexical index built by `chunking.py --bm25`.
+
+    Normalized query -> embedding and (query, product, k) -> chunk ids are
+    kept in LRU caches. Result caches (and any cache passed to
+    `register_cache`) are cleared when the Chroma collection changes.
+    """
+
+    def __init__(self, vector_store_path: Optional[str] = None,
+                 model_name: str = EMBED_MODEL_NAME, k: int = TOP_K,
+                 backend: str = VECTOR_BACKEND, retrieval_mode: str = RETRIEVAL_MODE,
+                 bm25_index_dir: Optional[str] = None, embedder=None):
+        from batching import MicroBatcher
+        from embedding_backends import EMBED_BACKEND, make_encoder
+
+        self.backend = backend
+        self.model_name = model_name
+        self.k = k
+        # Any LangChain-style embedder (embed_query/embed_documents) may be passed in
+        if embedder is None and EMBED_BACKEND != "torch":
+            # Quantized / ONNX query encoder, kept only if it agrees with the fp32 model
+            embedder = make_encoder(EMBED_BACKEND, model_name)
+        if embedder is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            embedder = HuggingFaceEmbeddings(model_name=model_name)
+        self.embedder = embedder
+        if backend == "numpy":
+            from vector_store import NumpyVectorStore, NUMPY_INDEX_DIR
+            self.vector_store_path = vector_store_path or NUMPY_INDEX_DIR
+            self.store = NumpyVectorStore(self.vector_store_path)
+        elif backend == "quantized":
+            from quantized_store import QuantizedVectorStore, QUANTIZED_INDEX_DIR
+            self.vector_store_path = vector_store_path or QUANTIZED_INDEX_DIR
+            self.store = QuantizedVectorStore(self.vector_store_path)
+        elif backend == "chroma":
+            from vector_store import ChromaStore
+            self.vector_store_path = vector_store_path or CHROMA_DIR
+            self.store = ChromaStore(self.vector_store_path, embedding_function=self.embedder)
+        elif backend == "partitioned":
+            from vector_store import PartitionedChromaStore
+            self.vector_store_path = vector_store_path or CHROMA_DIR
+            self.store = PartitionedChromaStore(self.vector_store_path, embedding_function=self.embedder)
+        else:
+            raise ValueError(f"Unknown vector backend: {backend!r}")
+
+        if retrieval_mode not in ("dense", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode!r}")
+        self.retrieval_mode = retrieval_mode
+        self.lexical = None
+        if retrieval_mode == "hybrid":
+            from lexical_index import BM25Index, BM25_INDEX_DIR
+            self.lexical = BM25Index(bm25_index_dir or BM25_INDEX_DIR)
+
+        # Concurrent cache misses are embedded together in micro-batches
+        self._embed_batcher = MicroBatcher(
+            self.embedder.embed_documents, EMBED_MAX_BATCH, EMBED_MAX_WAIT_MS, name="embed"
+        ) if USE_MICRO_BATCHING else None
+
+        self.embedding_cache = LRUCache(EMBED_CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+        self.result_cache = LRUCache(RESULT_CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+        self._dependent_caches = [self.result_cache]
+        self._fingerprint = self._collection_fingerprint()
+        self._last_check = time.monotonic()
+        self._check_lock = threading.Lock()
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing the cached vector for its normalized form."""
+        key = normalize_query(query)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            with span("retrieve.embed"):
+                if self._embed_batcher is not None:
+                    embedding = self._embed_batcher(key)
+                else:
+                    embedding = self.embedder.embed_query(key)
+            self.embedding_cache.put(key, embedding)
+        return embedding
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries, sending only cache misses to the model in one batch."""
+        keys = [normalize_query(q) for q in queries]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        missing = sorted({key for key, e in zip(keys, embeddings) if e is None})
+        if missing:
+            with span("retrieve.embed_batch"):
+                fresh = dict(zip(missing, self.embedder.embed_documents(missing)))
+            for key, e in fresh.items():
+                self.embedding_cache.put(key, e)
+            embeddings = [e if e is not None else fresh[key] for key, e in zip(keys, embeddings)]
+        return embeddings
+
+    def retrieve(self, query: str, k: Optional[int] = None,
+                 product_filter: Optional[str] = None) -> List[Document]:
+        """Retrieve top-k relevant chunks for a single query."""
+        self.check_collection()
+        k = k or self.k
+        key = (normalize_query(query), product_filter, k)
+        with span("retrieve.cache_lookup"):
+            docs = self._cached_docs(key)
+        if docs is None:
+            embedding = self.embed_query(query)
+            with span("retrieve.search"):
+                docs = self._search_many([query], [embedding], k, product_filter)[0]
+            self._store_docs(key, docs)
+        return docs
+
+    def retrieve_many(self, queries: List[str], k: Optional[int] = None,
+                      product_filter: Optional[str] = None) -> List[List[Document]]:
+        """Retrieve top-k chunks for several queries with one batched embedding call."""
+        if not queries:
+            return []
+        self.check_collection()
+        k = k or self.k
+        keys = [(normalize_query(q), product_filter, k) for q in queries]
+        results = [self._cached_docs(key) for key in keys]
+        todo = [i for i, docs in enumerate(results) if docs is None]
+        if todo:
+            todo_queries = [queries[i] for i in todo]
+            embeddings = self.embed_queries(todo_queries)
+            for i, docs in zip(todo, self._search_many(todo_queries, embeddings, k, product_filter)):
+                results[i] = docs
+                self._store_docs(keys[i], docs)
+        return results
+
+    def register_cache(self, cache):
+        """Clear `cache` whenever the underlying collection changes."""
+        self._dependent_caches.append(cache)
 
-    vector_db = Chroma(
-        persist_directory=CHROMA_DIR,
-        embedding_function=embedder
-    )
+    def invalidate_caches(self):
+        for cache in self._dependent_caches:
+            cache.clear()
 
-    # Apply product filter if specified
-    filter_dict = {"product": product} if product else None
+    def check_collection(self, force: bool = False):
+        """Invalidate result caches if the Chroma collection changed since the last check."""
+        now = time.monotonic()
+        if not force and now - self._last_check < CACHE_CHECK_INTERVAL:
+            return
+        with self._check_lock:
+            self._last_check = now
+            fingerprint = self._collection_fingerprint()
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self.invalidate_caches()
 
-    docs = vector_db.similarity_search(query, k=k, filter=filter_dict)
-    return docs   # return Document objects directly
+    def cache_stats(self) -> dict:
+        stats = {"embedding": self.embedding_cache.stats(), "results": self.result_cache.stats()}
+        for cache in self._dependent_caches[1:]:
+            stats[type(cache).__name__] = cache.stats()
+        return stats
+
+    def partition_report(self) -> dict:
+        """Per-partition sizes and latencies when using the partitioned backend."""
+        report = getattr(self.store, "partition_report", None)
+        return report() if report else {}
+
+    def _collection_fingerprint(self):
+        return self.store.fingerprint()
+
+    def _cached_docs(self, key) -> Optional[List[Document]]:
+        ids = self.result_cache.get(key)
+        if ids is None:
+            return None
+        docs = self.store.get_by_ids(ids)
+        return docs if len(docs) == len(ids) else None
+
+    def _store_docs(self, key, docs: List[Document]):
+        ids = [d.metadata.get("chunk_id") for d in docs]
+        if all(cid is not None for cid in ids):
+            self.result_cache.put(key, [str(cid) for cid in ids])
+
+    def _search_many(self, queries: List[str], embeddings: List[List[float]], k: int,
+                     product_filter: Optional[str]) -> List[List[Document]]:
+        if self.lexical is None:
+            return self.store.search(embeddings, k, product_filter)
+        from lexical_index import reciprocal_rank_fusion
+
+        n_candidates = k * HYBRID_CANDIDATES
+        results = []
+        for query, docs in zip(queries, self.store.search(embeddings, n_candidates, product_filter)):
+            by_id = {str(d.metadata.get("chunk_id")): d for d in docs}
+            with span("retrieve.lexical"):
+                lexical_ids = self.lexical.search_ids(query, n_candidates, product_filter)
+            fused = reciprocal_rank_fusion([list(by_id), lexical_ids])[:k]
+
+            # Lexical-only hits are fetched from the store by id
+            missing = [cid for cid in fused if cid not in by_id]
+            if missing:
+                by_id.update((str(d.metadata.get("chunk_id")), d) for d in self.store.get_by_ids(missing))
+            results.append([by_id[cid] for cid in fused if cid in by_id])
+        return results
+
+
+_RETRIEVER: Optional[ComplaintRetriever] = None
+_RETRIEVER_LOCK = threading.Lock()
+
+def get_retriever(vector_store_path: Optional[str] = None) -> ComplaintRetriever:
+    """Return the process-wide retriever, creating it on first use."""
+    global _RETRIEVER
+    if _RETRIEVER is None:
+        with _RETRIEVER_LOCK:
+            if _RETRIEVER is None:
+                with span("load.retriever"):
+                    _RETRIEVER = ComplaintRetriever(vector_store_path=vector_store_path)
+    return _RETRIEVER
+
+_ANSWER_CACHE: Optional[SemanticAnswerCache] = None
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Return the semantic answer cache, or None when it is disabled."""
+    global _ANSWER_CACHE
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _ANSWER_CACHE is None:
+        retriever = get_retriever()
+        with _RETRIEVER_LOCK:
+            if _ANSWER_CACHE is None:
+                cache = SemanticAnswerCache(ANSWER_CACHE_SIZE, ttl=CACHE_TTL_SECONDS,
+                                            threshold=ANSWER_CACHE_THRESHOLD)
+                retriever.register_cache(cache)
+                _ANSWER_CACHE = cache
+    return _ANSWER_CACHE
+
+def get_relevant_chunks(query: str, k: int = TOP_K, product: Optional[str] = None,
+                        retriever: Optional[ComplaintRetriever] = None) -> List[Document]:
+    """Retrieve top-k relevant chunks as LangChain Documents from the vector store."""
+    with span("get_relevant_chunks"):
+        return (retriever or get_retriever()).retrieve(query, k=k, product_filter=product)
 
 # === Generator ===
-def get_llm():
-    """Load HuggingFace generation pipeline."""
-    gen_pipeline = pipeline(
-        "text2text-generation",
-        model="google/flan-t5-large",   # can downgrade to flan-t5-base if OOM
-        max_length=512,
-        device=0 if torch.cuda.is_available() else -1
-    )
-    return HuggingFacePipeline(pipeline=gen_pipeline)
-
-def generate_answer(query: str, product: Optional[str] = None, k: int = TOP_K):
-    """Generate an answer using retrieved chunks + LLM."""
-    docs = get_relevant_chunks(query, k=k, product=product)
+class ComplaintGenerator:
+    """
+    Seq2seq generator that keeps tokenizer and model weights resident and
+    runs prompts through the model as padded batches.
+    """
+
+    def __init__(self, model_name: str = GEN_MODEL_NAME,
+                 max_input_tokens: int = MAX_INPUT_TOKENS,
+                 max_new_tokens: int = MAX_NEW_TOKENS,
+                 batch_size: int = GEN_BATCH_SIZE, mmap_weights: bool = GEN_MMAP_WEIGHTS):
+        import torch
+        from transformers import AutoTokenizer
+        from batching import MicroBatcher
+
+        self.model_name = model_name
+        self.max_input_tokens = max_input_tokens
+        self.max_new_tokens = max_new_tokens
+        self.batch_size = batch_size
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = None
+        if mmap_weights and self.device.type == "cpu":
+            self.model = load_mmap_model(model_name)
+        if self.model is None:
+            from transformers import AutoModelForSeq2SeqLM
+            self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(self.device)
+        self.model.eval()
+        # Bounds concurrent decoding so parallel requests don't thrash the CPU;
+        # retrieval for other requests keeps running meanwhile.
+        self._slots = threading.BoundedSemaphore(GEN_CONCURRENCY)
+        # Concurrent single-prompt calls are padded into one generate() batch
+        self._batcher = MicroBatcher(
+            self.generate_many, GEN_MAX_BATCH, GEN_MAX_WAIT_MS, name=f"generate:{model_name}"
+        ) if USE_MICRO_BATCHING else None
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False).input_ids)
+
+    def generate(self, prompt: str) -> str:
+        """Generate an answer for a single prompt."""
+        if self._batcher is not None:
+            return self._batcher(prompt)
+        return self.generate_many([prompt])[0]
 
+    def generate_many(self, prompts: List[str], batch_size: Optional[int] = None) -> List[str]:
+        """Generate answers for several prompts, `batch_size` prompts per forward pass."""
+        import torch
+
+        batch_size = batch_size or self.batch_size
+        answers = []
+        for start in range(0, len(prompts), batch_size):
+            batch = list(prompts[start:start + batch_size])
+            inputs = self.tokenizer(
+                batch,
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=self.max_input_tokens
+            ).to(self.device)
+            with self._slots, torch.inference_mode(), span("llm.generate"):
+                output_ids = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+            answers.extend(self.tokenizer.batch_decode(output_ids, skip_special_tokens=True))
+        return answers
+
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield decoded text pieces as the model produces tokens."""
+        import torch
+        from transformers import TextIteratorStreamer
+
+        inputs = self.tokenizer(
+            prompt,
+            return_tensors="pt",
+            truncation=True,
+            max_length=self.max_input_tokens
+        ).to(self.device)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_special_tokens=True)
+        errors = []
+
+        def run():
+            try:
+                with self._slots, torch.inference_mode(), span("llm.stream"):
+                    self.model.generate(**inputs, max_new_tokens=self.max_new_tokens, streamer=streamer)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        for piece in streamer:
+            if piece:
+                yield piece
+        thread.join()
+        if errors:
+            raise errors[0]
+
+
+def load_mmap_model(model_name: str):
+    """
+    Build the model on the meta device and assign its parameters straight
+    from memory-mapped safetensors files (no copy), so processes loading the
+    same checkpoint share its pages. Returns None when the checkpoint has no
+    safetensors weights or some parameters are left unset.
+    """
+    import torch
+    from safetensors.torch import load_file
+    from transformers import AutoConfig, AutoModelForSeq2SeqLM
+    from transformers.utils import cached_file
+
+    index = cached_file(model_name, "model.safetensors.index.json", _raise_exceptions_for_missing_entries=False)
+    if index is not None:
+        with open(index) as f:
+            shards = sorted(set(json.load(f)["weight_map"].values()))
+        files = [cached_file(model_name, shard) for shard in shards]
+    else:
+        single = cached_file(model_name, "model.safetensors", _raise_exceptions_for_missing_entries=False)
+        if single is None:
+            print(f" No safetensors weights for {model_name}; loading normally.", flush=True)
+            return None
+        files = [single]
+
+    with torch.device("meta"):
+        model = AutoModelForSeq2SeqLM.from_config(AutoConfig.from_pretrained(model_name))
+    state = {}
+    for path in files:
+        state.update(load_file(path))
+    model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+
+    unset = [name for name, p in list(model.named_parameters()) + list(model.named_buffers()) if p.is_meta]
+    if unset:
+        print(f" {len(unset)} tensors missing from {model_name} safetensors (e.g. {unset[0]}); "
+              f"loading normally.", flush=True)
+        return None
+    return model
+
+
+_GENERATORS = {}
+_GENERATOR_LOCK = threading.Lock()
+
+def get_llm(model_name: str = GEN_MODEL_NAME) -> ComplaintGenerator:
+    """Return the process-wide generator for `model_name`, loading it on first use."""
+    generator = _GENERATORS.get(model_name)
+    if generator is None:
+        with _GENERATOR_LOCK:
+            generator = _GENERATORS.get(model_name)
+            if generator is None:
+                with span("load.llm"):
+                    generator = ComplaintGenerator(model_name=model_name)
+                _GENERATORS[model_name] = generator
+    return generator
+
+def pack_prompt(query: str, docs: List[Document],
+                llm: Optional[ComplaintGenerator] = None) -> Tuple[str, PackedContext]:
+    """
+    Build the generation prompt with a packed context: overlapping chunks of
+    one complaint merged, near-duplicates dropped, and passages added in
+    relevance order until the model's input budget is used up.
+    """
+    from context_builder import build_context
+
+    llm = llm or get_llm()
+    with span("prompt.build"):
+        # Budget left after the template, question and end-of-sequence token
+        overhead = llm.count_tokens(PROMPT_TEMPLATE.format(context="", question=query)) + 1
+        packed = build_context(docs, llm.count_tokens, max_tokens=llm.max_input_tokens - overhead)
+    TRACER.count("context.tokens_before", packed.tokens_before)
+    TRACER.count("context.tokens_after", packed.tokens_after)
+    TRACER.count("context.tokens_saved", packed.tokens_saved)
+    TRACER.count("context.passages_retrieved", len(docs))
+    TRACER.count("context.passages_packed", len(packed.docs))
+    return PROMPT_TEMPLATE.format(context=packed.text, question=query), packed
+
+def build_prompt(query: str, docs: List[Document], llm: Optional[ComplaintGenerator] = None) -> str:
+    """Build the generation prompt from retrieved chunks."""
+    return pack_prompt(query, docs, llm)[0]
+
+def answer_from_docs(query: str, docs: List[Document], llm: Optional[ComplaintGenerator] = None) -> str:
+    """Generate an answer from already-retrieved chunks."""
+    if not docs:
+        return "⚠️ No relevant context retrieved."
+    llm = llm or get_llm()
+    return llm.generate(build_prompt(query, docs, llm))
+
+def stream_answer_from_docs(query: str, docs: List[Document],
+                            llm: Optional[ComplaintGenerator] = None) -> Iterator[str]:
+    """Like `answer_from_docs`, but yields text pieces as they are decoded."""
     if not docs:
-        return "⚠️ No relevant context retrieved.", []
+        yield "⚠️ No relevant context retrieved."
+        return
+    llm = llm or get_llm()
+    yield from llm.stream(build_prompt(query, docs, llm))
+
+def generate_answer(query: str, product: Optional[str] = None, k: int = TOP_K,
+                    llm: Optional[ComplaintGenerator] = None,
+                    retriever: Optional[ComplaintRetriever] = None):
+    """Generate an answer using retrieved chunks + LLM (the shared retriever unless one is given)."""
+    with TRACER.request("generate_answer"):
+        cache = get_answer_cache() if retriever is None else None
+        if cache is not None:
+            retriever = get_retriever()
+            retriever.check_collection()
+            embedding = retriever.embed_query(query)
+            # Same parameters as the retrieval cache key, plus the model writing the answer
+            scope = (product, k, getattr(llm, "model_name", GEN_MODEL_NAME))
+            cached = cache.lookup(embedding, scope)
+            if cached is not None:
+                return cached
+
+        docs = get_relevant_chunks(query, k=k, product=product, retriever=retriever)
+        answer = answer_from_docs(query, docs, llm)
+
+        if cache is not None and docs:
+            cache.add(embedding, scope, (answer, docs))
+        return answer, docs
+
+def generate_answers(queries: List[str], product: Optional[str] = None, k: int = TOP_K):
+    """Batched `generate_answer`: one retrieval pass and one batched generation pass."""
+    all_docs = get_retriever().retrieve_many(queries, k=k, product_filter=product)
+
+    # Only prompts with context go to the model
+    answers = ["⚠️ No relevant context retrieved."] * len(queries)
+    todo = [i for i, docs in enumerate(all_docs) if docs]
+    prompts = [build_prompt(queries[i], all_docs[i]) for i in todo]
+    for i, answer in zip(todo, get_llm().generate_many(prompts)):
+        answers[i] = answer
+
+    return list(zip(answers, all_docs))
 
-    # Build context string
-    context = "\n\n".join([doc.page_content for doc in docs])
+def dump_metrics(fmt: str = "json") -> str:
+    """Span latency histograms, counters and micro-batcher queue metrics, as JSON or Prometheus text."""
+    from batching import batching_metrics
 
-    # Build prompt
-    final_prompt = PROMPT_TEMPLATE.format(context=context, question=query)
+    if fmt == "prometheus":
+        return TRACER.to_prometheus(gauges=batching_metrics())
+    return json.dumps({"spans": TRACER.snapshot(), "counters": TRACER.counter_snapshot(),
+                       "batching": batching_metrics()}, indent=2)
 
-    # Run generator
-    llm = get_llm()
-    answer = llm.invoke(final_prompt)
+# === Warm-up and readiness ===
+WARMUP_QUERY = "credit card late fee"
 
-    return answer, docs
+_WARMUP_STATE = {"started": None, "finished": None, "error": None}
+_WARMUP_DONE = threading.Event()
+_WARMUP_THREAD: Optional[threading.Thread] = None
+_WARMUP_LOCK = threading.Lock()
+
+def warm_up(model_name: str = GEN_MODEL_NAME, vector_store_path: Optional[str] = None,
+            background: bool = True) -> Optional[threading.Thread]:
+    """
+    Load the retriever and generator and push one query through both, so the
+    first real request doesn't pay for loading. Requests arriving meanwhile
+    wait on the same loader locks instead of loading a second copy.
+    """
+    global _WARMUP_THREAD
+
+    def run():
+        _WARMUP_STATE["started"] = time.time()
+        try:
+            with span("warmup"):
+                docs = get_retriever(vector_store_path).retrieve(WARMUP_QUERY)
+                llm = get_llm(model_name)
+                llm.generate_many([build_prompt(WARMUP_QUERY, docs[:1], llm)])
+            print(f" Warm-up done in {time.time() - _WARMUP_STATE['started']:.1f}s", flush=True)
+        except Exception as e:
+            _WARMUP_STATE["error"] = f"{type(e).__name__}: {e}"
+            print(f" Warm-up failed: {_WARMUP_STATE['error']}", flush=True)
+        finally:
+            _WARMUP_STATE["finished"] = time.time()
+            _WARMUP_DONE.set()
+
+    if not background:
+        run()
+        return None
+    with _WARMUP_LOCK:
+        if _WARMUP_THREAD is None:
+            _WARMUP_THREAD = threading.Thread(target=run, name="warmup", daemon=True)
+            _WARMUP_THREAD.start()
+    return _WARMUP_THREAD
+
+def is_ready() -> bool:
+    """True once warm-up has finished without errors."""
+    return _WARMUP_DONE.is_set() and _WARMUP_STATE["error"] is None
+
+def readiness() -> Dict[str, object]:
+    """Readiness report for health checks."""
+    started, finished = _WARMUP_STATE["started"], _WARMUP_STATE["finished"]
+    return {
+        "ready": is_ready(),
+        "warming_up": started is not None and finished is None,
+        "warmup_s": (finished or time.time()) - started if started else None,
+        "error": _WARMUP_STATE["error"],
+        "retriever_loaded": _RETRIEVER is not None,
+        "models_loaded": sorted(_GENERATORS),
+    }
 
 # === Evaluation ===
 def format_sources(docs: List[Document], max_chars: int = 150) -> List[str]:
@@ -84,13 +613,15 @@ def format_sources(docs: List[Document], max_chars: int = 150) -> List[str]:
     return sources
 
 def evaluate_pipeline(questions: List[str], product: Optional[str] = None, save_path: str = "evaluation_results.md"):
-    """Run evaluation and save results to Markdown."""
+    """
+    Run evaluation and save results to Markdown. For large or labeled
+    question sets use evaluation.py, which batches, checkpoints and resumes.
+    """
     rows = []
+    results = generate_answers(questions, product=product, k=TOP_K)
 
-    for q in questions:
+    for q, (answer, docs) in zip(questions, results):
         print(f"\n🔎 Question: {q}")
-        answer, docs = generate_answer(q, product=product, k=TOP_K)
-
         srcs = format_sources(docs)
         print(f"🤖 Answer: {answer}")
         print("📚 Sources:")
@@ -106,6 +637,7 @@ def evaluate_pipeline(questions: List[str], product: Optional[str] = None, save_
         })
 
     # Save evaluation table
+    import pandas as pd
     df = pd.DataFrame(rows)
     md_table = df.to_markdown(index=False)
 
@@ -117,8 +649,6 @@ def evaluate_pipeline(questions: List[str], product: Optional[str] = None, save_
 
 # === Main ===
 if __name__ == "__main__":
-    import torch
-
     sample_queries = [
         "Credit card late payment issues",
         "Unauthorized transactions in my bank account",
@@ -0,0 +1,169 @@
+# tracing.py
+
+import cProfile
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# === Config ===
+WINDOW_SIZE = 2048                      # recent samples kept per span
+PROFILE_SAMPLE_RATE = float(os.environ.get("TRACE_PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_MS = float(os.environ.get("TRACE_PROFILE_SLOW_MS", 2000))
+PROFILE_DIR = os.environ.get("TRACE_PROFILE_DIR", "profiles/")
+
+
+class RollingHistogram:
+    """Latency samples (ms) over a sliding window plus lifetime count/total."""
+
+    def __init__(self, window: int = WINDOW_SIZE):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def add(self, ms: float):
+        self.samples.append(ms)
+        self.count += 1
+        self.total_ms += ms
+
+    def summary(self) -> Dict[str, float]:
+        if not self.samples:
+            return {"count": self.count}
+        p50, p95, p99 = np.percentile(np.fromiter(self.samples, dtype=np.float64), [50, 95, 99])
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": max(self.samples),
+        }
+
+
+class Tracer:
+    """
+    Records named spans into rolling histograms and named running totals
+    into counters (e.g. prompt tokens saved). `request()` additionally
+    samples cProfile for a fraction of requests and keeps the profile only
+    when the request turns out slow.
+    """
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE, slow_ms: float = PROFILE_SLOW_MS,
+                 profile_dir: str = PROFILE_DIR):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.profile_dir = profile_dir
+        self.histograms: Dict[str, RollingHistogram] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._profiler_busy = threading.Lock()   # one active profiler at a time
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = RollingHistogram()
+            hist.add(seconds * 1000)
+
+    def count(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    @contextmanager
+    def request(self, name: str):
+        """
+        Span for a whole request, with opt-in cProfile sampling of slow ones.
+        Only the calling thread is profiled, so the block must not yield.
+        """
+        profiler = None
+        if self.sample_rate > 0 and random.random() < self.sample_rate \
+                and self._profiler_busy.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.record(name, elapsed)
+            if profiler is not None:
+                profiler.disable()
+                self._profiler_busy.release()
+                if elapsed * 1000 >= self.slow_ms:
+                    self._dump_profile(profiler, name, elapsed)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: hist.summary() for name, hist in sorted(self.histograms.items())}
+
+    def counter_snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(sorted(self.counters.items()))
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.snapshot(), indent=2)
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self, prefix: str = "rag",
+                      gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """
+        Prometheus text exposition: a summary metric with p50/p95/p99 per span
+        and one counter metric for all counters. `gauges` ({source: {metric: value}}) adds numeric values such as queue depths.
+        """
+        metric = f"{prefix}_span_latency_ms"
+        lines = [f"# HELP {metric} Latency of traced spans in milliseconds.",
+                 f"# TYPE {metric} summary"]
+        for name, s in self.snapshot().items():
+            label = f'span="{name}"'
+            for q in ("50", "95", "99"):
+                if f"p{q}_ms" in s:
+                    lines.append(f'{metric}{{{label},quantile="0.{q}"}} {s[f"p{q}_ms"]:.3f}')
+            lines.append(f"{metric}_count{{{label}}} {s['count']}")
+            if "mean_ms" in s:
+                lines.append(f"{metric}_sum{{{label}}} {s['mean_ms'] * s['count']:.3f}")
+        counters = self.counter_snapshot()
+        if counters:
+            lines += [f"# HELP {prefix}_counter_total Running totals recorded by the pipeline.",
+                      f"# TYPE {prefix}_counter_total counter"]
+            lines += [f'{prefix}_counter_total{{counter="{name}"}} {value}' for name, value in counters.items()]
+        for source, values in (gauges or {}).items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    lines.append(f'{prefix}_{key}{{source="{source}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def _dump_profile(self, profiler: cProfile.Profile, name: str, elapsed: float):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+        path = os.path.join(self.profile_dir, f"{slug}_{int(time.time() * 1000)}_{elapsed * 1000:.0f}ms.prof")
+        profiler.dump_stats(path)
+        print(f" Slow request ({elapsed * 1000:.0f} ms) profiled to {path}", flush=True)
+
+
+# Process-wide tracer used by the pipeline, app and indexing code
+TRACER = Tracer()
+span = TRACER.span
@@ -0,0 +1,477 @@
+# vector_store.py
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+# === Config ===
+NUMPY_INDEX_DIR = "vector_store/numpy_index/"
+SEARCH_BLOCK_ROWS = 65536      # rows scored per block, bounds temporary memory
+EXPORT_PAGE_SIZE = 5000
+PARTITIONS_FILE = "partitions.json"   # product -> Chroma collection name
+
+
+# === Chroma backend ===
+class ChromaStore:
+    """Vector-store interface over a persisted Chroma collection."""
+
+    def __init__(self, persist_directory: str, embedding_function=None,
+                 collection_name: Optional[str] = None):
+        from langchain_community.vectorstores import Chroma
+
+        self.persist_directory = persist_directory
+        kwargs = {"collection_name": collection_name} if collection_name else {}
+        self.vector_db = Chroma(persist_directory=persist_directory,
+                                embedding_function=embedding_function, **kwargs)
+
+    def search(self, vectors, k: int, product: Optional[str] = None) -> List[List[Document]]:
+        return [[doc for doc, _ in hits] for hits in self.search_with_scores(vectors, k, product)]
+
+    def search_with_scores(self, vectors, k: int,
+                           product: Optional[str] = None) -> List[List[Tuple[Document, float]]]:
+        """Top-k (document, distance) pairs per query; lower distance is better."""
+        filter_dict = {"product": product} if product else None
+        return [
+            self.vector_db.similarity_search_by_vector_with_relevance_scores(
+                list(map(float, v)), k=k, filter=filter_dict)
+            for v in vectors
+        ]
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        if not ids:
+            return []
+        found = self.vector_db.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {
+            cid: Document(page_content=text, metadata=meta)
+            for cid, text, meta in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return [by_id[cid] for cid in ids if cid in by_id]
+
+    def count(self) -> int:
+        return self.vector_db._collection.count()
+
+    def fingerprint(self):
+        sqlite_path = os.path.join(self.persist_directory, "chroma.sqlite3")
+        mtime = os.path.getmtime(sqlite_path) if os.path.exists(sqlite_path) else None
+        return self.count(), mtime
+
+
+# === Product partitions ===
+def partition_collection_name(product: str) -> str:
+    """Chroma-safe collection name for a product partition."""
+    slug = re.sub(r"[^a-z0-9]+", "_", str(product).lower()).strip("_") or "unknown"
+    return f"product_{slug}"[:63]
+
+def load_partitions(persist_directory: str) -> Dict[str, str]:
+    path = os.path.join(persist_directory, PARTITIONS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_partitions(persist_directory: str, partitions: Dict[str, str]):
+    os.makedirs(persist_directory, exist_ok=True)
+    with open(os.path.join(persist_directory, PARTITIONS_FILE), "w") as f:
+        json.dump(partitions, f, indent=2, sort_keys=True)
+
+
+class LatencyStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict:
+        mean = self.total / self.count if self.count else 0.0
+        return {"queries": self.count, "mean_ms": mean * 1000, "max_ms": self.max * 1000}
+
+
+class PartitionedChromaStore:
+    """
+    Routes queries to one Chroma collection per product (see
+    `embedding.py --partition_by_product`). Filtered queries go straight to
+    their partition; unfiltered queries search all partitions in parallel
+    and merge by distance. The global collection still serves id lookups
+    and products without a partition.
+    """
+
+    def __init__(self, persist_directory: str, embedding_function=None, max_workers: int = 8):
+        self.persist_directory = persist_directory
+        self.global_store = ChromaStore(persist_directory, embedding_function)
+        self.partitions = {
+            product: ChromaStore(persist_directory, embedding_function, collection_name=name)
+            for product, name in load_partitions(persist_directory).items()
+        }
+        if not self.partitions:
+            raise ValueError(f"No product partitions found in {persist_directory}")
+        self.latency = {product: LatencyStats() for product in self.partitions}
+        self._pool = ThreadPoolExecutor(max_workers=min(max_workers, len(self.partitions)),
+                                        thread_name_prefix="partition")
+
+    def search(self, vectors, k: int, product: Optional[str] = None) -> List[List[Document]]:
+        if product:
+            if product not in self.partitions:
+                return self.global_store.search(vectors, k, product)
+            return [[doc for doc, _ in hits] for hits in self._search_partition(product, vectors, k)]
+
+        futures = [self._pool.submit(self._search_partition, p, vectors, k) for p in self.partitions]
+        per_partition = [f.result() for f in futures]
+        results = []
+        for q in range(len(vectors)):
+            merged = sorted((hit for hits in per_partition for hit in hits[q]), key=lambda h: h[1])
+            results.append([doc for doc, _ in merged[:k]])
+        return results
+
+    def _search_partition(self, product: str, vectors, k: int):
+        start = time.perf_counter()
+        hits = self.partitions[product].search_with_scores(vectors, k)
+        self.latency[product].record(time.perf_counter() - start)
+        return hits
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        return self.global_store.get_by_ids(ids)
+
+    def count(self) -> int:
+        return self.global_store.count()
+
+    def fingerprint(self):
+        return self.global_store.fingerprint()
+
+    def partition_report(self) -> Dict[str, dict]:
+        """Size and observed query latency of every partition."""
+        return {
+            product: {"chunks": store.count(), **self.latency[product].as_dict()}
+            for product, store in self.partitions.items()
+        }
+
+
+def build_product_partitions(persist_directory: str, page_size: int = EXPORT_PAGE_SIZE) -> Dict[str, int]:
+    """Backfill per-product collections from the global collection. Returns chunks per partition."""
+    from langchain_community.vectorstores import Chroma
+
+    partitions = load_partitions(persist_directory)
+    collections = {}
+    sizes: Dict[str, int] = {}
+    source = ChromaStore(persist_directory).vector_db._collection
+    for ids, vectors, documents, metadatas in iter_chroma_pages(source, page_size):
+        by_product: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            by_product.setdefault(meta.get("product", ""), []).append(i)
+        for product, rows in by_product.items():
+            if product not in collections:
+                name = partitions.setdefault(product, partition_collection_name(product))
+                collections[product] = Chroma(collection_name=name,
+                                              persist_directory=persist_directory)._collection
+            collections[product].upsert(
+                ids=[ids[i] for i in rows],
+                embeddings=[vectors[i].tolist() for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+                documents=[documents[i] for i in rows],
+            )
+            sizes[product] = sizes.get(product, 0) + len(rows)
+    save_partitions(persist_directory, partitions)
+    return sizes
+
+
+# === NumPy memmap backend ===
+class StringColumn:
+    """Read-only strings stored as one UTF-8 blob plus an offsets array, both memory-mapped."""
+
+    def __init__(self, blob_path: str, offsets_path: str):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        size = os.path.getsize(blob_path)
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if size else np.empty(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+
+class StringColumnWriter:
+    def __init__(self, blob_path: str, offsets_path: str, n: int):
+        self._blob = open(blob_path, "wb")
+        self._offsets = np.lib.format.open_memmap(offsets_path, mode="w+", dtype=np.int64, shape=(n + 1,))
+        self._offsets[0] = 0
+        self._i = 0
+        self._pos = 0
+
+    def extend(self, values: Iterable[str]):
+        for value in values:
+            data = str(value).encode("utf-8")
+            self._blob.write(data)
+            self._pos += len(data)
+            self._i += 1
+            self._offsets[self._i] = self._pos
+
+    def close(self):
+        self._blob.close()
+        self._offsets.flush()
+        del self._offsets
+
+
+class SortedIdIndex:
+    """
+    chunk id -> row lookups by binary search over fixed-width, sorted id
+    bytes (`chunk_ids_sorted.npy`) and their rows (`chunk_ids_order.npy`).
+    Both are memory-mapped, so processes share them like the other arrays.
+    """
+
+    def __init__(self, index_dir: str):
+        sorted_path = os.path.join(index_dir, "chunk_ids_sorted.npy")
+        if not os.path.exists(sorted_path):
+            raise FileNotFoundError(f"{sorted_path} not found; rebuild the store to enable get_by_ids")
+        self.sorted_ids = np.load(sorted_path, mmap_mode="r")
+        self.order = np.load(os.path.join(index_dir, "chunk_ids_order.npy"), mmap_mode="r")
+
+    def rows(self, ids: List[str]) -> np.ndarray:
+        """Row of each id, or -1 when it is not in the store."""
+        if len(ids) == 0 or len(self.sorted_ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        keys = np.array([str(i).encode("utf-8") for i in ids], dtype=np.bytes_)
+        pos = np.searchsorted(self.sorted_ids, keys)
+        pos = np.minimum(pos, len(self.sorted_ids) - 1)
+        found = np.asarray(self.sorted_ids[pos]) == keys
+        return np.where(found, np.asarray(self.order[pos]), -1)
+
+
+def write_id_index(out_dir: str):
+    """Write the sorted chunk id arrays read by `SortedIdIndex`."""
+    chunk_ids = StringColumn(os.path.join(out_dir, "chunk_ids.bin"), os.path.join(out_dir, "chunk_ids_offsets.npy"))
+    ids = np.array([chunk_ids[i].encode("utf-8") for i in range(len(chunk_ids))], dtype=np.bytes_)
+    order = np.argsort(ids, kind="stable")
+    np.save(os.path.join(out_dir, "chunk_ids_sorted.npy"), ids[order])
+    np.save(os.path.join(out_dir, "chunk_ids_order.npy"), order.astype(np.int64))
+
+
+class NumpyVectorStore:
+    """
+    Exact-search store over an `.npy` memmap of L2-normalized vectors with
+    metadata in parallel arrays:
+
+        embeddings.npy      (N, dim) float16/float32, unit norm
+        products.npy        (N,) uint16 codes into product_names.json
+        complaint_ids.npy   (N,) int64
+        chunk_ids.*, texts.*  UTF-8 blob + offsets (chunk ids also sorted, for get_by_ids)
+
+    Everything is opened read-only with mmap, so several server processes
+    share one copy through the page cache. Scores are cosine similarity.
+    """
+
+    def __init__(self, index_dir: str = NUMPY_INDEX_DIR):
+        self.index_dir = index_dir
+        self.embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+        self.products = np.load(os.path.join(index_dir, "products.npy"), mmap_mode="r")
+        self.complaint_ids = np.load(os.path.join(index_dir, "complaint_ids.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "product_names.json")) as f:
+            self.product_names: List[str] = json.load(f)
+        self.chunk_ids = StringColumn(os.path.join(index_dir, "chunk_ids.bin"),
+                                      os.path.join(index_dir, "chunk_ids_offsets.npy"))
+        self.texts = StringColumn(os.path.join(index_dir, "texts.bin"),
+                                  os.path.join(index_dir, "texts_offsets.npy"))
+        self._product_codes = {name: code for code, name in enumerate(self.product_names)}
+        self._product_rows: Dict[int, np.ndarray] = {}
+        self._id_index: Optional[SortedIdIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    def search(self, vectors, k: int, product: Optional[str] = None) -> List[List[Document]]:
+        return [
+            [self.document(row) for row in rows]
+            for rows, _ in self.search_rows(vectors, k, product)
+        ]
+
+    def search_rows(self, vectors, k: int,
+                    product: Optional[str] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Batched exact top-k. Returns (rows, scores) per query, best first."""
+        queries = _normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        candidates = self.product_rows(product)
+        if candidates is not None and len(candidates) == 0:
+            return [(np.empty(0, np.int64), np.empty(0, np.float32)) for _ in queries]
+
+        n = len(self) if candidates is None else len(candidates)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, n, SEARCH_BLOCK_ROWS):
+            if candidates is None:
+                rows = np.arange(start, min(start + SEARCH_BLOCK_ROWS, n))
+                block = self.embeddings[start:start + SEARCH_BLOCK_ROWS]
+            else:
+                rows = candidates[start:start + SEARCH_BLOCK_ROWS]
+                block = self.embeddings[rows]
+            scores = queries @ np.asarray(block, dtype=np.float32).T
+            top = _top_k(scores, k)
+            best_rows = np.concatenate([best_rows, rows[top]], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            keep = _top_k(best_scores, k)
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return list(zip(best_rows, best_scores))
+
+    def product_rows(self, product: Optional[str]) -> Optional[np.ndarray]:
+        """Row indices for one product (cached), or None for all rows."""
+        if not product:
+            return None
+        code = self._product_codes.get(product)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        if code not in self._product_rows:
+            self._product_rows[code] = np.flatnonzero(np.asarray(self.products) == code)
+        return self._product_rows[code]
+
+    def document(self, row: int) -> Document:
+        row = int(row)
+        return Document(
+            page_content=self.texts[row],
+            metadata={
+                "product": self.product_names[self.products[row]],
+                "complaint_id": int(self.complaint_ids[row]),
+                "chunk_id": self.chunk_ids[row],
+            },
+        )
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        if self._id_index is None:
+            self._id_index = SortedIdIndex(self.index_dir)
+        return [self.document(row) for row in self._id_index.rows(ids) if row >= 0]
+
+    def count(self) -> int:
+        return len(self)
+
+    def fingerprint(self):
+        return len(self), os.path.getmtime(os.path.join(self.index_dir, "embeddings.npy"))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k largest scores per row (unordered)."""
+    if scores.shape[1] <= k:
+        return np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+# === Building ===
+def build_numpy_store(out_dir: str, batches: Iterable[Tuple[List[str], np.ndarray, List[str], List[dict]]],
+                      total: int, dim: int, dtype: str = "float16") -> str:
+    """
+    Write a NumpyVectorStore from (ids, embeddings, documents, metadatas)
+    batches holding `total` rows in all. Vectors are normalized on the way in.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    embeddings = np.lib.format.open_memmap(os.path.join(out_dir, "embeddings.npy"),
+                                           mode="w+", dtype=np.dtype(dtype), shape=(total, dim))
+    products = np.lib.format.open_memmap(os.path.join(out_dir, "products.npy"),
+                                         mode="w+", dtype=np.uint16, shape=(total,))
+    complaint_ids = np.lib.format.open_memmap(os.path.join(out_dir, "complaint_ids.npy"),
+                                              mode="w+", dtype=np.int64, shape=(total,))
+    chunk_ids = StringColumnWriter(os.path.join(out_dir, "chunk_ids.bin"),
+                                   os.path.join(out_dir, "chunk_ids_offsets.npy"), total)
+    texts = StringColumnWriter(os.path.join(out_dir, "texts.bin"),
+                               os.path.join(out_dir, "texts_offsets.npy"), total)
+    product_codes: Dict[str, int] = {}
+
+    row = 0
+    for ids, vectors, documents, metadatas in batches:
+        n = len(ids)
+        embeddings[row:row + n] = _normalize(np.asarray(vectors, dtype=np.float32))
+        products[row:row + n] = [
+            product_codes.setdefault(m.get("product", ""), len(product_codes)) for m in metadatas
+        ]
+        complaint_ids[row:row + n] = [_as_int(m.get("complaint_id")) for m in metadatas]
+        chunk_ids.extend(ids)
+        texts.extend(documents)
+        row += n
+    if row != total:
+        raise ValueError(f"Expected {total} rows, got {row}")
+
+    embeddings.flush()
+    products.flush()
+    complaint_ids.flush()
+    chunk_ids.close()
+    texts.close()
+    write_id_index(out_dir)
+    with open(os.path.join(out_dir, "product_names.json"), "w") as f:
+        json.dump(sorted(product_codes, key=product_codes.get), f)
+    return out_dir
+
+
+def _as_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def iter_chroma_pages(collection, page_size: int = EXPORT_PAGE_SIZE):
+    """Yield (ids, embeddings, documents, metadatas) pages from a Chroma collection."""
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        page = collection.get(include=["embeddings", "documents", "metadatas"],
+                              limit=page_size, offset=offset)
+        yield page["ids"], np.asarray(page["embeddings"]), page["documents"], page["metadatas"]
+
+
+def export_from_chroma(persist_directory: str, out_dir: str = NUMPY_INDEX_DIR,
+                       dtype: str = "float16", page_size: int = EXPORT_PAGE_SIZE) -> str:
+    """Build a NumpyVectorStore from an existing Chroma index, one page at a time."""
+    collection = ChromaStore(persist_directory).vector_db._collection
+    total = collection.count()
+    if total == 0:
+        raise ValueError(f"Chroma index at {persist_directory} is empty")
+    first = collection.get(include=["embeddings"], limit=1)
+    dim = len(first["embeddings"][0])
+    return build_numpy_store(out_dir, iter_chroma_pages(collection, page_size),
+                             total=total, dim=dim, dtype=dtype)
+
+
+# === Main ===
+def main():
+    parser = argparse.ArgumentParser(description="Export a Chroma index to the NumPy memmap backend.")
+    parser.add_argument("--chroma_dir", required=True)
+    parser.add_argument("--partitions", action="store_true",
+                        help="Build per-product Chroma partitions instead of exporting")
+    parser.add_argument("--out_dir", default=NUMPY_INDEX_DIR)
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    parser.add_argument("--page_size", type=int, default=EXPORT_PAGE_SIZE)
+    args = parser.parse_args()
+
+    if args.partitions:
+        print(f" Building product partitions in {args.chroma_dir}...", flush=True)
+        for product, n in sorted(build_product_partitions(args.chroma_dir, args.page_size).items()):
+            print(f"   {product:<25}: {n:>9,} chunks", flush=True)
+        return
+
+    print(f" Exporting {args.chroma_dir} -> {args.out_dir} ({args.dtype})...", flush=True)
+    export_from_chroma(args.chroma_dir, args.out_dir, args.dtype, args.page_size)
+    store = NumpyVectorStore(args.out_dir)
+    size = sum(os.path.getsize(os.path.join(args.out_dir, f)) for f in os.listdir(args.out_dir))
+    print(f" Exported {len(store):,} vectors ({size / 1e6:,.1f} MB on disk).", flush=True)
+
+
+if __name__ == "__main__":
+    main()
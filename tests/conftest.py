@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Source modules are imported by name, the same way the scripts in src/ import each other
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
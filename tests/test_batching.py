@@ -0,0 +1,45 @@
+# test_batching.py
+
+import threading
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def test_concurrent_requests_share_a_batch():
+    calls = []
+    release = threading.Event()
+
+    def double(items):
+        calls.append(list(items))
+        release.wait(1)
+        return [x * 2 for x in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait_ms=50, name="test")
+    try:
+        futures = [batcher.submit(i) for i in range(6)]
+        release.set()
+        assert [f.result(timeout=2) for f in futures] == [0, 2, 4, 6, 8, 10]
+        assert [len(c) for c in calls] == [4, 2]
+
+        metrics = batcher.metrics()
+        assert metrics["batches"] == 2
+        assert metrics["batch_sizes"] == {2: 1, 4: 1}
+        assert metrics["max_queue_depth"] >= 4
+    finally:
+        batcher.close()
+
+
+def test_errors_reach_every_caller():
+    def fail(items):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(fail, max_batch_size=2, max_wait_ms=20, name="failing")
+    try:
+        futures = [batcher.submit(i) for i in range(2)]
+        for f in futures:
+            with pytest.raises(RuntimeError):
+                f.result(timeout=2)
+    finally:
+        batcher.close()
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from run_benchmarks import compare_results, parse_args, run_suite
+from synthetic import HashingEmbedder
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    a = HashingEmbedder(dim=32).encode(["late fee on my card", ""])
+    b = HashingEmbedder(dim=32).encode(["late fee on my card", ""])
+    assert np.array_equal(a, b)
+    assert np.isclose(np.linalg.norm(a[0]), 1.0)
+    assert not a[1].any()
+
+
+def test_small_suite_and_regression_check(tmp_path):
+    args = parse_args(["--chunks", "300", "--queries", "10", "--skip_model",
+                       "--skip_generate", "--work_dir", str(tmp_path)])
+    results = run_suite(args)
+
+    assert results["embedding"]["chunks"] == 300
+    assert results["embedding_model"] == {"skipped": "--skip_model"}
+    assert 0.9 <= results["query"]["dense"]["recall_at_k"] <= 1.0    # float16 rounding only
+    chroma = results["chroma"]
+    assert "skipped" in chroma or 0 < chroma["recall_at_k"] <= 1.0
+    assert results["index"]["numpy"]["disk_mb"] > 0
+    assert results["quantized"]["sq8"]["recall_at_k"] >= 0.9
+    assert results["quantized"]["pq"]["scan_mb"] < results["quantized"]["numpy"]["scan_mb"]
+    assert results["generate_answer"] == {"skipped": "--skip_generate"}
+
+    slower = {"query": {"dense": {"p50_ms": results["query"]["dense"]["p50_ms"] * 2,
+                                  "recall_at_k": 1.0}}}
+    assert compare_results(results, results) == []
+    assert [r.split(":")[0] for r in compare_results(slower, results)] == ["query.dense.p50_ms"]
@@ -0,0 +1,60 @@
+# test_checkpoint.py
+
+import os
+
+from checkpoint import CheckpointStore
+from drive_sync import IncrementalSync
+
+
+def test_checkpoint_existing_and_legacy_import(tmp_path):
+    legacy = tmp_path / "embedded_ids.txt"
+    legacy.write_text("1_0\n1_1\n\n2_0\n")
+
+    store = CheckpointStore(str(tmp_path / "ck.sqlite3"))
+    assert store.import_text_checkpoint(str(legacy)) == 3
+    assert store.import_text_checkpoint(str(legacy)) == 0
+
+    store.add(["3_0", "1_0"])
+    assert store.count() == 4
+    assert store.existing(["1_0", "9_9", "3_0"]) == {"1_0", "3_0"}
+
+    store.remove(["1_0"])
+    assert store.existing(["1_0"]) == set()
+
+
+def test_incremental_sync_copies_only_changes(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    (src / "seg").mkdir(parents=True)
+    (src / "chroma.sqlite3").write_bytes(b"a" * 10)
+    (src / "seg" / "data.bin").write_bytes(b"b" * 10)
+
+    syncer = IncrementalSync(str(src), str(dst))
+    assert syncer.sync_once() == 2
+    assert syncer.sync_once() == 0
+
+    (src / "chroma.sqlite3").write_bytes(b"c" * 12)
+    os.remove(src / "seg" / "data.bin")
+    assert IncrementalSync(str(src), str(dst)).sync_once() == 1
+    assert (dst / "chroma.sqlite3").read_bytes() == b"c" * 12
+    assert not (dst / "seg" / "data.bin").exists()
+
+
+def test_incremental_sync_copies_outside_the_lock(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    (src / "chroma.sqlite3").write_bytes(b"a" * 10)
+    syncer = IncrementalSync(str(src), str(dst))
+    copy = syncer._copy
+
+    def copy_while_writing(path, target, st):
+        assert not syncer.lock.locked()
+        (src / "chroma.sqlite3").write_bytes(b"b" * 11)     # a writer commits mid-copy
+        return copy(path, target, st)
+
+    syncer._copy = copy_while_writing
+    assert syncer.sync_once() == 0                         # torn copy discarded
+    assert not (dst / "chroma.sqlite3").exists()
+
+    syncer._copy = copy
+    assert syncer.sync_once() == 1
+    assert (dst / "chroma.sqlite3").read_bytes() == b"b" * 11
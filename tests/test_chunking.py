@@ -0,0 +1,98 @@
+# test_chunking.py
+
+import pandas as pd
+import pytest
+
+from chunking import chunk_narratives, chunk_offsets, parse_args
+
+
+def make_frame():
+    narrative = "the bank charged a late fee on my credit card. " * 20
+    return pd.DataFrame({
+        "Product": ["Credit card", "Money transfers", "Personal loan"],
+        "Complaint ID": [101, 102, 103],
+        "cleaned_narrative": [narrative, "short complaint", narrative * 2],
+    }, index=[5, 6, 7])
+
+
+def test_chunk_ids_are_content_derived():
+    df = make_frame()
+    chunks = chunk_narratives(df)
+    first = chunks[chunks["complaint_id"] == 101]["chunk_id"].tolist()
+    prefix = first[0].rsplit("_", 1)[0]
+    assert prefix.startswith("101_") and len(prefix) == len("101_") + 12
+    assert first == [f"{prefix}_{i}" for i in range(len(first))]
+    assert set(chunks["product"]) == {"Credit card", "Money transfers", "Personal loan"}
+
+    # Same ids whatever the row order or index; new ids when the narrative changes
+    shuffled = chunk_narratives(df.iloc[::-1].reset_index(drop=True))
+    assert sorted(shuffled["chunk_id"]) == sorted(chunks["chunk_id"])
+    edited = df.assign(cleaned_narrative=df["cleaned_narrative"].str.replace("late", "annual"))
+    assert not set(chunk_narratives(edited)["chunk_id"]) & set(first)
+
+
+def test_parallel_output_matches_serial():
+    df = make_frame()
+    pd.testing.assert_frame_equal(chunk_narratives(df), chunk_narratives(df, workers=2))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_streaming_parquet_round_trip(tmp_path, workers):
+    pytest.importorskip("pyarrow")
+    from chunking import stream_chunk_narratives, iter_parquet_chunks
+
+    df = make_frame()
+    df.to_csv(tmp_path / "filtered.csv", index=False)
+    out = tmp_path / "chunks"
+    total = stream_chunk_narratives(str(tmp_path / "filtered.csv"), str(out), batch_size=2, workers=workers)
+
+    expected = chunk_narratives(pd.read_csv(tmp_path / "filtered.csv"))
+    got = pd.concat(list(iter_parquet_chunks(str(out), batch_size=3)), ignore_index=True)
+    assert total == len(expected)
+    assert got["chunk_id"].tolist() == expected["chunk_id"].tolist()
+    assert got["chunk_text"].tolist() == expected["chunk_text"].tolist()
+
+
+def test_delta_chunks_only_new_and_changed(tmp_path):
+    pytest.importorskip("pyarrow")
+    from chunking import chunk_delta, promote_snapshot
+
+    paths = {name: str(tmp_path / name) for name in
+             ("snapshot.parquet", "pending.parquet", "delta.csv", "stale.csv")}
+
+    def run(df):
+        df.to_csv(tmp_path / "filtered.csv", index=False)
+        stats = chunk_delta(str(tmp_path / "filtered.csv"), paths["snapshot.parquet"], paths["delta.csv"],
+                            paths["stale.csv"], paths["pending.parquet"], batch_size=2)
+        promote_snapshot(paths["pending.parquet"], paths["snapshot.parquet"])
+        return stats, pd.read_csv(paths["delta.csv"]), pd.read_csv(paths["stale.csv"])
+
+    df = make_frame()
+    stats, delta, stale = run(df)
+    assert stats == {"new": 3, "changed": 0, "unchanged": 0, "deleted": 0, "chunks": len(delta)}
+    assert delta["chunk_id"].tolist() == chunk_narratives(df)["chunk_id"].tolist()
+    assert stale.empty
+
+    # Reordered, one narrative edited, one complaint removed, one added
+    refreshed = pd.concat([df.iloc[[2, 0]], pd.DataFrame({
+        "Product": ["Savings account"], "Complaint ID": [104], "cleaned_narrative": ["new complaint"]})])
+    refreshed.loc[refreshed["Complaint ID"] == 103, "cleaned_narrative"] = "rewritten narrative"
+    stats, delta, stale = run(refreshed)
+    assert (stats["new"], stats["changed"], stats["unchanged"], stats["deleted"]) == (1, 1, 1, 1)
+    assert sorted(set(delta["complaint_id"])) == [103, 104]
+    assert sorted(stale["complaint_id"]) == [102, 103]
+
+    stats, delta, stale = run(refreshed)
+    assert stats["unchanged"] == 3 and delta.empty and stale.empty
+
+
+def test_bm25_with_delta_is_rejected(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["chunking.py", "--bm25", "--delta"])
+    with pytest.raises(SystemExit):
+        parse_args()
+
+
+def test_chunk_offsets_reject_chunks_missing_from_text():
+    assert chunk_offsets("abc def abc", ["abc", "def", "abc"], overlap=0) == [(0, 3), (4, 7), (8, 11)]
+    with pytest.raises(ValueError):
+        chunk_offsets("abc def", ["abc", "xyz"])
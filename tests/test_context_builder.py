@@ -0,0 +1,38 @@
+# test_context_builder.py
+
+from langchain.docstore.document import Document
+
+from context_builder import build_context
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def doc(text, complaint_id):
+    return Document(page_content=text, metadata={"complaint_id": complaint_id})
+
+
+def test_merges_overlapping_chunks_of_same_complaint():
+    first = "i was charged a late fee even though my payment was sent on time"
+    second = "payment was sent on time and the bank refused to waive it"
+    packed = build_context([doc(first, 1), doc(second, 1)], count_words)
+
+    assert len(packed.docs) == 1
+    assert packed.text == first + " and the bank refused to waive it"
+    assert packed.tokens_saved == 5
+
+
+def test_drops_near_duplicates_and_respects_budget():
+    text = "unauthorized transaction on my checking account was never reversed by the bank"
+    docs = [
+        doc(text, 1),
+        doc(text + ".", 2),
+        doc("a very long passage " * 10, 3),
+        doc("zelle scam", 4),
+    ]
+    packed = build_context(docs, count_words, max_tokens=20)
+
+    assert [d.metadata["complaint_id"] for d in packed.docs] == [1, 4]
+    assert packed.tokens_after <= 20
+    assert len(packed.dropped) == 1
@@ -0,0 +1,106 @@
+# test_embedding.py
+
+import pandas as pd
+import pytest
+
+import embedding
+from checkpoint import CheckpointStore
+
+
+class FakeCollection:
+    def __init__(self):
+        self.rows = {}
+
+    def get(self, where=None, include=()):
+        wanted = set(where["complaint_id"]["$in"])
+        ids = [cid for cid, meta in self.rows.items() if meta["complaint_id"] in wanted]
+        return {"ids": ids, "metadatas": [self.rows[cid] for cid in ids]}
+
+    def delete(self, ids):
+        for cid in ids:
+            self.rows.pop(cid, None)
+
+    def upsert(self, ids, metadatas, **kwargs):
+        self.rows.update(zip(ids, metadatas))
+
+
+class FakeChroma:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def persist(self):
+        pass
+
+
+def test_apply_delta_rewrites_product_only_changes(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    from chunking import chunk_delta, promote_snapshot
+
+    paths = {name: str(tmp_path / name) for name in
+             ("snapshot.parquet", "pending.parquet", "delta.csv", "stale.csv", "checkpoint.sqlite3")}
+    main, old_partition = FakeCollection(), FakeCollection()
+    collections = {None: main, "part_credit_card": old_partition}
+    monkeypatch.setattr(embedding, "LOCAL_CHROMA_DIR", str(tmp_path / "chroma"))
+    monkeypatch.setattr(embedding, "DRIVE_CHROMA_DIR", str(tmp_path / "drive_chroma"))
+    monkeypatch.setattr(embedding, "open_chroma",
+                        lambda collection_name=None: FakeChroma(collections[collection_name]))
+    monkeypatch.setattr(embedding, "load_partitions", lambda path: {"Credit card": "part_credit_card"})
+
+    def index(chunked_path, checkpoint_path, partition_by_product=False):
+        # Stand-in for the embed/upsert pipeline: the same skip-committed rule, no model
+        checkpoint = CheckpointStore(checkpoint_path)
+        for frame in embedding.iter_chunk_batches(chunked_path, 100):
+            batch = embedding.prepare_batch(frame, checkpoint)
+            if batch:
+                main.upsert(batch["ids"], batch["metadatas"])
+                checkpoint.add(batch["ids"])
+        checkpoint.close()
+
+    monkeypatch.setattr(embedding, "embed_and_index_chroma", index)
+
+    def refresh(df):
+        df.to_csv(tmp_path / "filtered.csv", index=False)
+        chunk_delta(str(tmp_path / "filtered.csv"), paths["snapshot.parquet"], paths["delta.csv"],
+                    paths["stale.csv"], paths["pending.parquet"])
+        embedding.apply_delta(paths["delta.csv"], paths["stale.csv"], paths["checkpoint.sqlite3"])
+        promote_snapshot(paths["pending.parquet"], paths["snapshot.parquet"])
+
+    df = pd.DataFrame({"Product": ["Credit card", "Personal loan"], "Complaint ID": [101, 102],
+                       "cleaned_narrative": ["late fee on my card " * 30, "loan payment was lost"]})
+    refresh(df)
+    first_ids = sorted(cid for cid, meta in main.rows.items() if meta["complaint_id"] == 101)
+    old_partition.upsert(first_ids, [main.rows[cid] for cid in first_ids])
+
+    refresh(df.assign(Product=["Personal loan", "Personal loan"]))
+    moved = {cid: meta["product"] for cid, meta in main.rows.items() if meta["complaint_id"] == 101}
+    assert sorted(moved) == first_ids                       # same content-derived ids
+    assert set(moved.values()) == {"Personal loan"}         # ...rewritten with the new product
+    assert old_partition.rows == {}
+    checkpoint = CheckpointStore(paths["checkpoint.sqlite3"])
+    assert checkpoint.existing(first_ids) == set(first_ids)
+    checkpoint.close()
+
+
+def test_verify_progress_ignores_ids_from_other_files(tmp_path):
+    pd.DataFrame({"chunk_id": ["a_0", "a_1", "b_0"], "product": "Credit card", "complaint_id": [1, 1, 2],
+                  "chunk_text": ["x", "y", "z"]}).to_csv(tmp_path / "chunks.csv", index=False)
+    source = embedding.chunk_source(str(tmp_path / "chunks.csv"))
+    checkpoint = CheckpointStore(str(tmp_path / "checkpoint.sqlite3"))
+    checkpoint.add(["a_0"], source)
+    checkpoint.add(["b_0"] + [f"{i}_0" for i in range(10)])     # other files' and stale row-label ids
+    checkpoint.close()
+
+    checkpoint, total, remaining = embedding.verify_progress(str(tmp_path / "chunks.csv"),
+                                                             str(tmp_path / "checkpoint.sqlite3"))
+    # Chunks committed by another file are recorded for this one when the run skips them
+    embedding.prepare_batch(pd.read_csv(tmp_path / "chunks.csv"), checkpoint, source)
+    assert checkpoint.count_source(source) == 2
+    checkpoint.close()
+    assert (total, remaining) == (3, 2)
+
+    pd.DataFrame({"chunk_id": ["c_0"], "product": "Credit card", "complaint_id": [3],
+                  "chunk_text": ["w"]}).to_csv(tmp_path / "chunks.csv", index=False)
+    checkpoint, total, remaining = embedding.verify_progress(str(tmp_path / "chunks.csv"),
+                                                             str(tmp_path / "checkpoint.sqlite3"))
+    checkpoint.close()
+    assert (total, remaining) == (1, 1)                          # rewritten file starts from zero
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from embedding_backends import cosine_agreement, length_sorted_batches, make_encoder, mean_pool
+
+
+def test_length_sorted_batches_cover_every_row_once():
+    lengths = [30, 2, 17, 2, 250, 9, 30]
+    batches = length_sorted_batches(lengths, batch_size=3)
+    rows = np.concatenate(batches)
+    assert sorted(rows.tolist()) == list(range(len(lengths)))
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert [lengths[i] for i in rows] == sorted(lengths)
+
+
+def test_mean_pool_ignores_padding():
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype=np.float32)
+    pooled = mean_pool(hidden, np.array([[1, 1, 0]]))
+    assert np.allclose(pooled, [[1.0, 0.0]])
+
+
+def test_cosine_agreement():
+    rng = np.random.default_rng(0)
+    reference = rng.normal(size=(20, 16))
+    assert cosine_agreement(reference * 3, reference)["min"] == pytest.approx(1.0)
+    noisy = cosine_agreement(reference + rng.normal(scale=0.5, size=reference.shape), reference)
+    assert noisy["mean"] < 0.99 and noisy["min"] <= noisy["p05"] <= noisy["mean"]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        make_encoder("fp8")
+    with pytest.raises(ValueError):
+        make_encoder("torch")
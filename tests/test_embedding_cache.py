@@ -0,0 +1,58 @@
+# test_embedding_cache.py
+
+import numpy as np
+import pytest
+
+from embedding_cache import CachedEncoder, EmbeddingCache
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.seen = []
+
+    def encode(self, texts):
+        self.seen.extend(texts)
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+    def close(self):
+        pass
+
+
+def test_duplicates_encoded_once(tmp_path):
+    inner = CountingEncoder()
+    encoder = CachedEncoder(inner, EmbeddingCache(str(tmp_path), "mini"))
+
+    vectors = encoder.encode(["xxxx paid late", "xxxx  paid late ", "refund denied"])
+    assert inner.seen == ["xxxx paid late", "refund denied"]
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+    assert encoder.dedup_ratio == pytest.approx(1 / 3)
+
+
+def test_cache_survives_reopen(tmp_path):
+    first = CachedEncoder(CountingEncoder(), EmbeddingCache(str(tmp_path), "mini"))
+    expected = first.encode(["refund denied", "card closed"])
+
+    inner = CountingEncoder()
+    second = CachedEncoder(inner, EmbeddingCache(str(tmp_path), "mini"))
+    np.testing.assert_array_equal(second.encode(["card closed", "refund denied"]), expected[::-1])
+    assert inner.seen == []
+
+    other_model = CachedEncoder(inner, EmbeddingCache(str(tmp_path), "other"))
+    other_model.encode(["card closed"])
+    assert inner.seen == ["card closed"]
+
+
+def test_partial_write_is_truncated_on_load(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "mini")
+    cache.add([cache.key("a"), cache.key("b")], np.array([[1, 1], [2, 2]], dtype=np.float32))
+    # Crash after the vector row was written but before its key
+    with open(cache._vectors_path, "ab") as f:
+        f.write(np.array([9, 9], dtype=np.float32).tobytes())
+
+    reopened = EmbeddingCache(str(tmp_path), "mini")
+    assert len(reopened) == 2
+    reopened.add([reopened.key("c")], np.array([[3, 3]], dtype=np.float32))
+
+    final = EmbeddingCache(str(tmp_path), "mini")
+    rows = final.lookup([final.key(t) for t in "abc"])
+    np.testing.assert_array_equal(final.get(rows), [[1, 1], [2, 2], [3, 3]])
@@ -0,0 +1,89 @@
+# test_evaluation.py
+
+import json
+
+import pytest
+from langchain.docstore.document import Document
+
+from evaluation import (ResultLog, load_questions, run_evaluation, run_generation, run_retrieval,
+                        summarize)
+
+
+class FakeRetriever:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.queries = []
+
+    def retrieve_many(self, queries, k=None, product_filter=None):
+        if self.fail_on in queries:
+            raise RuntimeError("retriever crashed")
+        self.queries.extend(queries)
+        # complaint ids 1..k, so question "q<n>" labeled n is found at rank n
+        return [[Document(page_content=f"{q} chunk {i}", metadata={"complaint_id": i, "product": product_filter})
+                 for i in range(1, k + 1)] for q in queries]
+
+
+class FakeGenerator:
+    max_input_tokens = 512
+
+    def __init__(self):
+        self.prompts = []
+
+    def count_tokens(self, text):
+        return len(text.split())
+
+    def generate_many(self, prompts):
+        self.prompts.extend(prompts)
+        return [f"answer {len(self.prompts)}"] * len(prompts)
+
+
+def write_questions(path, n=6):
+    with open(path, "w") as f:
+        for i in range(1, n + 1):
+            f.write(json.dumps({"id": f"q{i}", "question": f"question {i}",
+                                "product": "Credit card" if i % 2 else None, "complaint_id": i}) + "\n")
+        f.write(json.dumps({"question": "unlabeled question"}) + "\n")
+    return load_questions(str(path))
+
+
+def test_retrieval_only_metrics_and_resume(tmp_path):
+    questions = write_questions(tmp_path / "questions.jsonl")
+    out = str(tmp_path / "run")
+
+    with pytest.raises(RuntimeError):
+        run_evaluation(questions, out_dir=out, k=3, retrieval_only=True, retriever=FakeRetriever("question 6"),
+                       retrieval_batch=2, workers=1)
+
+    retriever = FakeRetriever()
+    summary = run_evaluation(questions, out_dir=out, k=3, retrieval_only=True, retriever=retriever,
+                             retrieval_batch=2, workers=2)
+    # Batches finished before the crash are not retrieved again
+    assert "question 1" not in retriever.queries and "question 6" in retriever.queries
+    assert summary["retrieved"] == 7 and summary["labeled"] == 6
+    assert summary["hit_rate"] == pytest.approx(3 / 6)
+    assert summary["mrr"] == pytest.approx((1 + 1 / 2 + 1 / 3) / 6)
+    assert summary["retrieval"]["p50_ms"] >= 0
+    assert "generation" not in summary
+
+    with pytest.raises(ValueError):
+        run_evaluation(questions, out_dir=out, k=5, retrieval_only=True, retriever=FakeRetriever())
+
+
+def test_generation_phase_checkpoints(tmp_path):
+    questions = write_questions(tmp_path / "questions.jsonl", n=3)
+    retrieved = run_retrieval(questions, ResultLog(str(tmp_path / "retrieval.jsonl")), k=2,
+                              retriever=FakeRetriever())
+    log = ResultLog(str(tmp_path / "generation.jsonl"))
+    llm = FakeGenerator()
+    generated = run_generation(retrieved, log, llm=llm, batch_size=3)
+    assert len(generated) == 4 and len(llm.prompts) == 4
+    assert any("question 1" in p for p in llm.prompts)
+    assert all(g["generate_batch_size"] in (1, 3) for g in generated.values())
+
+    summary = summarize(questions, retrieved, generated)
+    assert summary["answered"] == 4 and summary["generation"]["p50_ms"] >= 0
+
+    # Everything is checkpointed, so a rerun does no work
+    again = FakeGenerator()
+    assert run_generation(retrieved, log, llm=again) == generated
+    assert again.prompts == []
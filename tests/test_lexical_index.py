@@ -0,0 +1,37 @@
+# test_lexical_index.py
+
+from lexical_index import BM25Index, BM25IndexBuilder, reciprocal_rank_fusion, tokenize
+
+
+def build(tmp_path):
+    builder = BM25IndexBuilder()
+    builder.add(
+        ["0_0", "1_0", "2_0", "3_0"],
+        [
+            "zelle transfer was never received by the recipient",
+            "late fee charged on my credit card",
+            "bnpl refund for a returned item was denied",
+            "the bank refused a chargeback on my credit card",
+        ],
+        ["Money transfers", "Credit card", "Buy Now, Pay Later", "Credit card"],
+    )
+    builder.add(["4_0"], ["zelle zelle zelle scam"], ["Money transfers"])
+    return BM25Index(builder.write(str(tmp_path)))
+
+
+def test_tokenize():
+    assert tokenize("Form 1099, BNPL!") == ["form", "1099", "bnpl"]
+
+
+def test_exact_terms_rank_first(tmp_path):
+    index = build(tmp_path)
+    assert index.search_ids("chargeback", k=3) == ["3_0"]
+    assert index.search_ids("zelle payment", k=3) == ["4_0", "0_0"]
+    assert index.search_ids("credit card", k=5, product="Credit card") == ["1_0", "3_0"]
+    assert index.search_ids("zelle", k=5, product="Mortgage") == []
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]])
+    assert fused[0] == "c"
+    assert set(fused) == {"a", "b", "c", "d"}
@@ -0,0 +1,77 @@
+import re
+import zipfile
+
+import pandas as pd
+
+from loader import PRODUCT_REMAP, TARGET_PRODUCTS, DataLoader
+
+
+def notebook_clean_text(text):
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    text = re.sub(r'[^a-z0-9\s]', '', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def raw_frame(n=300):
+    products = list(PRODUCT_REMAP) + ["Mortgage", "Student loan"]
+    narratives = ["I was charged a LATE fee!!\n\nTwice.", "", None, "  ### ", "Refund — never arrived, $50."]
+    return pd.DataFrame({
+        "Date received": [f"2023-01-{i % 28 + 1:02d}" for i in range(n)],
+        "Product": [products[i % len(products)] for i in range(n)],
+        "Sub-product": ["x"] * n,
+        "Issue": [f"issue {i % 4}" for i in range(n)],
+        "Company": [f"bank {i % 7}" for i in range(n)],
+        "Consumer complaint narrative": [narratives[i % len(narratives)] for i in range(n)],
+        "Complaint ID": range(5000, 5000 + n),
+    })
+
+
+def test_preprocess_streams_from_zip_and_matches_notebook(tmp_path):
+    raw = raw_frame()
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    with zipfile.ZipFile(raw_dir / "complaints.csv.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("complaints.csv", raw.to_csv(index=False))
+
+    out = tmp_path / "filtered" / "filtered_complaints.csv"
+    stats = DataLoader(raw_dir=str(raw_dir)).preprocess(str(out), batch_size=37)
+    assert not (raw_dir / "complaints.csv").exists()
+
+    # Reference: the notebook's pandas pipeline on the whole frame
+    expected = raw.copy()
+    expected["Product"] = expected["Product"].replace(PRODUCT_REMAP)
+    expected = expected[expected["Product"].isin(TARGET_PRODUCTS)]
+    expected = expected[expected["Consumer complaint narrative"].notna()]
+    expected["cleaned_narrative"] = expected["Consumer complaint narrative"].apply(notebook_clean_text)
+    expected = expected[expected["cleaned_narrative"].str.strip().astype(bool)]
+
+    result = pd.read_csv(out)
+    assert list(result.columns) == ["Date received", "Product", "Issue", "Company",
+                                    "Complaint ID", "cleaned_narrative"]
+    assert result["Complaint ID"].tolist() == expected["Complaint ID"].tolist()
+    assert result["Product"].tolist() == expected["Product"].tolist()
+    assert result["cleaned_narrative"].tolist() == expected["cleaned_narrative"].tolist()
+    assert stats["rows_read"] == len(raw)
+    assert stats["rows_kept"] == len(expected)
+    assert sum(stats["product_counts"].values()) == len(expected)
+
+
+def test_preprocess_skips_empty_batches(tmp_path):
+    # Leading batches without any target-product narrative must not write extra headers
+    raw = pd.concat([raw_frame(40).assign(Product="Mortgage"), raw_frame(60)], ignore_index=True)
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    raw.to_csv(raw_dir / "complaints.csv", index=False)
+
+    out = tmp_path / "filtered.csv"
+    stats = DataLoader(raw_dir=str(raw_dir)).preprocess(str(out), batch_size=10)
+    result = pd.read_csv(out)
+    assert stats["rows_kept"] == len(result) > 0
+    assert result["Complaint ID"].dtype == "int64"
+
+    empty = DataLoader(raw_dir=str(raw_dir))
+    raw_frame(20).assign(Product="Mortgage").to_csv(raw_dir / "complaints.csv", index=False)
+    empty.preprocess(str(out), batch_size=10)
+    assert pd.read_csv(out).empty
@@ -0,0 +1,76 @@
+# test_quantized_store.py
+
+import numpy as np
+import pytest
+
+from quantized_store import (QuantizedVectorStore, build_quantized_store, iter_numpy_store, recall_report,
+                             store_footprint)
+from vector_store import NumpyVectorStore, build_numpy_store
+
+
+def build_source(tmp_path, n=600, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(12, dim))
+    vectors = (centers[rng.integers(0, 12, n)] + 0.4 * rng.normal(size=(n, dim))).astype(np.float32)
+    products = ["Credit card", "Money transfers", "Personal loan"]
+    metadatas = [{"product": products[i % 3], "complaint_id": 1000 + i} for i in range(n)]
+    ids = [f"{i}_0" for i in range(n)]
+    texts = [f"complaint text {i} ✓" for i in range(n)]
+    batches = [(ids[s:s + 128], vectors[s:s + 128], texts[s:s + 128], metadatas[s:s + 128])
+               for s in range(0, n, 128)]
+    build_numpy_store(str(tmp_path / "numpy"), batches, total=n, dim=dim, dtype="float32")
+    return NumpyVectorStore(str(tmp_path / "numpy")), vectors
+
+
+@pytest.mark.parametrize("mode, rerank, min_recall", [("sq8", "float16", 0.95), ("pq", "sq8", 0.85)])
+def test_quantized_search_recall_and_documents(tmp_path, monkeypatch, mode, rerank, min_recall):
+    monkeypatch.setattr("quantized_store.SEARCH_BLOCK_ROWS", 100)
+    source, vectors = build_source(tmp_path)
+    out = str(tmp_path / mode)
+    build_quantized_store(out, iter_numpy_store(source, page_size=128), total=len(source),
+                          dim=vectors.shape[1], mode=mode, rerank=rerank, sub_dim=4)
+    store = QuantizedVectorStore(out)
+
+    queries = vectors[:20] + 0.05
+    truth = [rows for rows, _ in source.search_rows(queries, k=5)]
+    report = recall_report({mode: store}, queries, truth, k=5)
+    assert report[mode]["recall_at_k"] >= min_recall
+    assert report[mode]["recall_at_k"] > report[f"{mode} (no rerank)"]["recall_at_k"]
+    assert report[mode]["vectors_mb"] < 0.5 * source.embeddings.nbytes / 1e6
+
+    docs = store.search(vectors[:1], k=4, product="Money transfers")[0]
+    assert len(docs) == 4 and {d.metadata["product"] for d in docs} == {"Money transfers"}
+    doc = store.get_by_ids(["43_0"])[0]
+    assert doc.page_content == "complaint text 43 ✓"
+    assert doc.metadata == {"product": "Money transfers", "complaint_id": 1043, "chunk_id": "43_0"}
+    assert store.search(vectors[:1], k=3, product="Mortgage") == [[]]
+
+
+def test_default_rerank_rescores_candidates(tmp_path):
+    source, vectors = build_source(tmp_path, n=400, dim=32)
+    for mode, tier in (("sq8", "float16"), ("pq", "sq8")):
+        out = str(tmp_path / mode)
+        build_quantized_store(out, iter_numpy_store(source), total=len(source), dim=vectors.shape[1], mode=mode)
+        store = QuantizedVectorStore(out)
+        assert store.rerank == tier
+        rows, scores = store.search_rows(vectors[:1], k=3)[0]
+        assert rows[0] == 0 and np.all(np.diff(scores) <= 0)
+
+    # The int8 tier is the explicit option for the smallest index
+    build_quantized_store(str(tmp_path / "small"), iter_numpy_store(source), total=len(source),
+                          dim=vectors.shape[1], mode="pq", rerank="sq8")
+    footprint = store_footprint(str(tmp_path / "small"))
+    assert footprint["vectors_mb"] + footprint["rerank_mb"] < len(source) * vectors.shape[1] * 2 / 1e6
+
+
+def test_text_store_is_thread_safe(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from quantized_store import CompressedTextStore, CompressedTextWriter
+
+    writer = CompressedTextWriter(str(tmp_path), block_size=4)
+    writer.extend(f"text {i}" for i in range(400))
+    writer.close()
+    store = CompressedTextStore(str(tmp_path), cache_blocks=2)
+    rows = np.random.default_rng(0).integers(0, 400, 4000)
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(lambda r: store[r], rows)) == [f"text {r}" for r in rows]
@@ -0,0 +1,73 @@
+# test_query_cache.py
+
+import time
+
+import numpy as np
+
+from query_cache import LRUCache, SemanticAnswerCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  Late   Payment\nCredit card ") == "late payment credit card"
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats() == {"size": 2, "hits": 2, "misses": 1}
+
+
+def test_lru_ttl_expiry():
+    cache = LRUCache(maxsize=4, ttl=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_semantic_cache_threshold_and_product():
+    cache = SemanticAnswerCache(maxsize=4, threshold=0.9)
+    cache.add([1.0, 0.0], "Credit card", "answer")
+
+    assert cache.lookup([0.99, 0.05], "Credit card") == "answer"
+    assert cache.lookup([0.99, 0.05], "Mortgage") is None
+    assert cache.lookup([0.0, 1.0], "Credit card") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_semantic_cache_size_eviction():
+    cache = SemanticAnswerCache(maxsize=2, threshold=0.99)
+    for i, v in enumerate(np.eye(3)):
+        cache.add(v, None, i)
+    assert len(cache) == 2
+    assert cache.lookup(np.eye(3)[0], None) is None
+    assert cache.lookup(np.eye(3)[2], None) == 2
+
+
+def test_answer_cache_is_scoped_by_k(monkeypatch):
+    import rag_pipline
+
+    class Retriever:
+        def check_collection(self):
+            pass
+
+        def embed_query(self, query):
+            return [1.0, 0.0]
+
+    cache = SemanticAnswerCache(threshold=0.9)
+    monkeypatch.setattr(rag_pipline, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(rag_pipline, "get_retriever", lambda: Retriever())
+    monkeypatch.setattr(rag_pipline, "get_relevant_chunks",
+                        lambda query, k, product, retriever: [f"chunk {i}" for i in range(k)])
+    monkeypatch.setattr(rag_pipline, "answer_from_docs", lambda query, docs, llm: f"{len(docs)} chunks")
+
+    assert rag_pipline.generate_answer("late fee", k=3)[0] == "3 chunks"
+    assert rag_pipline.generate_answer("late fee", k=10)[0] == "10 chunks"
+    assert rag_pipline.generate_answer("late fee", k=3)[0] == "3 chunks"
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,53 @@
+import os
+
+from tracing import RollingHistogram, Tracer
+
+
+def test_histogram_percentiles_use_recent_window():
+    hist = RollingHistogram(window=100)
+    for ms in range(1, 201):
+        hist.add(float(ms))
+    summary = hist.summary()
+    assert summary["count"] == 200
+    assert summary["p50_ms"] == 150.5
+    assert summary["max_ms"] == 200.0
+
+
+def test_span_records_and_exports():
+    tracer = Tracer()
+    with tracer.span("retrieve.search"):
+        pass
+    tracer.record("retrieve.search", 0.010)
+
+    snap = tracer.snapshot()
+    assert snap["retrieve.search"]["count"] == 2
+
+    text = tracer.to_prometheus(gauges={"embed": {"queue_depth": 3, "batch_sizes": {}}})
+    assert 'rag_span_latency_ms{span="retrieve.search",quantile="0.99"}' in text
+    assert 'rag_span_latency_ms_count{span="retrieve.search"} 2' in text
+    assert 'rag_queue_depth{source="embed"} 3' in text
+    assert "batch_sizes" not in text
+
+
+def test_counters_accumulate_and_export():
+    tracer = Tracer()
+    tracer.count("context.tokens_saved", 40)
+    tracer.count("context.tokens_saved", 2)
+    assert tracer.counter_snapshot() == {"context.tokens_saved": 42}
+    assert 'rag_counter_total{counter="context.tokens_saved"} 42' in tracer.to_prometheus()
+
+    tracer.reset()
+    assert tracer.counter_snapshot() == {}
+
+
+def test_request_profiles_only_slow_requests(tmp_path):
+    tracer = Tracer(sample_rate=1.0, slow_ms=0.0, profile_dir=str(tmp_path / "profiled"))
+    with tracer.request("generate_answer"):
+        sum(range(1000))
+    assert len(os.listdir(tmp_path / "profiled")) == 1
+
+    tracer = Tracer(sample_rate=1.0, slow_ms=60_000, profile_dir=str(tmp_path / "skipped"))
+    with tracer.request("generate_answer"):
+        pass
+    assert not (tmp_path / "skipped").exists()
+    assert tracer.snapshot()["generate_answer"]["count"] == 1
@@ -0,0 +1,52 @@
+# test_vector_store.py
+
+import numpy as np
+
+from vector_store import NumpyVectorStore, build_numpy_store
+
+
+def build(tmp_path, n=500, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    products = ["Credit card", "Money transfers", "Personal loan"]
+    metadatas = [{"product": products[i % 3], "complaint_id": 1000 + i, "chunk_id": f"{i}_0"}
+                 for i in range(n)]
+    ids = [m["chunk_id"] for m in metadatas]
+    texts = [f"complaint text {i} ✓" for i in range(n)]
+    batches = [(ids[s:s + 128], vectors[s:s + 128], texts[s:s + 128], metadatas[s:s + 128])
+               for s in range(0, n, 128)]
+    build_numpy_store(str(tmp_path), batches, total=n, dim=dim, dtype="float32")
+    return NumpyVectorStore(str(tmp_path)), vectors
+
+
+def test_search_matches_brute_force(tmp_path, monkeypatch):
+    monkeypatch.setattr("vector_store.SEARCH_BLOCK_ROWS", 64)
+    store, vectors = build(tmp_path)
+    queries = vectors[:3] + 0.01
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    for q, (rows, scores) in zip(queries, store.search_rows(queries, k=5)):
+        expected = np.argsort(-(unit @ (q / np.linalg.norm(q))))[:5]
+        assert rows.tolist() == expected.tolist()
+        assert np.all(np.diff(scores) <= 0)
+
+
+def test_product_filter_and_documents(tmp_path):
+    store, vectors = build(tmp_path)
+    docs = store.search(vectors[:1], k=4, product="Money transfers")[0]
+    assert len(docs) == 4
+    assert {d.metadata["product"] for d in docs} == {"Money transfers"}
+
+    doc = store.get_by_ids(["7_0"])[0]
+    assert doc.page_content == "complaint text 7 ✓"
+    assert doc.metadata == {"product": "Money transfers", "complaint_id": 1007, "chunk_id": "7_0"}
+    assert store.search(vectors[:1], k=3, product="Mortgage") == [[]]
+
+
+def test_get_by_ids_uses_sorted_ids(tmp_path):
+    store, _ = build(tmp_path, n=300)
+    wanted = ["250_0", "missing", "3_0", "99_0"]
+    assert [d.metadata["chunk_id"] for d in store.get_by_ids(wanted)] == ["250_0", "3_0", "99_0"]
+    assert store.get_by_ids([]) == []
+
+    assert [d.metadata["complaint_id"] for d in store.get_by_ids(["299_0", "0_0"])] == [1299, 1000]
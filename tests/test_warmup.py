@@ -0,0 +1,59 @@
+import threading
+
+import rag_pipline
+
+
+class FakeRetriever:
+    def retrieve(self, query, k=None, product_filter=None):
+        return []
+
+
+class FakeGenerator:
+    def __init__(self, release):
+        self.release = release
+        self.max_input_tokens = 512
+        self.prompts = []
+
+    def count_tokens(self, text):
+        return len(text.split())
+
+    def generate_many(self, prompts):
+        self.release.wait(5)
+        self.prompts.extend(prompts)
+        return ["ok"] * len(prompts)
+
+
+def test_warm_up_reports_readiness(monkeypatch):
+    release = threading.Event()
+    llm = FakeGenerator(release)
+    monkeypatch.setattr(rag_pipline, "_WARMUP_STATE", {"started": None, "finished": None, "error": None})
+    monkeypatch.setattr(rag_pipline, "_WARMUP_DONE", threading.Event())
+    monkeypatch.setattr(rag_pipline, "_WARMUP_THREAD", None)
+    monkeypatch.setattr(rag_pipline, "get_retriever", lambda path=None: FakeRetriever())
+    monkeypatch.setattr(rag_pipline, "get_llm", lambda name=None: llm)
+
+    assert rag_pipline.readiness()["warming_up"] is False
+    thread = rag_pipline.warm_up("tiny-model")
+    assert rag_pipline.warm_up("tiny-model") is thread      # started once
+    assert not rag_pipline.is_ready()
+    assert rag_pipline.readiness()["warming_up"] is True
+
+    release.set()
+    thread.join(5)
+    status = rag_pipline.readiness()
+    assert status["ready"] and status["error"] is None
+    assert llm.prompts and rag_pipline.WARMUP_QUERY in llm.prompts[0]
+
+
+def test_failed_warm_up_is_not_ready(monkeypatch):
+    def broken(path=None):
+        raise OSError("index missing")
+
+    monkeypatch.setattr(rag_pipline, "_WARMUP_STATE", {"started": None, "finished": None, "error": None})
+    monkeypatch.setattr(rag_pipline, "_WARMUP_DONE", threading.Event())
+    monkeypatch.setattr(rag_pipline, "get_retriever", broken)
+
+    rag_pipline.warm_up(background=False)
+    status = rag_pipline.readiness()
+    assert not status["ready"]
+    assert status["error"] == "OSError: index missing"